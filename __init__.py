@@ -1,5 +1,18 @@
-__all__ = ['CWScope', 'cw_firmware_auto_update', 'SSTargetBase', 'SS1xTarget', 'SS2xTarget',
+__all__ = ['CWScope', 'CapturePipeline', 'MultiDeviceCapture', 'FaultRecovery', 'cw_firmware_auto_update',
+           'ClockTuner', 'CaptureServer', 'CaptureClient',
+           'SSTargetBase', 'SS1xTarget', 'SS2xTarget',
            'make_random_hex', 'store_pickle_object', 'load_pickle_object', 'visualization_single_trace',
-           'SS1xTargetStandAlone', 'SS2xTargetStandAlone']
+           'SS1xTargetStandAlone', 'SS2xTargetStandAlone',
+           'TraceStoreWriter', 'TraceStoreReader', 'TraceDataset', 'open_backend', 'register_backend',
+           'InputGenerator', 'FixedVsRandom', 'FixedVsRandomKey', 'ChosenPlaintext',
+           'SimulatedScope', 'SimulatedSS1xTarget', 'SimulatedSS2xTarget',
+           'TVLAAccumulator', 'CPAAccumulator', 'SNRAccumulator', 'Preprocessor', 'CiphertextVerifier',
+           'LiveTraceView', 'Tracer']
 
-from .cw_wrapper import *
+from typing import TYPE_CHECKING
+from .cw_wrapper.utils.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {name: '.cw_wrapper' for name in __all__})
+
+if TYPE_CHECKING:
+    from .cw_wrapper import *
@@ -1,7 +1,28 @@
-__all__ = ['CWScope', 'cw_firmware_auto_update', 'SSTargetBase', 'SS1xTarget', 'SS2xTarget',
+__all__ = ['CWScope', 'CapturePipeline', 'MultiDeviceCapture', 'FaultRecovery', 'cw_firmware_auto_update',
+           'ClockTuner', 'CaptureServer', 'CaptureClient',
+           'SSTargetBase', 'SS1xTarget', 'SS2xTarget',
            'make_random_hex', 'store_pickle_object', 'load_pickle_object', 'visualization_single_trace',
-           'SS1xTargetStandAlone', 'SS2xTargetStandAlone']
+           'SS1xTargetStandAlone', 'SS2xTargetStandAlone',
+           'TraceStoreWriter', 'TraceStoreReader', 'TraceDataset', 'open_backend', 'register_backend',
+           'InputGenerator', 'FixedVsRandom', 'FixedVsRandomKey', 'ChosenPlaintext',
+           'SimulatedScope', 'SimulatedSS1xTarget', 'SimulatedSS2xTarget',
+           'TVLAAccumulator', 'CPAAccumulator', 'SNRAccumulator', 'Preprocessor', 'CiphertextVerifier',
+           'LiveTraceView', 'Tracer']
 
-from .scope import *
-from .simpleserial_target import *
-from .utils import *
+from typing import TYPE_CHECKING
+from .utils.lazy import lazy_exports
+from . import scope, simpleserial_target, utils, sim, analysis, server
+
+# Every public name of the subpackages is resolved on first access (PEP 562): `import cw_wrapper` loads neither
+# chipwhisperer nor matplotlib, and only the submodules actually used are imported.
+__getattr__, __dir__ = lazy_exports(__name__, {name: '.' + sub.__name__.rsplit('.', 1)[1]
+                                               for sub in (scope, simpleserial_target, utils, sim, analysis, server)
+                                               for name in sub.__all__})
+
+if TYPE_CHECKING:
+    from .scope import *
+    from .simpleserial_target import *
+    from .utils import *
+    from .sim import *
+    from .analysis import *
+    from .server import *
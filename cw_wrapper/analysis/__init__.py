@@ -0,0 +1,22 @@
+__all__ = ['TVLAAccumulator', 'CPAAccumulator', 'sbox_model_matrix', 'tune_batch_size',
+           'align_traces', 'Align', 'Decimate', 'SelectPOI', 'SNRAccumulator', 'Preprocessor',
+           'preprocess_array', 'preprocess_store', 'verify_ciphertexts', 'CiphertextVerifier']
+
+from typing import TYPE_CHECKING
+from ..utils.lazy import lazy_exports
+
+# Imported on first access (PEP 562), so `import cw_wrapper` stays cheap for headless workers.
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'TVLAAccumulator': '.tvla',
+    'CPAAccumulator': '.cpa', 'sbox_model_matrix': '.cpa', 'tune_batch_size': '.cpa',
+    **{name: '.preprocess' for name in ('align_traces', 'Align', 'Decimate', 'SelectPOI', 'SNRAccumulator',
+                                        'Preprocessor', 'preprocess_array', 'preprocess_store')},
+    'verify_ciphertexts': '.verify', 'CiphertextVerifier': '.verify',
+})
+
+if TYPE_CHECKING:
+    from .tvla import TVLAAccumulator
+    from .cpa import CPAAccumulator, sbox_model_matrix, tune_batch_size
+    from .preprocess import align_traces, Align, Decimate, SelectPOI, SNRAccumulator, Preprocessor, \
+        preprocess_array, preprocess_store
+    from .verify import verify_ciphertexts, CiphertextVerifier
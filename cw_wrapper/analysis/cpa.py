@@ -0,0 +1,261 @@
+import time
+import numpy as np
+from typing import Optional, Union, Sequence, Tuple, Dict
+from ..utils.aes import SBOX, HW
+from ..simpleserial_target.ss1x_codec import Payload, to_bytes
+
+_SBOX = np.array(SBOX, dtype=np.uint8)
+_HW = np.array(HW, dtype=np.float64)
+_GUESS_XOR_VALUE = np.arange(256, dtype=np.uint8)[:, None] ^ np.arange(256, dtype=np.uint8)[None, :]
+
+
+def sbox_model_matrix(leakage: Optional[Sequence[float]] = None) -> np.ndarray:
+    """
+    :param leakage: Leakage of each S-box output value (Hamming weight if None)
+    :return: (256 guesses, 256 input byte values) matrix of the modeled leakage of SBOX[value ^ guess]
+    """
+    leakage = _HW if leakage is None else np.asarray(leakage, dtype=np.float64)
+    assert leakage.shape == (256,)
+    return leakage[_SBOX[_GUESS_XOR_VALUE]]
+
+
+class CPAAccumulator:
+    """
+    Incremental correlation power analysis on the first-round S-box outputs of AES-128.
+
+    Instead of the hypothetical leakage of every trace, the accumulator keeps, for every key byte,
+    the number of traces and the sum of the traces per input byte value (rows sorted by value and
+    summed with `np.add.reduceat`, about 10x cheaper than a one-hot matrix product).
+    The model is applied when the correlation is evaluated: sum(h * t) for all 256 guesses is one
+    (256, 256) @ (256, samples) product per byte. Memory is n_bytes * 256 * samples sums, independent of
+    the number of traces, and the model can be changed without re-reading the traces.
+
+    The per-value sums are large for long traces: 16 * 256 * 24400 float64 sums (a full capture window)
+    take 800MB. `sample_range` restricts the attack to a window of the trace (e.g. the first round) and
+    `sum_dtype=np.float32` halves the memory, at the cost of precision over millions of traces.
+
+    Can be passed as a sink to `CWScope.capture_stream` / `CapturePipeline`.
+    """
+    def __init__(self,
+                 samples: int,
+                 n_bytes: int = 16,
+                 dtype: Union[str, np.dtype] = np.float64,
+                 batch_size: int = 1024,
+                 leakage: Optional[Sequence[float]] = None,
+                 sample_range: Optional[Tuple[int, int]] = None,
+                 sum_dtype: Union[str, np.dtype] = np.float64
+                 ):
+        """
+        :param samples: Number of samples per trace
+        :param n_bytes: Number of key bytes to attack (bytes 0 .. n_bytes-1)
+        :param dtype: dtype of the per-batch sums (float32 is faster; the running sums are always float64)
+        :param batch_size: Traces per update step (bounds the temporary memory, see `tune_batch_size`)
+        :param leakage: Leakage of each S-box output value (Hamming weight if None)
+        :param sample_range: (start, stop) samples of the traces which are attacked (all if None);
+                             correlations then have stop - start columns
+        :param sum_dtype: dtype of the per-value sums (float32: half the memory)
+        """
+        assert samples >= 1 and 1 <= n_bytes <= 16 and batch_size >= 1
+        start, stop = (0, samples) if sample_range is None else sample_range
+        assert 0 <= start < stop <= samples, f"Invalid sample range ({start}, {stop}) for {samples} samples."
+        self._sum_dtype = np.dtype(sum_dtype)
+        assert self._sum_dtype in (np.float32, np.float64)
+        self._samples = samples
+        self._start = start
+        self._stop = stop
+        self._n_bytes = n_bytes
+        self._dtype = np.dtype(dtype)
+        self._batch_size = batch_size
+        self._model = sbox_model_matrix(leakage)
+        self.reset()
+        pass
+
+    @property
+    def samples(self) -> int:
+        return self._samples
+
+    @property
+    def sample_range(self) -> Tuple[int, int]:
+        return self._start, self._stop
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory of the running sums in bytes.
+        """
+        return self._sum_by_value.nbytes + self._sum_t.nbytes + self._sum_tt.nbytes + self._count.nbytes
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size
+
+    @batch_size.setter
+    def batch_size(self, batch_size: int) -> None:
+        assert batch_size >= 1
+        self._batch_size = batch_size
+
+    def __len__(self) -> int:
+        return self._n
+
+    def reset(self) -> None:
+        self._n = 0
+        width = self._stop - self._start
+        self._sum_t = np.zeros(width, dtype=np.float64)
+        self._sum_tt = np.zeros(width, dtype=np.float64)
+        self._count = np.zeros((self._n_bytes, 256), dtype=np.float64)
+        self._sum_by_value = np.zeros((self._n_bytes, 256, width), dtype=self._sum_dtype)
+        self._best_history = []
+        pass
+
+    def set_leakage(self, leakage: Optional[Sequence[float]] = None) -> None:
+        """
+        Replaces the leakage model (takes effect at the next evaluation; no trace is needed again).
+        """
+        self._model = sbox_model_matrix(leakage)
+        pass
+
+    def update(self,
+               traces: np.ndarray,
+               plains: np.ndarray
+               ) -> None:
+        """
+        :param traces: (N, samples) traces (float or raw ADC integers; correlation is scale invariant)
+        :param plains: (N, >= n_bytes) uint8 plaintexts
+        """
+        traces = np.asarray(traces)
+        plains = np.asarray(plains, dtype=np.uint8)
+        assert traces.ndim == 2 and traces.shape[1] == self._samples, \
+            f"Expected (N, {self._samples}) traces, received {traces.shape}."
+        assert plains.shape[0] == traces.shape[0] and plains.shape[1] >= self._n_bytes
+        for pos in range(0, traces.shape[0], self._batch_size):
+            t = traces[pos:pos + self._batch_size, self._start:self._stop].astype(self._dtype, copy=False)
+            p = plains[pos:pos + self._batch_size]
+            for b in range(self._n_bytes):
+                count = np.bincount(p[:, b], minlength=256)
+                values = np.flatnonzero(count)
+                starts = np.concatenate(([0], np.cumsum(count[values])[:-1]))
+                order = np.argsort(p[:, b], kind='stable')
+                self._sum_by_value[b, values] += np.add.reduceat(t[order], starts, axis=0)
+                self._count[b] += count
+            t64 = t.astype(np.float64, copy=False)
+            self._sum_t += t64.sum(axis=0)
+            self._sum_tt += np.einsum('ij,ij->j', t64, t64)
+            self._n += t.shape[0]
+        pass
+
+    def append_batch(self,
+                     traces: np.ndarray,
+                     plains: np.ndarray,
+                     ciphers: Optional[np.ndarray] = None
+                     ) -> None:
+        """
+        Sink interface.
+        """
+        self.update(traces, plains)
+        pass
+
+    def merge(self, other: "CPAAccumulator") -> "CPAAccumulator":
+        """
+        Adds the traces accumulated by `other` (in place).
+        """
+        assert other._samples == self._samples and other._n_bytes == self._n_bytes
+        assert other.sample_range == self.sample_range
+        self._n += other._n
+        self._sum_t += other._sum_t
+        self._sum_tt += other._sum_tt
+        self._count += other._count
+        self._sum_by_value += other._sum_by_value
+        return self
+
+    def correlation(self, byte: int) -> np.ndarray:
+        """
+        :return: (256 guesses, samples) Pearson correlation of the model with the traces for key byte `byte`
+                 (the columns of `sample_range`)
+        """
+        assert 0 <= byte < self._n_bytes
+        assert self._n >= 2, "At least 2 traces are required."
+        n = self._n
+        model = self._model
+        sum_h = model @ self._count[byte]
+        sum_hh = (model * model) @ self._count[byte]
+        sum_ht = model @ self._sum_by_value[byte].astype(np.float64, copy=False)
+        var_h = n * sum_hh - sum_h * sum_h
+        var_t = n * self._sum_tt - self._sum_t * self._sum_t
+        denom = np.sqrt(np.maximum(np.outer(var_h, var_t), 0.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = (n * sum_ht - np.outer(sum_h, self._sum_t)) / denom
+        r[denom == 0] = 0.0
+        return r
+
+    def scores(self) -> np.ndarray:
+        """
+        :return: (n_bytes, 256) max |correlation| over the samples for every key guess
+        """
+        return np.stack([np.abs(self.correlation(b)).max(axis=1) for b in range(self._n_bytes)])
+
+    def best_key(self, scores: Optional[np.ndarray] = None) -> bytes:
+        """
+        :return: The most likely value of each attacked key byte
+        """
+        scores = self.scores() if scores is None else scores
+        return bytes(np.argmax(scores, axis=1).astype(np.uint8))
+
+    def key_ranks(self,
+                  key: Payload,
+                  scores: Optional[np.ndarray] = None
+                  ) -> np.ndarray:
+        """
+        :param key: Known key (at least n_bytes bytes)
+        :return: (n_bytes,) rank of the correct guess of each byte (0: recovered)
+        """
+        key = np.frombuffer(to_bytes(key), dtype=np.uint8)[:self._n_bytes]
+        assert key.shape[0] == self._n_bytes
+        scores = self.scores() if scores is None else scores
+        correct = scores[np.arange(self._n_bytes), key]
+        return (scores > correct[:, None]).sum(axis=1)
+
+    def converged(self,
+                  key: Optional[Payload] = None,
+                  patience: int = 3
+                  ) -> bool:
+        """
+        Evaluates the attack and records the best guess. Suitable as the `stop_when` of a capture loop.
+
+        :param key: Known key: converged when every byte has rank 0 for `patience` consecutive evaluations.
+                    Without a key: converged when the best key did not change for `patience` evaluations
+        """
+        if self._n < 2:
+            return False
+        scores = self.scores()
+        if key is not None:
+            self._best_history.append(bool((self.key_ranks(key, scores) == 0).all()))
+            return len(self._best_history) >= patience and all(self._best_history[-patience:])
+        self._best_history.append(self.best_key(scores))
+        recent = self._best_history[-patience:]
+        return len(recent) >= patience and all(x == recent[0] for x in recent)
+    pass
+
+
+def tune_batch_size(samples: int,
+                    candidates: Sequence[int] = (64, 128, 256, 512, 1024, 2048, 4096),
+                    n_traces: int = 8192,
+                    n_bytes: int = 16,
+                    dtype: Union[str, np.dtype] = np.float64,
+                    seed: int = 0
+                    ) -> Tuple[int, Dict[int, float]]:
+    """
+    Times `CPAAccumulator.update` on random data for each candidate batch size.
+
+    :return: The fastest batch size and the measured traces/sec of every candidate
+    """
+    rng = np.random.default_rng(seed)
+    traces = rng.standard_normal((n_traces, samples)).astype(dtype)
+    plains = rng.integers(0, 256, size=(n_traces, 16), dtype=np.uint8)
+    rates = {}
+    for batch_size in candidates:
+        acc = CPAAccumulator(samples, n_bytes, dtype, batch_size)
+        started = time.perf_counter()
+        acc.update(traces, plains)
+        elapsed = time.perf_counter() - started
+        rates[batch_size] = n_traces / elapsed if elapsed > 0 else float("inf")
+    return max(rates, key=rates.get), rates
@@ -0,0 +1,350 @@
+import os
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence, Tuple, Callable, Union
+from ..utils.trace_store import TraceStoreWriter, TraceStoreReader
+
+
+def _next_pow2(n: int) -> int:
+    return 1 << (n - 1).bit_length()
+
+
+def align_traces(traces: np.ndarray,
+                 reference: np.ndarray,
+                 window: Tuple[int, int],
+                 max_shift: int
+                 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Aligns every trace to `reference[window[0]:window[1]]` by normalized cross-correlation (computed with FFTs
+    for the whole batch at once). Samples shifted in from outside the trace repeat the edge value.
+
+    :param traces: (N, samples) traces
+    :param reference: (samples,) reference trace (e.g. the first trace or the mean trace)
+    :param window: Part of the reference used as the pattern; must leave `max_shift` samples on both sides
+    :param max_shift: Largest shift (in samples) searched in either direction
+    :return: Aligned traces (float), shift of each trace and its correlation score in [-1, 1]
+    """
+    traces = np.asarray(traces)
+    start, stop = window
+    samples = traces.shape[1]
+    assert max_shift >= 0 and 0 <= start - max_shift and start < stop and stop + max_shift <= samples, \
+        "The window +/- max_shift must lie inside the trace."
+    pattern = np.asarray(reference[start:stop], dtype=np.float64)
+    pattern = pattern - pattern.mean()
+    pattern_norm = np.sqrt(np.dot(pattern, pattern))
+    length = stop - start
+    segments = traces[:, start - max_shift:stop + max_shift].astype(np.float64)
+    n_fft = _next_pow2(segments.shape[1])
+    corr = np.fft.irfft(np.fft.rfft(segments, n_fft, axis=1) * np.conj(np.fft.rfft(pattern, n_fft)),
+                        n_fft, axis=1)[:, :2 * max_shift + 1]
+    # Norm of each mean-removed segment window, from running sums.
+    c1 = np.concatenate((np.zeros((segments.shape[0], 1)), np.cumsum(segments, axis=1)), axis=1)
+    c2 = np.concatenate((np.zeros((segments.shape[0], 1)), np.cumsum(segments * segments, axis=1)), axis=1)
+    s1 = c1[:, length:length + 2 * max_shift + 1] - c1[:, :2 * max_shift + 1]
+    s2 = c2[:, length:length + 2 * max_shift + 1] - c2[:, :2 * max_shift + 1]
+    denom = pattern_norm * np.sqrt(np.maximum(s2 - s1 * s1 / length, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = np.where(denom > 0, corr / denom, 0.0)
+    best = np.argmax(score, axis=1)
+    shifts = best - max_shift
+    index = np.clip(np.arange(samples)[None, :] + shifts[:, None], 0, samples - 1)
+    aligned = np.take_along_axis(traces, index, axis=1).astype(np.float64, copy=False)
+    return aligned, shifts, score[np.arange(score.shape[0]), best]
+
+
+class Align:
+    """
+    Preprocessing stage: FFT cross-correlation alignment (see `align_traces`).
+    """
+    def __init__(self,
+                 reference: np.ndarray,
+                 window: Tuple[int, int],
+                 max_shift: int
+                 ):
+        self.reference = np.asarray(reference, dtype=np.float64)
+        self.window = window
+        self.max_shift = max_shift
+        pass
+
+    def output_samples(self, samples: int) -> int:
+        return samples
+
+    def __call__(self, traces: np.ndarray) -> np.ndarray:
+        return align_traces(traces, self.reference, self.window, self.max_shift)[0]
+    pass
+
+
+class Decimate:
+    """
+    Preprocessing stage: compresses every `factor` consecutive samples into one.
+
+    mode "mean": boxcar average (low-pass + decimation), "sum": boxcar sum, "pick": every `factor`-th sample.
+    Trailing samples which do not fill a whole window are dropped.
+    """
+    def __init__(self,
+                 factor: int,
+                 mode: str = "mean"
+                 ):
+        assert factor >= 1 and mode in ("mean", "sum", "pick")
+        self.factor = factor
+        self.mode = mode
+        pass
+
+    def output_samples(self, samples: int) -> int:
+        return samples // self.factor
+
+    def __call__(self, traces: np.ndarray) -> np.ndarray:
+        n_out = traces.shape[1] // self.factor
+        if self.mode == "pick":
+            return traces[:, :n_out * self.factor:self.factor]
+        windows = traces[:, :n_out * self.factor].reshape(traces.shape[0], n_out, self.factor)
+        return windows.mean(axis=2) if self.mode == "mean" else windows.sum(axis=2, dtype=np.float64)
+    pass
+
+
+class SelectPOI:
+    """
+    Preprocessing stage: keeps the given sample indices (e.g. from `SNRAccumulator.select`).
+    """
+    def __init__(self, indices: Sequence[int]):
+        self.indices = np.asarray(indices, dtype=np.int64)
+        pass
+
+    def output_samples(self, samples: int) -> int:
+        return self.indices.shape[0]
+
+    def __call__(self, traces: np.ndarray) -> np.ndarray:
+        return traces[:, self.indices]
+    pass
+
+
+class SNRAccumulator:
+    """
+    One-pass per-sample signal-to-noise ratio, Var(E[T | label]) / E[Var(T | label)], and total variance,
+    for point-of-interest selection. Memory is O(n_classes * samples).
+
+    Can be passed as a capture sink; `label(plains, ciphers)` maps a batch to (N,) class labels
+    (default: the first plaintext byte).
+    """
+    def __init__(self,
+                 samples: int,
+                 n_classes: int = 256,
+                 label: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None
+                 ):
+        assert samples >= 1 and n_classes >= 2
+        self._samples = samples
+        self._n_classes = n_classes
+        self._label = label
+        self._count = np.zeros(n_classes, dtype=np.float64)
+        self._sum = np.zeros((n_classes, samples), dtype=np.float64)
+        self._sum_sq = np.zeros((n_classes, samples), dtype=np.float64)
+        pass
+
+    def __len__(self) -> int:
+        return int(self._count.sum())
+
+    def update(self,
+               traces: np.ndarray,
+               labels: np.ndarray
+               ) -> None:
+        traces = np.asarray(traces, dtype=np.float64)
+        labels = np.asarray(labels, dtype=np.int64)
+        assert traces.shape == (labels.shape[0], self._samples)
+        if labels.shape[0] == 0:
+            return
+        assert labels.min(initial=0) >= 0 and labels.max(initial=0) < self._n_classes
+        count = np.bincount(labels, minlength=self._n_classes)
+        classes = np.flatnonzero(count)
+        starts = np.concatenate(([0], np.cumsum(count[classes])[:-1]))
+        order = np.argsort(labels, kind='stable')
+        sorted_traces = traces[order]
+        self._count += count
+        self._sum[classes] += np.add.reduceat(sorted_traces, starts, axis=0)
+        self._sum_sq[classes] += np.add.reduceat(sorted_traces * sorted_traces, starts, axis=0)
+        pass
+
+    def append_batch(self,
+                     traces: np.ndarray,
+                     plains: np.ndarray,
+                     ciphers: Optional[np.ndarray] = None
+                     ) -> None:
+        """
+        Sink interface.
+        """
+        labels = plains[:, 0] if self._label is None else self._label(plains, ciphers)
+        self.update(traces, labels)
+        pass
+
+    def merge(self, other: "SNRAccumulator") -> "SNRAccumulator":
+        assert other._samples == self._samples and other._n_classes == self._n_classes
+        self._count += other._count
+        self._sum += other._sum
+        self._sum_sq += other._sum_sq
+        return self
+
+    def variance(self) -> np.ndarray:
+        n = self._count.sum()
+        assert n >= 2, "At least 2 traces are required."
+        mean = self._sum.sum(axis=0) / n
+        return self._sum_sq.sum(axis=0) / n - mean * mean
+
+    def snr(self) -> np.ndarray:
+        seen = self._count > 0
+        count = self._count[seen][:, None]
+        means = self._sum[seen] / count
+        variances = self._sum_sq[seen] / count - means * means
+        weights = count / count.sum()
+        grand_mean = (weights * means).sum(axis=0)
+        signal = (weights * (means - grand_mean) ** 2).sum(axis=0)
+        noise = (weights * variances).sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(noise > 0, signal / noise, 0.0)
+
+    def select(self,
+               k: int,
+               by: str = "snr",
+               min_distance: int = 0
+               ) -> np.ndarray:
+        """
+        :param k: Number of points of interest
+        :param by: "snr" or "variance"
+        :param min_distance: Minimum distance between two selected samples (avoids picking one peak k times)
+        :return: Sorted indices of the selected samples
+        """
+        assert by in ("snr", "variance")
+        score = self.snr() if by == "snr" else self.variance()
+        selected = []
+        for i in np.argsort(score)[::-1]:
+            if min_distance > 0 and any(abs(int(i) - j) <= min_distance for j in selected):
+                continue
+            selected.append(int(i))
+            if len(selected) == k:
+                break
+        return np.sort(np.asarray(selected, dtype=np.int64))
+    pass
+
+
+class Preprocessor:
+    """
+    Chain of preprocessing stages (callables mapping (N, samples) traces to (N, samples') traces,
+    e.g. `Align`, `Decimate`, `SelectPOI`).
+
+    Inline use during capture:
+        - as `CapturePipeline(..., postprocess=preprocessor)` (runs on the worker threads), or
+        - as a sink, `Preprocessor(stages, sinks=store)`, which forwards the preprocessed batches to `sinks`.
+    Offline use: `preprocess_array` (in memory or np.memmap) and `preprocess_store` (trace stores).
+    """
+    def __init__(self,
+                 stages: Sequence[Callable[[np.ndarray], np.ndarray]],
+                 sinks=(),
+                 dtype: Union[str, np.dtype] = np.float64
+                 ):
+        self.stages = list(stages)
+        self._sinks = (sinks,) if hasattr(sinks, "append_batch") else tuple(sinks)
+        self.dtype = np.dtype(dtype)
+        pass
+
+    def output_samples(self, samples: int) -> int:
+        for stage in self.stages:
+            samples = stage.output_samples(samples) if hasattr(stage, "output_samples") else samples
+        return samples
+
+    def apply(self, traces: np.ndarray) -> np.ndarray:
+        for stage in self.stages:
+            traces = stage(traces)
+        return np.asarray(traces, dtype=self.dtype)
+
+    def __call__(self,
+                 traces: np.ndarray,
+                 plains: Optional[np.ndarray] = None,
+                 ciphers: Optional[np.ndarray] = None
+                 ) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        `CapturePipeline` postprocess interface.
+        """
+        return self.apply(traces), plains, ciphers
+
+    def append_batch(self,
+                     traces: np.ndarray,
+                     plains: np.ndarray,
+                     ciphers: np.ndarray
+                     ) -> None:
+        """
+        Sink interface: preprocesses the batch and hands it to the downstream sinks.
+        """
+        traces = self.apply(traces)
+        for sink in self._sinks:
+            sink.append_batch(traces, plains, ciphers)
+        pass
+    pass
+
+
+def preprocess_array(traces: np.ndarray,
+                     preprocessor: Preprocessor,
+                     out: Optional[np.ndarray] = None,
+                     chunk_rows: int = 4096,
+                     n_jobs: int = 1
+                     ) -> np.ndarray:
+    """
+    Preprocesses an in-memory or memory-mapped (np.memmap / np.load(mmap_mode='r')) trace matrix chunk by chunk,
+    so only `n_jobs` chunks are materialized at a time. NumPy releases the GIL in the heavy kernels (FFT, reductions),
+    so the chunks are spread over a thread pool.
+
+    :param out: Output matrix (e.g. a writable np.memmap). Allocated if None
+    """
+    n, samples = traces.shape
+    if out is None:
+        out = np.empty((n, preprocessor.output_samples(samples)), dtype=preprocessor.dtype)
+    assert out.shape == (n, preprocessor.output_samples(samples))
+
+    def run(start: int) -> None:
+        out[start:start + chunk_rows] = preprocessor.apply(np.asarray(traces[start:start + chunk_rows]))
+
+    starts = range(0, n, chunk_rows)
+    if n_jobs == 1:
+        for start in starts:
+            run(start)
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs if n_jobs > 0 else os.cpu_count()) as pool:
+            list(pool.map(run, starts))
+    return out
+
+
+def _preprocess_store_chunk(args) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    src_path, preprocessor, start, stop = args
+    # Every process maps the store itself, so the source traces are never pickled.
+    traces, plains, ciphers = TraceStoreReader(src_path).read(start, stop, as_float=True)
+    return preprocessor.apply(traces), plains, ciphers
+
+
+def preprocess_store(src_path: str,
+                     dst_path: str,
+                     preprocessor: Preprocessor,
+                     chunk_rows: int = 4096,
+                     n_jobs: int = 1,
+                     mp_context: str = "spawn"
+                     ) -> int:
+    """
+    Preprocesses a `TraceStoreWriter` store into a new store. With n_jobs > 1 (0: all cores), row ranges are
+    processed by a process pool; each worker memory-maps the source store and only the (smaller) preprocessed
+    chunks are sent back. The rows keep their order.
+
+    :return: Number of rows written
+    """
+    reader = TraceStoreReader(src_path)
+    meta = reader.meta
+    samples = preprocessor.output_samples(meta["samples"])
+    jobs = [(src_path, preprocessor, start, min(start + chunk_rows, len(reader)))
+            for start in range(0, len(reader), chunk_rows)]
+    with TraceStoreWriter(dst_path, samples, meta["plain_len"], meta["cipher_len"],
+                          chunk_size=chunk_rows, trace_dtype=preprocessor.dtype, flush_interval=None) as writer:
+        if n_jobs == 1:
+            for job in jobs:
+                writer.append_batch(*_preprocess_store_chunk(job))
+        else:
+            ctx = mp.get_context(mp_context)
+            with ctx.Pool(n_jobs if n_jobs > 0 else os.cpu_count()) as pool:
+                for result in pool.imap(_preprocess_store_chunk, jobs):
+                    writer.append_batch(*result)
+        return len(writer)
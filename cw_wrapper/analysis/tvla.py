@@ -0,0 +1,190 @@
+import numpy as np
+from typing import Optional, Union, Tuple
+from ..simpleserial_target.ss1x_codec import Payload, to_bytes
+
+
+class _CentralMoments:
+    """
+    Per-sample count, mean and sums of powers of deviations (M2..M4) of one trace class.
+    Batches are folded in with the pairwise update of Chan et al. / Pebay, so the result
+    does not depend on how the traces were split into batches.
+    """
+    def __init__(self, samples: int, order: int):
+        self.n = 0
+        self.mean = np.zeros(samples, dtype=np.float64)
+        self.m = {p: np.zeros(samples, dtype=np.float64) for p in range(2, 2 * order + 1)}
+        pass
+
+    @classmethod
+    def from_batch(cls, traces: np.ndarray, order: int) -> "_CentralMoments":
+        moments = cls(traces.shape[1], order)
+        moments.n = traces.shape[0]
+        moments.mean = traces.mean(axis=0)
+        d = traces - moments.mean
+        d2 = d * d
+        moments.m[2] = d2.sum(axis=0)
+        if order >= 2:
+            moments.m[3] = (d2 * d).sum(axis=0)
+            moments.m[4] = (d2 * d2).sum(axis=0)
+        return moments
+
+    def merge(self, other: "_CentralMoments") -> None:
+        na, nb = self.n, other.n
+        if nb == 0:
+            return
+        if na == 0:
+            self.n, self.mean, self.m = nb, other.mean.copy(), {p: m.copy() for p, m in other.m.items()}
+            return
+        n = na + nb
+        d = other.mean - self.mean
+        d_n = d / n
+        m2a, m2b = self.m[2], other.m[2]
+        if 4 in self.m:
+            m3a, m3b = self.m[3], other.m[3]
+            self.m[4] = (self.m[4] + other.m[4]
+                         + d_n ** 4 * na * nb * (na * na - na * nb + nb * nb) * n
+                         + 6 * d_n ** 2 * (na * na * m2b + nb * nb * m2a)
+                         + 4 * d_n * (na * m3b - nb * m3a))
+            self.m[3] = m3a + m3b + d_n ** 3 * na * nb * (na - nb) * n + 3 * d_n * (na * m2b - nb * m2a)
+        self.m[2] = m2a + m2b + d * d_n * na * nb
+        self.mean = self.mean + d_n * nb
+        self.n = n
+        pass
+
+    def stats(self, order: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: Mean and (population) variance of the order-`order` preprocessed traces:
+                 x for order 1, (x - mean)^2 for order 2
+        """
+        if order == 1:
+            return self.mean, self.m[2] / self.n
+        m2 = self.m[2] / self.n
+        return m2, self.m[4] / self.n - m2 * m2
+    pass
+
+
+class TVLAAccumulator:
+    """
+    One-pass fixed-vs-random leakage assessment (Welch t-test, TVLA).
+
+    Per-sample centered moments of both classes are accumulated batch by batch, so memory is
+    O(samples) regardless of the number of traces, and first/second-order t-statistics can be read at any time.
+    Accumulators of the same shape (e.g. filled by different capture processes) can be combined with `merge`.
+
+    Can be passed as a sink to `CWScope.capture_stream` / `CapturePipeline`: rows whose input equals
+    `fixed_input` are counted as the fixed class, all others as the random class.
+    """
+    def __init__(self,
+                 samples: int,
+                 fixed_input: Optional[Payload] = None,
+                 order: int = 2
+                 ):
+        """
+        :param samples: Number of samples per trace
+        :param fixed_input: Input of the fixed class (required by `append_batch`)
+        :param order: Highest t-test order to support (1 or 2; 2 also tracks M3 and M4)
+        """
+        assert samples >= 1 and order in (1, 2)
+        self._samples = samples
+        self._order = order
+        self._fixed_input = None if fixed_input is None else np.frombuffer(to_bytes(fixed_input), dtype=np.uint8)
+        self._fixed = _CentralMoments(samples, order)
+        self._random = _CentralMoments(samples, order)
+        pass
+
+    @property
+    def samples(self) -> int:
+        return self._samples
+
+    @property
+    def order(self) -> int:
+        return self._order
+
+    @property
+    def n_fixed(self) -> int:
+        return self._fixed.n
+
+    @property
+    def n_random(self) -> int:
+        return self._random.n
+
+    def __len__(self) -> int:
+        return self._fixed.n + self._random.n
+
+    def reset(self) -> None:
+        self._fixed = _CentralMoments(self._samples, self._order)
+        self._random = _CentralMoments(self._samples, self._order)
+        pass
+
+    def update(self,
+               traces: np.ndarray,
+               is_fixed: Union[bool, np.ndarray]
+               ) -> None:
+        """
+        :param traces: (N, samples) traces (float or raw ADC integers; the t-statistics are scale invariant)
+        :param is_fixed: One class for the whole batch, or an (N,) boolean mask (True: fixed class)
+        """
+        traces = np.asarray(traces)
+        if traces.ndim == 1:
+            traces = traces[None, :]
+        assert traces.shape[1] == self._samples, \
+            f"Expected {self._samples} samples per trace, received {traces.shape[1]}."
+        traces = traces.astype(np.float64, copy=False)
+        if np.ndim(is_fixed) == 0:
+            if traces.shape[0] > 0:
+                (self._fixed if is_fixed else self._random).merge(_CentralMoments.from_batch(traces, self._order))
+            return
+        is_fixed = np.asarray(is_fixed, dtype=bool)
+        assert is_fixed.shape == (traces.shape[0],)
+        for moments, rows in ((self._fixed, traces[is_fixed]), (self._random, traces[~is_fixed])):
+            if rows.shape[0] > 0:
+                moments.merge(_CentralMoments.from_batch(rows, self._order))
+        pass
+
+    def append_batch(self,
+                     traces: np.ndarray,
+                     plains: np.ndarray,
+                     ciphers: Optional[np.ndarray] = None
+                     ) -> None:
+        """
+        Sink interface: classifies the rows by comparing `plains` with `fixed_input`.
+        """
+        assert self._fixed_input is not None, "'fixed_input' is required to classify the traces."
+        plains = np.asarray(plains, dtype=np.uint8)
+        self.update(traces, (plains == self._fixed_input).all(axis=1))
+        pass
+
+    def merge(self, other: "TVLAAccumulator") -> "TVLAAccumulator":
+        """
+        Adds the traces accumulated by `other` (in place).
+        """
+        assert other._samples == self._samples and other._order == self._order, \
+            "Only accumulators with the same number of samples and order can be merged."
+        self._fixed.merge(other._fixed)
+        self._random.merge(other._random)
+        return self
+
+    def t_test(self, order: int = 1) -> np.ndarray:
+        """
+        :param order: 1 (difference of means) or 2 (difference of variances)
+        :return: (samples,) Welch t-statistics (0 where both classes have zero variance)
+        """
+        assert 1 <= order <= self._order, f"The accumulator tracks moments up to order {self._order}."
+        assert self._fixed.n >= 2 and self._random.n >= 2, "Both classes need at least 2 traces."
+        mean_f, var_f = self._fixed.stats(order)
+        mean_r, var_r = self._random.stats(order)
+        denom = np.sqrt(var_f / self._fixed.n + var_r / self._random.n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (mean_f - mean_r) / denom
+        t[denom == 0] = 0.0
+        return t
+
+    def leaky_samples(self,
+                      order: int = 1,
+                      threshold: float = 4.5
+                      ) -> np.ndarray:
+        """
+        :return: Indices of the samples with |t| > `threshold`
+        """
+        return np.flatnonzero(np.abs(self.t_test(order)) > threshold)
+    pass
@@ -0,0 +1,146 @@
+import threading
+import numpy as np
+from typing import Optional, Tuple, Dict, List, Union
+from ..utils import tracing
+from ..utils.aes import aes128_encrypt_batch, aes128_encrypt_labels
+from ..simpleserial_target.ss1x_codec import Payload, to_bytes
+
+
+def verify_ciphertexts(plains: np.ndarray,
+                       ciphers: np.ndarray,
+                       keys: Union[Payload, np.ndarray],
+                       labels: bool = False,
+                       chunk_rows: int = 16384
+                       ) -> Tuple[np.ndarray, Optional[Dict[str, np.ndarray]]]:
+    """
+    Checks captured (key, plaintext, ciphertext) rows against the vectorized AES-128 model.
+
+    :param plains: (N, 16) uint8 plaintexts
+    :param ciphers: (N, 16) uint8 ciphertexts returned by the target
+    :param keys: Key of all rows, or (N, 16) uint8 matrix of per-row keys
+    :param labels: Also return the intermediate-value labels computed in the same pass
+                   (see `aes128_encrypt_labels`: "sbox_out", "hw_sbox", "hd_sbox", "hd_last")
+    :return: (N,) mask of the rows whose ciphertext is correct, and the labels (None if not requested)
+    """
+    plains = np.asarray(plains, dtype=np.uint8)
+    ciphers = np.asarray(ciphers, dtype=np.uint8)
+    if not isinstance(keys, np.ndarray):
+        keys = np.frombuffer(to_bytes(keys), dtype=np.uint8)
+    keys = np.atleast_2d(keys)
+    assert plains.shape == ciphers.shape and plains.shape[1] == 16
+    assert keys.shape[0] in (1, plains.shape[0])
+    n = plains.shape[0]
+    if not labels:
+        return (aes128_encrypt_batch(keys, plains, chunk_rows=chunk_rows) == ciphers).all(axis=1), None
+
+    ok = np.empty(n, dtype=bool)
+    result = {}
+    for start in range(0, n, chunk_rows):
+        stop = min(start + chunk_rows, n)
+        expected, chunk_labels = aes128_encrypt_labels(keys if keys.shape[0] == 1 else keys[start:stop],
+                                                       plains[start:stop])
+        ok[start:stop] = (expected == ciphers[start:stop]).all(axis=1)
+        for name, value in chunk_labels.items():
+            if name not in result:
+                result[name] = np.empty((n, 16), dtype=np.uint8)
+            result[name][start:stop] = value
+    return ok, result
+
+
+class CiphertextVerifier:
+    """
+    Catches targets which answer with wrong ciphertexts (glitches, desynchronization) before their traces reach
+    the dataset. Every batch is checked against the vectorized AES-128 model; mismatching rows are dropped
+    (or only flagged with `drop=False`) and counted.
+
+    Usable as `CapturePipeline(..., postprocess=verifier)` or as a sink in front of other sinks.
+    With `keep_labels=True`, the intermediate-value labels of the kept rows are collected (`labels()`).
+    """
+    def __init__(self,
+                 key: Payload,
+                 sinks=(),
+                 drop: bool = True,
+                 keep_labels: bool = False,
+                 verbose: bool = True
+                 ):
+        """
+        :param key: AES-128 key loaded in the target
+        :param sinks: Downstream sinks of the sink interface
+        :param drop: Drop mismatching rows (otherwise they are kept and only recorded in `mismatch_rows`)
+        :param keep_labels: Collect the labels of the kept rows
+        """
+        self._key = np.frombuffer(to_bytes(key), dtype=np.uint8)
+        assert self._key.shape[0] == 16, "AES-128 key must be 16 bytes."
+        self._sinks = (sinks,) if hasattr(sinks, "append_batch") else tuple(sinks)
+        self._drop = drop
+        self._keep_labels = keep_labels
+        self._verbose = verbose
+        self._labels: List[Dict[str, np.ndarray]] = []
+        self.n_checked = 0
+        self.mismatch_rows: List[int] = []  # indices among all checked rows
+        self._lock = threading.Lock()  # the postprocess may run on several pipeline workers
+        pass
+
+    @property
+    def n_mismatch(self) -> int:
+        return len(self.mismatch_rows)
+
+    def check(self,
+              traces: np.ndarray,
+              plains: np.ndarray,
+              ciphers: np.ndarray
+              ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ok, labels = verify_ciphertexts(plains, ciphers, self._key, labels=self._keep_labels)
+        bad = np.flatnonzero(~ok)
+        if self._drop and bad.shape[0] > 0:
+            traces, plains, ciphers = traces[ok], plains[ok], ciphers[ok]
+            if labels is not None:
+                labels = {name: value[ok] for name, value in labels.items()}
+        with self._lock:
+            self.mismatch_rows.extend((self.n_checked + bad).tolist())
+            self.n_checked += ok.shape[0]
+            if labels is not None:
+                self._labels.append(labels)
+        if bad.shape[0] > 0:
+            tracing.warn("verify.mismatch", f"[VERIFY] {bad.shape[0]} of {ok.shape[0]} ciphertexts do not match the "
+                                            f"AES model{' (dropped)' if self._drop else ''}.",
+                         {"mismatch": int(bad.shape[0]), "checked": int(ok.shape[0])}, echo=self._verbose)
+        return traces, plains, ciphers
+
+    def __call__(self,
+                 traces: np.ndarray,
+                 plains: np.ndarray,
+                 ciphers: np.ndarray
+                 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        `CapturePipeline` postprocess interface.
+        """
+        return self.check(traces, plains, ciphers)
+
+    def append_batch(self,
+                     traces: np.ndarray,
+                     plains: np.ndarray,
+                     ciphers: np.ndarray
+                     ) -> None:
+        """
+        Sink interface: verifies the batch and hands the (kept) rows to the downstream sinks.
+        """
+        traces, plains, ciphers = self.check(traces, plains, ciphers)
+        for sink in self._sinks:
+            sink.append_batch(traces, plains, ciphers)
+        pass
+
+    def labels(self) -> Dict[str, np.ndarray]:
+        """
+        :return: Labels of all kept rows in the order they were checked (empty if `keep_labels` is False)
+        """
+        if len(self._labels) == 0:
+            return {}
+        return {name: np.concatenate([batch[name] for batch in self._labels]) for name in self._labels[0]}
+
+    def reset(self) -> None:
+        self._labels = []
+        self.n_checked = 0
+        self.mismatch_rows = []
+        pass
+    pass
@@ -0,0 +1,5 @@
+__all__ = ['StageTimer', 'run_benchmark', 'save_results', 'compare_codecs', 'measure_import']
+
+from .capture_bench import StageTimer, run_benchmark, save_results
+from .codec_bench import compare_codecs
+from .import_bench import measure_import
@@ -0,0 +1,9 @@
+import sys
+from . import capture_bench, codec_bench, import_bench
+
+# python -m cw_wrapper.benchmark [capture|codec|imports] [options]
+_commands = {"capture": capture_bench.main, "codec": codec_bench.main, "imports": import_bench.main}
+
+if len(sys.argv) > 1 and sys.argv[1] in _commands:
+    sys.exit(_commands[sys.argv[1]](sys.argv[2:]))
+sys.exit(capture_bench.main())
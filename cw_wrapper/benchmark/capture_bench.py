@@ -0,0 +1,205 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import itertools
+import platform
+import numpy as np
+from typing import Optional, Sequence, Dict, List
+from ..scope import CWScope
+
+STAGES = ("arm", "serial_write", "serial_read", "wait_ack", "capture", "get_last_trace")
+
+
+class StageTimer:
+    """
+    Wraps methods of live objects so that every call records its latency under a stage name.
+    Latencies are inclusive, e.g. "wait_ack" contains the "serial_read" it performs.
+    """
+    def __init__(self):
+        self._latencies: Dict[str, List[float]] = {}
+        self._wrapped = []
+        pass
+
+    def wrap(self, obj, attr: str, stage: str) -> None:
+        original = getattr(obj, attr)
+        latencies = self._latencies.setdefault(stage, [])
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                latencies.append(perf_counter() - started)
+        setattr(obj, attr, timed)
+        self._wrapped.append((obj, attr))
+        pass
+
+    def unwrap(self) -> None:
+        for obj, attr in self._wrapped:
+            delattr(obj, attr)  # removes the instance attribute and exposes the class method again
+        self._wrapped = []
+        pass
+
+    def reset(self) -> None:
+        for latencies in self._latencies.values():
+            latencies.clear()
+        pass
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for stage, latencies in self._latencies.items():
+            if not latencies:
+                continue
+            x = np.asarray(latencies) * 1e3
+            result[stage] = {
+                "count": int(x.size),
+                "mean_ms": float(x.mean()),
+                "p50_ms": float(np.percentile(x, 50)),
+                "p99_ms": float(np.percentile(x, 99)),
+                "total_ms": float(x.sum()),
+            }
+        return result
+    pass
+
+
+def instrument(scope: CWScope, timer: StageTimer) -> None:
+    """
+    Attaches `timer` to the per-stage methods of a connected `CWScope`.
+    """
+    ss_target = scope.get_simple_serial_target()
+    timer.wrap(scope._scope, "arm", "arm")
+    timer.wrap(scope._scope, "capture", "capture")
+    timer.wrap(scope._scope, "get_last_trace", "get_last_trace")
+    timer.wrap(ss_target, "_serial_raw_write", "serial_write")
+    timer.wrap(ss_target, "_serial_raw_read", "serial_read")
+    timer.wrap(ss_target, "ss_wait_ack", "wait_ack")
+    pass
+
+
+def run_benchmark(backend: str = "sim",
+                  samples: Sequence[int] = (5000,),
+                  ss_versions: Sequence[str] = ("1.1",),
+                  payload_lens: Sequence[int] = (16,),
+                  bauds: Sequence[Optional[int]] = (None,),
+                  n_traces: int = 500,
+                  warmup: int = 10,
+                  cmd: str = 'p',
+                  resp: str = 'r',
+                  resp_len: Optional[int] = None,
+                  backend_kwargs: Optional[dict] = None,
+                  verbose: bool = True
+                  ) -> List[dict]:
+    """
+    Measures traces/sec and per-stage latencies for every combination of the swept parameters.
+    A configuration which fails (e.g. a payload length the firmware does not accept) is reported with
+    its "error" instead of aborting the sweep.
+
+    :return: One result dict per configuration
+    """
+    results = []
+    backend_kwargs = {} if backend_kwargs is None else backend_kwargs
+    for ss_version in ss_versions:
+        scope = CWScope()
+        scope.connect(verbose=False, ss_version=ss_version, backend=backend, **backend_kwargs)
+        try:
+            for n_samples, payload_len, baud in itertools.product(samples, payload_lens, bauds):
+                result = {
+                    "backend": backend,
+                    "ss_version": ss_version,
+                    "samples": n_samples,
+                    "payload_len": payload_len,
+                    "baud": baud,
+                    "n_traces": n_traces,
+                }
+                timer = StageTimer()
+                try:
+                    scope.set_scope_detail(samples=n_samples)
+                    if baud is not None:
+                        scope._target.baud = baud
+                    result["baud"] = scope._target.baud
+                    kwargs = dict(cmd=cmd, resp=resp, payload_len=payload_len,
+                                  resp_len=payload_len if resp_len is None else resp_len, max_retries=3)
+                    if warmup > 0:
+                        scope.capture_batch(warmup, **kwargs)
+                    instrument(scope, timer)
+                    _, _, _, report = scope.capture_batch(n_traces, **kwargs)
+                    result["traces_per_sec"] = report["traces_per_sec"]
+                    result["failed"] = int(report["failed"].sum())
+                    result["retries"] = int(report["retries"].sum())
+                    result["stages"] = timer.summary()
+                except Exception as e:
+                    result["error"] = f"{type(e).__name__}: {e}"
+                finally:
+                    timer.unwrap()
+                results.append(result)
+                if verbose:
+                    if "error" in result:
+                        print(f"[BENCH] ss={ss_version} samples={n_samples} payload={payload_len} "
+                              f"baud={result['baud']}: {result['error']}", file=sys.stderr)
+                    else:
+                        print(f"[BENCH] ss={ss_version} samples={n_samples} payload={payload_len} "
+                              f"baud={result['baud']}: {result['traces_per_sec']:.1f} traces/s")
+        finally:
+            scope.disconnect(verbose=False)
+    return results
+
+
+def save_results(results: List[dict],
+                 out_dir: str,
+                 tag: Optional[str] = None
+                 ) -> Dict[str, str]:
+    """
+    Writes `results` as JSON (full detail) and CSV (one row per configuration and stage).
+
+    :return: Paths of the written files
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    tag = time.strftime("%Y%m%d-%H%M%S") if tag is None else tag
+    json_path = os.path.join(out_dir, f"capture_bench_{tag}.json")
+    csv_path = os.path.join(out_dir, f"capture_bench_{tag}.csv")
+    with open(json_path, 'w') as f:
+        json.dump({"host": platform.node(), "python": platform.python_version(),
+                   "time": time.time(), "results": results}, f, indent=2)
+    columns = ("backend", "ss_version", "samples", "payload_len", "baud", "n_traces", "traces_per_sec",
+               "failed", "retries", "error", "stage", "count", "mean_ms", "p50_ms", "p99_ms", "total_ms")
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for result in results:
+            stages = result.get("stages") or {"": {}}
+            for stage, stat in stages.items():
+                writer.writerow(dict(result, stage=stage, **stat))
+    return {"json": json_path, "csv": csv_path}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cw_wrapper.benchmark",
+                                     description="Capture throughput benchmark with per-stage latency breakdown.")
+    parser.add_argument("--backend", default="sim", help="connect() backend (default: sim)")
+    parser.add_argument("--samples", type=int, nargs="+", default=[5000])
+    parser.add_argument("--ss-version", nargs="+", default=["1.1"], choices=("1.0", "1.1", "2.0"))
+    parser.add_argument("--payload-len", type=int, nargs="+", default=[16])
+    parser.add_argument("--baud", type=int, nargs="+", default=[None])
+    parser.add_argument("--traces", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--cmd", default='p')
+    parser.add_argument("--resp", default='r')
+    parser.add_argument("--resp-len", type=int, default=None)
+    parser.add_argument("--realtime", action="store_true",
+                        help="emulate serial/USB transfer times with the sim backend")
+    parser.add_argument("--out", default="./bench_results")
+    parser.add_argument("--tag", default=None)
+    args = parser.parse_args(argv)
+
+    backend_kwargs = {"realtime": True} if args.realtime and args.backend == "sim" else {}
+    results = run_benchmark(backend=args.backend, samples=args.samples, ss_versions=args.ss_version,
+                            payload_lens=args.payload_len, bauds=args.baud, n_traces=args.traces,
+                            warmup=args.warmup, cmd=args.cmd, resp=args.resp, resp_len=args.resp_len,
+                            backend_kwargs=backend_kwargs)
+    paths = save_results(results, args.out, args.tag)
+    print(f"[BENCH] Results saved to {paths['json']} and {paths['csv']}")
+    return 1 if any("error" in x for x in results) else 0
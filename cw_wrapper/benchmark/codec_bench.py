@@ -0,0 +1,86 @@
+import time
+import argparse
+import numpy as np
+from typing import Optional, Sequence, List
+from ..simpleserial_target.ss1x_codec import SS1xFrame, decode_responses
+from ..simpleserial_target.ss2x_codec import SS2xFrame, decode_packets, crc8, crc8_table, cobs_stuff
+
+
+def _rate(fn, n: int) -> float:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    return n / elapsed if elapsed > 0 else float("inf")
+
+
+def compare_codecs(payload_lens: Sequence[int] = (16, 32, 64),
+                   n_frames: int = 20000,
+                   ss1_baud: int = 38400,
+                   ss2_baud: int = 230400,
+                   seed: int = 0
+                   ) -> List[dict]:
+    """
+    Compares SimpleSerial 1.x and 2.x for one command/response exchange per payload length:
+    bytes on the wire, host-side encode/decode rates and the resulting serial-bound exchanges/sec.
+
+    :return: One result dict per (protocol, payload length)
+    """
+    rng = np.random.default_rng(seed)
+    table = crc8_table()
+    results = []
+    for payload_len in payload_lens:
+        payloads = rng.integers(0, 256, size=(n_frames, payload_len), dtype=np.uint8)
+
+        ss1_frame = SS1xFrame('p', payload_len)
+        ss1_responses = ss1_frame.encode_batch(payloads)
+        ss1_responses[:, 0] = ord('r')
+        ss1_wire = (2 * payload_len + 2) * 2 + 4  # command + response + "z00\n"
+        results.append({
+            "protocol": "1.1",
+            "payload_len": payload_len,
+            "wire_bytes": ss1_wire,
+            "encode_per_sec": _rate(lambda: [ss1_frame.encode(row) for row in payloads], n_frames),
+            "encode_batch_per_sec": _rate(lambda: ss1_frame.encode_batch(payloads), n_frames),
+            "decode_batch_per_sec": _rate(lambda: decode_responses(ss1_responses, 'r', payload_len), n_frames),
+            "baud": ss1_baud,
+            "serial_bound_per_sec": ss1_baud / 10 / ss1_wire,
+        })
+
+        if payload_len > 249:
+            continue
+        ss2_frame = SS2xFrame('p', 0, payload_len)
+        ss2_responses = []
+        for row in payloads:
+            body = bytes((ord('r'), payload_len)) + row.tobytes()
+            ss2_responses.append(cobs_stuff(body + bytes((crc8(body, table),))))
+        ss2_wire = (payload_len + 6) + (payload_len + 5) + 6  # command + response + 'e' packet
+        results.append({
+            "protocol": "2.0",
+            "payload_len": payload_len,
+            "wire_bytes": ss2_wire,
+            "encode_per_sec": _rate(lambda: [ss2_frame.encode(row) for row in payloads], n_frames),
+            "encode_batch_per_sec": _rate(lambda: ss2_frame.encode_batch(payloads), n_frames),
+            "decode_batch_per_sec": _rate(lambda: decode_packets(ss2_responses, 'r', payload_len), n_frames),
+            "baud": ss2_baud,
+            "serial_bound_per_sec": ss2_baud / 10 / ss2_wire,
+        })
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cw_wrapper.benchmark codec",
+                                     description="SimpleSerial 1.x vs 2.x framing cost and wire size.")
+    parser.add_argument("--payload-len", type=int, nargs="+", default=[16, 32, 64])
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--ss1-baud", type=int, default=38400)
+    parser.add_argument("--ss2-baud", type=int, default=230400)
+    args = parser.parse_args(argv)
+
+    results = compare_codecs(args.payload_len, args.frames, args.ss1_baud, args.ss2_baud)
+    print(f"{'proto':>5} {'len':>4} {'wire B':>7} {'enc/s':>10} {'enc_batch/s':>12} {'dec_batch/s':>12} "
+          f"{'baud':>7} {'serial-bound/s':>15}")
+    for x in results:
+        print(f"{x['protocol']:>5} {x['payload_len']:>4} {x['wire_bytes']:>7} {x['encode_per_sec']:>10.0f} "
+              f"{x['encode_batch_per_sec']:>12.0f} {x['decode_batch_per_sec']:>12.0f} {x['baud']:>7} "
+              f"{x['serial_bound_per_sec']:>15.1f}")
+    return 0
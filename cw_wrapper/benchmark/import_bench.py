@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+from typing import Optional, Sequence, List, Dict
+
+# Modules which must not be loaded by a plain `import cw_wrapper` (only on first use of the features needing them)
+HEAVY_MODULES = ("matplotlib", "chipwhisperer", "scipy", "pandas", "tqdm", "usb", "serial", "IPython")
+
+_PROBE = """
+import sys, json, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": sorted({{name.split('.')[0] for name in sys.modules}})}}))
+"""
+
+
+def _package_root() -> str:
+    # Directory containing the `cw_wrapper` package, so the probe imports this tree and not an installed copy.
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _run_probe(code: str, extra_args: Sequence[str] = ()) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (_package_root(), env.get("PYTHONPATH"))))
+    return subprocess.run([sys.executable, *extra_args, "-c", code], env=env, capture_output=True, text=True,
+                          check=True)
+
+
+def measure_import(module: str = "cw_wrapper",
+                   repeats: int = 5
+                   ) -> Dict:
+    """
+    Imports `module` in `repeats` fresh interpreters.
+
+    :return: Median/min import seconds and the top-level modules loaded by the import
+    """
+    assert repeats >= 1
+    runs = [json.loads(_run_probe(_PROBE.format(module=module)).stdout) for _ in range(repeats)]
+    seconds = [run["seconds"] for run in runs]
+    baseline = set(json.loads(_run_probe(_PROBE.format(module="sys")).stdout)["modules"])
+    return {
+        "module": module,
+        "median_seconds": statistics.median(seconds),
+        "min_seconds": min(seconds),
+        "loaded": sorted(set(runs[0]["modules"]) - baseline),
+    }
+
+
+def slowest_imports(module: str = "cw_wrapper",
+                    top: int = 10
+                    ) -> List[Dict]:
+    """
+    :return: The `top` imports with the largest cumulative time, from `python -X importtime`
+    """
+    stderr = _run_probe(f"import {module}", ("-X", "importtime")).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self [us] | cumulative | imported package"
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    return sorted(rows, key=lambda x: x["cumulative_us"], reverse=True)[:top]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cw_wrapper.benchmark imports",
+                                     description="Import time of cw_wrapper in fresh interpreters. Exits with 1 "
+                                                 "if the import loads one of the heavy optional modules.")
+    parser.add_argument("--module", nargs="+", default=["cw_wrapper"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports listed")
+    parser.add_argument("--heavy", nargs="+", default=list(HEAVY_MODULES))
+    args = parser.parse_args(argv)
+
+    status = 0
+    for module in args.module:
+        result = measure_import(module, args.repeats)
+        print(f"import {module}: {result['median_seconds'] * 1e3:.1f} ms (median of {args.repeats}), "
+              f"min {result['min_seconds'] * 1e3:.1f} ms")
+        for row in slowest_imports(module, args.top):
+            print(f"  {row['cumulative_us'] / 1e3:>8.1f} ms  {row['module']}")
+        heavy = sorted(set(args.heavy) & set(result["loaded"]))
+        if heavy:
+            print(f"[BENCH] 'import {module}' loaded heavy modules: {', '.join(heavy)}", file=sys.stderr)
+            status = 1
+    return status
@@ -1,4 +1,30 @@
-__all__ = ['CWScope', 'cw_firmware_auto_update']
+__all__ = ['CWScope', 'cw_firmware_auto_update', 'segment_by_period', 'segment_by_markers', 'CapturePipeline', 'MultiDeviceCapture',
+           'FaultRecovery', 'RecoveryError', 'plan_windows', 'overlap_shifts',
+           'ClockTuner', 'save_profile', 'load_profile', 'list_profiles']
 
-from .cw_scope import CWScope
-from .cw_firmware_update import cw_firmware_auto_update
+from typing import TYPE_CHECKING
+from ..utils.lazy import lazy_exports
+
+# Imported on first access (PEP 562), so `import cw_wrapper` stays cheap for headless workers.
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'CWScope': '.cw_scope',
+    'cw_firmware_auto_update': '.cw_firmware_update',
+    'segment_by_period': '.segmentation', 'segment_by_markers': '.segmentation',
+    'plan_windows': '.stitching', 'overlap_shifts': '.stitching',
+    'ClockTuner': '.tuning',
+    'save_profile': '.profiles', 'load_profile': '.profiles', 'list_profiles': '.profiles',
+    'CapturePipeline': '.capture_pipeline',
+    'MultiDeviceCapture': '.multi_device',
+    'FaultRecovery': '.recovery', 'RecoveryError': '.recovery',
+})
+
+if TYPE_CHECKING:
+    from .cw_scope import CWScope
+    from .cw_firmware_update import cw_firmware_auto_update
+    from .segmentation import segment_by_period, segment_by_markers
+    from .stitching import plan_windows, overlap_shifts
+    from .tuning import ClockTuner
+    from .profiles import save_profile, load_profile, list_profiles
+    from .capture_pipeline import CapturePipeline
+    from .multi_device import MultiDeviceCapture
+    from .recovery import FaultRecovery, RecoveryError
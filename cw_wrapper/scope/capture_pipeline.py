@@ -0,0 +1,267 @@
+import time
+import queue
+import threading
+import numpy as np
+from typing import Optional, Callable, Dict, Union
+from ..utils import tracing
+from .cw_scope import CWScope
+from .recovery import FaultRecovery
+
+_STOP = object()
+
+
+class _StallClock:
+    """
+    Accumulates the time a stage spends blocked on a queue.
+    """
+    def __init__(self):
+        self.seconds = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+        pass
+
+    def get(self, q: queue.Queue):
+        try:
+            return q.get_nowait()
+        except queue.Empty:
+            pass
+        started = time.perf_counter()
+        item = q.get()
+        self._add(time.perf_counter() - started)
+        return item
+
+    def put(self, q: queue.Queue, item) -> None:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        started = time.perf_counter()
+        q.put(item)
+        self._add(time.perf_counter() - started)
+        pass
+
+    def _add(self, seconds: float) -> None:
+        with self._lock:
+            self.seconds += seconds
+            self.count += 1
+        pass
+    pass
+
+
+class CapturePipeline:
+    """
+    Producer/consumer capture engine which overlaps host work with acquisition.
+
+    Three stages run concurrently on blocks of `block_size` traces:
+        1. producer thread : generates the inputs of block i+1 and encodes their frames
+        2. calling thread  : arms, exchanges frames with the target and reads traces of block i
+        3. worker threads  : post-process block i-1 and hand it to the sinks (in capture order)
+    Stages are connected by bounded queues and the trace buffers come from a fixed pool,
+    so a slow stage applies backpressure instead of growing memory. The time every stage spends
+    blocked on its queues is reported as stall time.
+    """
+    def __init__(self,
+                 scope: CWScope,
+                 sinks=(),
+                 block_size: int = 64,
+                 queue_size: int = 4,
+                 n_workers: int = 1,
+                 postprocess: Optional[Callable] = None,
+                 cmd: str = 'p',
+                 resp: str = 'r',
+                 payload_len: int = 16,
+                 resp_len: int = 16,
+                 trace_dtype: Optional[Union[str, np.dtype]] = None,
+                 max_retries: Optional[int] = None,
+                 timeout: int = 500,
+                 recovery: Optional[FaultRecovery] = None,
+                 key_cmd: str = 'k'
+                 ):
+        """
+        :param scope: Connected `CWScope`
+        :param sinks: A sink or a sequence of sinks with `append_batch(traces, plains, ciphers)`.
+                      The arrays are views into pooled buffers which are reused once `append_batch` returns:
+                      a sink which keeps them must copy them
+        :param block_size: Number of traces per block
+        :param queue_size: Capacity of the input and output queues (in blocks)
+        :param n_workers: Number of post-processing threads
+        :param postprocess: `postprocess(traces, plains, ciphers) -> (traces, plains, ciphers)` run on workers
+        :param trace_dtype: dtype of the trace buffers (float64, or uint16 in raw mode, if None)
+        :param recovery: Fault recovery ladder used by the acquisition stage (see `CWScope.capture_batch`)
+        :param key_cmd: SimpleSerial command used to send per-trace keys, when `inputs` is a schedule
+                        with `keys(start, count)` (e.g. `FixedVsRandomKey`)
+        """
+        assert block_size >= 1 and queue_size >= 1 and n_workers >= 1
+        self._scope = scope
+        self._sinks = (sinks,) if hasattr(sinks, "append_batch") else tuple(sinks)
+        self._block_size = block_size
+        self._queue_size = queue_size
+        self._n_workers = n_workers
+        self._postprocess = postprocess
+        self._capture_kwargs = dict(cmd=cmd, resp=resp, payload_len=payload_len, resp_len=resp_len,
+                                    max_retries=max_retries, timeout=timeout, recovery=recovery)
+        self._trace_dtype = trace_dtype
+        self._key_cmd = key_cmd
+        pass
+
+    def run(self,
+            n: int,
+            inputs: Optional[Union[np.ndarray, Callable[[int, int], np.ndarray]]] = None,
+            stop_when: Optional[Callable[[], bool]] = None
+            ) -> Dict:
+        """
+        Captures `n` traces.
+
+        :param n: Number of traces
+        :param inputs: (n, payload_len) uint8 matrix, or `inputs(start, count)` returning the inputs of
+                       traces [start, start + count) (e.g. an `InputGenerator` schedule). Random if None
+        :param stop_when: Called after every captured block; the capture stops early when it returns True.
+                          The sinks may lag the acquisition by up to `queue_size + n_workers` blocks
+        :return: Report with throughput, failures and per-stage stall times
+        """
+        assert n >= 0
+        scope = self._scope
+        ss_target = scope.get_simple_serial_target()
+        block_size = self._block_size
+        payload_len = self._capture_kwargs["payload_len"]
+        cmd = self._capture_kwargs["cmd"]
+        key_cmd = self._key_cmd
+        samples = scope.get_samples()
+        trace_dtype = self._trace_dtype
+        if trace_dtype is None:
+            trace_dtype = np.uint16 if scope.is_raw_mode() else np.float64
+
+        in_queue = queue.Queue(maxsize=self._queue_size)
+        out_queue = queue.Queue(maxsize=self._queue_size)
+        free_buffers = queue.Queue()
+        for _ in range(self._queue_size + self._n_workers + 1):
+            free_buffers.put(np.empty(shape=(block_size, samples), dtype=trace_dtype))
+        stalls = {"producer_full": _StallClock(), "acquire_input": _StallClock(),
+                  "acquire_buffer": _StallClock(), "acquire_output": _StallClock(), "worker_idle": _StallClock()}
+        errors = []
+        stop = threading.Event()  # error: abandon the blocks in flight
+        halt = threading.Event()  # early stop: no new blocks, but store the ones in flight
+        write_turn = threading.Condition()
+        next_block = [0]
+        n_blocks = (n + block_size - 1) // block_size
+
+        def produce():
+            try:
+                for b in range(n_blocks):
+                    if stop.is_set() or halt.is_set():
+                        break
+                    start = b * block_size
+                    count = min(block_size, n - start)
+                    if inputs is None:
+                        plains = np.random.randint(0, 256, size=(count, payload_len), dtype=np.uint8)
+                    elif callable(inputs):
+                        plains = np.ascontiguousarray(inputs(start, count), dtype=np.uint8)
+                    else:
+                        plains = np.ascontiguousarray(inputs[start:start + count], dtype=np.uint8)
+                    frames = ss_target.encode_batch(cmd, plains)
+                    keys = inputs.keys(start, count) if hasattr(inputs, "keys") else None
+                    key_frames = None if keys is None else ss_target.encode_batch(key_cmd, keys)
+                    stalls["producer_full"].put(in_queue, (b, plains, frames, key_frames))
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                in_queue.put(_STOP)
+            pass
+
+        def consume():
+            while True:
+                item = stalls["worker_idle"].get(out_queue)
+                if item is _STOP:
+                    out_queue.put(_STOP)  # let the other workers stop as well
+                    return
+                b, buf, traces, plains, ciphers = item
+                try:
+                    if not stop.is_set() and self._postprocess is not None:
+                        traces, plains, ciphers = self._postprocess(traces, plains, ciphers)
+                except BaseException as e:
+                    errors.append(e)
+                    stop.set()
+                # Blocks reach the sinks in capture order, whichever worker finished first.
+                with write_turn:
+                    while next_block[0] != b:
+                        write_turn.wait()
+                    try:
+                        if not stop.is_set():
+                            for sink in self._sinks:
+                                sink.append_batch(traces, plains, ciphers)
+                    except BaseException as e:
+                        errors.append(e)
+                        stop.set()
+                    finally:
+                        next_block[0] += 1
+                        write_turn.notify_all()
+                free_buffers.put(buf)
+            pass
+
+        producer = threading.Thread(target=produce, name="capture-producer", daemon=True)
+        workers = [threading.Thread(target=consume, name=f"capture-worker-{i}", daemon=True)
+                   for i in range(self._n_workers)]
+        producer.start()
+        for worker in workers:
+            worker.start()
+
+        stored, n_failed, n_retries = 0, 0, 0
+        stopped_early = False
+        acquire_seconds = 0.0
+        started = time.perf_counter()
+        try:
+            while not stop.is_set():
+                item = stalls["acquire_input"].get(in_queue)
+                if item is _STOP:
+                    break
+                b, plains, frames, key_frames = item
+                buf = stalls["acquire_buffer"].get(free_buffers)
+                count = plains.shape[0]
+                acquire_started = time.perf_counter()
+                traces, plains, ciphers, report = scope.capture_batch(count, inputs=plains, out=buf[:count],
+                                                                      frames=frames, key_frames=key_frames,
+                                                                      **self._capture_kwargs)
+                acquire_seconds += time.perf_counter() - acquire_started
+                if report["failed"].any():
+                    ok = ~report["failed"]
+                    traces, plains, ciphers = traces[ok], plains[ok], ciphers[ok]
+                stored += traces.shape[0]
+                n_failed += int(report["failed"].sum())
+                n_retries += int(report["retries"].sum())
+                stalls["acquire_output"].put(out_queue, (b, buf, traces, plains, ciphers))
+                if stop_when is not None and b + 1 < n_blocks and stop_when():
+                    stopped_early = True
+                    halt.set()
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            # Unblock the producer if it waits on a full queue, then shut the workers down.
+            while producer.is_alive():
+                try:
+                    in_queue.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+            out_queue.put(_STOP)
+            for worker in workers:
+                worker.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            tracing.warn("pipeline.abort", f"[PIPELINE] Capture aborted. ({type(errors[0]).__name__}: {errors[0]})",
+                         {"error": type(errors[0]).__name__})
+            raise errors[0]
+
+        return {
+            "stored": stored,
+            "failed": n_failed,
+            "retries": n_retries,
+            "elapsed": elapsed,
+            "traces_per_sec": (stored / elapsed) if elapsed > 0 else float("inf"),
+            "acquire_seconds": acquire_seconds,
+            "stopped_early": stopped_early,
+            "stalls": {name: {"seconds": clock.seconds, "count": clock.count} for name, clock in stalls.items()},
+        }
+    pass
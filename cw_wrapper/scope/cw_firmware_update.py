@@ -1,7 +1,5 @@
-import chipwhisperer as cw
-
-
 def cw_firmware_auto_update():
+    import chipwhisperer as cw
     scope = cw.scope()
     _ = cw.target(scope)
     programmer = cw.SAMFWLoader(scope=scope)
@@ -1,56 +1,118 @@
 import sys
 import time
-import chipwhisperer as cw
 import numpy as np
-from typing import Optional, Dict, Union
-from chipwhisperer.capture import scopes
+from typing import Optional, Dict, Union, Sequence, Tuple, Callable, TYPE_CHECKING
 from ..simpleserial_target import SS1xTarget, SS2xTarget, programming_target
+from ..utils.backend import open_backend
+from ..utils import tracing
+from .segmentation import segment_by_period, segment_by_markers, period_from_trig_count
+from .stitching import plan_windows, overlap_shifts, place_segment, fill_uncovered
+from .recovery import FaultRecovery
+from .profiles import load_profile
+
+if TYPE_CHECKING:  # chipwhisperer is only needed by the "chipwhisperer" backend, which imports it on connect
+    import chipwhisperer as cw
 
 
 class CWScope:
     def __init__(self):
-        self._scope: Optional[cw.capture.scopes.OpenADC] = None
-        self._target: Optional[cw.targets.SimpleSerial] = None
+        self._scope: "Optional[cw.capture.scopes.OpenADC]" = None
+        self._target: "Optional[cw.targets.SimpleSerial]" = None
         self._ss_version: Optional[str] = None
         self._ss_target: Optional[Union[SS1xTarget, SS2xTarget]] = None
         self._prev_setting: dict = {}
+        self._mirror: dict = {}  # cached scope state (same keys as _prev_setting, plus read-only properties)
+        self._raw_mode: bool = False
+        self._backend: str = "chipwhisperer"
+        self._backend_kwargs: dict = {}
+        self._window_plans: Dict[Tuple[int, int, int, int], list] = {}  # capture_long window offsets
+        self._profile: Optional[Dict] = None  # target timing profile applied on (re)connect
         pass
 
     def reset(self,
               preserve_scope_setting: bool = True
               ) -> None:
-        self.disconnect()
+        if self._scope is not None:
+            try:
+                self._scope.dis()
+            except Exception as e:  # e.g. the USB link is already gone
+                print(f"[SCOPE] Disconnecting failed. ({type(e).__name__}: {e})", file=sys.stderr)
         self._scope = None
         self._target = None
         self._ss_version = None
         self._ss_target = None
+        self._mirror = {}
         if not preserve_scope_setting:
             self._prev_setting = {}
+            self._profile = None
         pass
 
     def connect(self,
                 verbose: bool = True,
-                ss_version: str = "1.1"
+                ss_version: str = "1.1",
+                backend: Optional[str] = None,
+                profile: Optional[Union[str, Dict]] = None,
+                **backend_kwargs
                 ) -> None:
+        """
+        :param verbose: Print the name of the connected scope
+        :param ss_version: SimpleSerial version of the target ("1.0", "1.1" or "2.0")
+        :param backend: "chipwhisperer" (hardware), "sim" (simulated scope and target) or any name registered
+                        with `register_backend`. The previous backend (default: "chipwhisperer") if None
+        :param profile: Target timing profile applied after connecting (name of a profile saved by `ClockTuner`,
+                        path or dict; see `apply_profile`). Re-applied by `reconnect`
+        :param backend_kwargs: Backend-specific options (e.g. `sn` or `noise_std`), kept for `reconnect`
+        :return: None
+        """
         assert ss_version in ("1.0", "1.1", "2.0")
-        self._scope = cw.scope(scope_type=scopes.OpenADC)
-        self._scope.default_setup()
+        if backend is not None:
+            self._backend = backend
+            self._backend_kwargs = backend_kwargs
+        self._scope, self._target = open_backend(self._backend, ss_version, **self._backend_kwargs)
         if ss_version == "2.0":
-            self._target = cw.target(self._scope, target_type=cw.targets.SimpleSerial2)
             self._ss_target = SS2xTarget(self._scope, self._target)
         else:  # SimpleSerial 1.x
-            self._target = cw.target(self._scope, target_type=cw.targets.SimpleSerial)
             self._ss_target = SS1xTarget(self._scope, self._target)
+        self.invalidate_cache()
         if verbose:
-            print(f"{self._scope.get_name()} Connected!")
+            print(f"{self._mirror['name']} Connected!")
         self._ss_version = ss_version
+        if profile is not None:
+            self.apply_profile(profile, verbose=verbose)
+        pass
+
+    def invalidate_cache(self) -> None:
+        """
+        Re-reads the cached mirror of the scope state from the device.
+        Called on every (re)connect; call it manually if the scope was changed behind `CWScope`'s back
+        (e.g. through `scope._scope` or after a firmware update without reconnecting).
+        """
+        adc, clock = self._scope.adc, self._scope.clock
+        self._mirror = {
+            "name": self._scope.get_name(),
+            "fw_version": getattr(self._scope, "fw_version_str", None),
+            "bits_per_sample": getattr(adc, "bits_per_sample", 10),
+            "samples": adc.samples,
+            "trigger_mode": adc.basic_mode,
+            "offset": adc.offset,
+            "pre_samples": adc.presamples,
+            "scale": clock.adc_src,
+            "clkgen_freq": clock.clkgen_freq,
+        }
+        pass
+
+    def _apply_setting(self, key: str, value, obj, attr: str) -> None:
+        # Only settings which differ from the mirror are written to the device.
+        if self._mirror.get(key) != value:
+            setattr(obj, attr, value)
+            self._mirror[key] = value
+        self._prev_setting[key] = value
         pass
 
     def disconnect(self,
                    verbose: bool = True
                    ) -> None:
         if self._scope is not None:
-            self._scope.dis()
             if verbose:
                 print("Disconnected!")
         else:
@@ -63,9 +125,22 @@ class CWScope:
                   verbose: bool = True,
                   preserve_scope_setting: bool = True
                   ) -> None:
+        ss_version = self._ss_version
+        prev_setting = dict(self._prev_setting)
+        profile = self._profile
         self.disconnect(verbose=verbose)
-        self.connect(verbose, self._ss_version)
+        try:
+            self.connect(verbose, ss_version, profile=profile)
+        except Exception:
+            # Keep what is needed to reconnect, so that a later attempt can succeed (e.g. once the USB device
+            # has re-enumerated). The backend and its options are not cleared by `disconnect`.
+            self.reset(preserve_scope_setting=True)
+            self._ss_version = ss_version
+            self._prev_setting = prev_setting
+            self._profile = profile
+            raise
         if preserve_scope_setting:
+            self._prev_setting = prev_setting
             self.set_scope_detail(samples=self._prev_setting["samples"] if "samples" in self._prev_setting else None,
                                   trigger_mode=self._prev_setting["trigger_mode"] if "trigger_mode"
                                                                                      in self._prev_setting else None,
@@ -86,39 +161,38 @@ class CWScope:
                          ) -> None:
         if samples is not None:
             assert 0 <= samples <= 24400
-            self._scope.adc.samples = samples
-            self._prev_setting["samples"] = samples
+            self._apply_setting("samples", samples, self._scope.adc, "samples")
         if trigger_mode is not None:
             assert trigger_mode in ("rising_edge", "falling_edge")
-            self._scope.adc.basic_mode = trigger_mode
-            self._prev_setting["trigger_mode"] = trigger_mode
+            self._apply_setting("trigger_mode", trigger_mode, self._scope.adc, "basic_mode")
         if offset is not None:
             assert offset >= 0
-            self._scope.adc.offset = offset
-            self._prev_setting["offset"] = offset
+            self._apply_setting("offset", offset, self._scope.adc, "offset")
         if pre_samples is not None:
             assert pre_samples >= 0
-            self._scope.adc.presamples = pre_samples
-            self._prev_setting["pre_samples"] = pre_samples
+            self._apply_setting("pre_samples", pre_samples, self._scope.adc, "presamples")
         if scale is not None:
             assert scale in ("clkgen_x1", "clkgen_x4")
-            self._scope.clock.adc_src = scale
-            self._prev_setting["scale"] = scale
+            self._apply_setting("scale", scale, self._scope.clock, "adc_src")
         pass
 
     def get_status(self,
                    verbose: bool = True
                    ) -> Dict:
+        """
+        Answered from the cached mirror; only the trigger count of the last capture is read from the device.
+        """
+        mirror = self._mirror
         result = {
             "connected": self._scope.getStatus(),
-            "name": self._scope.get_name(),
-            "samples": self._scope.adc.samples,
-            "trig_mode": self._scope.adc.basic_mode,
-            "offset": self._scope.adc.offset,
-            "pre_samples": self._scope.adc.presamples,
-            "scale": self._scope.clock.adc_src,
+            "name": mirror["name"],
+            "samples": mirror["samples"],
+            "trig_mode": mirror["trigger_mode"],
+            "offset": mirror["offset"],
+            "pre_samples": mirror["pre_samples"],
+            "scale": mirror["scale"],
             "last_trig_cnt": f"{self._scope.adc.trig_count}"
-            if self._scope.adc.basic_mode == "rising_edge" else "unknown",
+            if mirror["trigger_mode"] == "rising_edge" else "unknown",
         }
         if verbose:
             print(f"-------------------------------- INFO --------------------------------\n",
@@ -137,6 +211,12 @@ class CWScope:
     def get_last_trig_cnt(self) -> int:
         return self._scope.adc.trig_count
 
+    def get_samples(self) -> int:
+        """
+        :return: Number of samples per trace (from the cached mirror)
+        """
+        return self._mirror["samples"]
+
     def print_scope_status(self) -> None:
         print(self._scope)
         pass
@@ -149,16 +229,563 @@ class CWScope:
         return self._ss_target
 
     def arm(self) -> None:
-        self._scope.arm()
+        tracer = tracing.active
+        if tracer is None:
+            self._scope.arm()
+        else:
+            started = tracing.now()
+            self._scope.arm()
+            tracer.span("arm", started)
+        pass
+
+    def set_raw_mode(self, enable: bool = True) -> None:
+        """
+        In raw mode, traces are returned as the integer ADC readings instead of float64.
+        Use `get_trace_scale` to convert them (`float = raw * scale + offset`).
+        """
+        self._raw_mode = enable
         pass
 
-    def get_waveform(self) -> Optional[np.ndarray]:
+    def is_raw_mode(self) -> bool:
+        return self._raw_mode
+
+    def get_trace_scale(self) -> Tuple[float, float]:
+        """
+        :return: (scale, offset) which map raw ADC readings to the float values of `get_last_trace()`
+        """
+        bits = self._mirror["bits_per_sample"]
+        return 1.0 / (1 << bits), -0.5
+
+    def get_waveform(self, as_int: Optional[bool] = None) -> Optional[np.ndarray]:
+        tracer = tracing.active
+        if tracer is not None:
+            return self._get_waveform_traced(tracer, as_int)
         ret = self._scope.capture()
         if ret:
-            print("[SCOPE] Timeout happened during capture", file=sys.stderr)
+            tracing.warn("capture.timeout", "[SCOPE] Timeout happened during capture")
             return None
+        if self._raw_mode if as_int is None else as_int:
+            return self._scope.get_last_trace(as_int=True)
         return self._scope.get_last_trace()
 
+    def _get_waveform_traced(self, tracer: "tracing.Tracer", as_int: Optional[bool]) -> Optional[np.ndarray]:
+        # Same as `get_waveform`, with the wait for the trigger ("capture") and the transfer ("readout") timed.
+        started = tracing.now()
+        ret = self._scope.capture()
+        tracer.span("capture", started)
+        if ret:
+            tracing.warn("capture.timeout", "[SCOPE] Timeout happened during capture")
+            return None
+        started = tracing.now()
+        if self._raw_mode if as_int is None else as_int:
+            trace = self._scope.get_last_trace(as_int=True)
+        else:
+            trace = self._scope.get_last_trace()
+        tracer.span("readout", started)
+        return trace
+
+    def _recover(self,
+                 recovery: FaultRecovery,
+                 stage: str
+                 ) -> str:
+        # Runs the escalation ladder after a failed iteration. A failed reconnect leaves no scope, so the
+        # reconnect is retried until it succeeds or its budget is exhausted (`RecoveryError`); the capture
+        # loops then re-bind the methods of the new scope.
+        level = recovery.on_failure(self, stage)
+        while self._scope is None:
+            level = recovery.on_failure(self, "reconnect")
+        return level
+
+    def capture_batch(self,
+                      n: int,
+                      inputs: Optional[Union[np.ndarray, Sequence[Union[str, bytes, bytearray]]]] = None,
+                      cmd: str = 'p',
+                      resp: str = 'r',
+                      payload_len: int = 16,
+                      resp_len: int = 16,
+                      out: Optional[np.ndarray] = None,
+                      max_retries: Optional[int] = None,
+                      timeout: int = 500,
+                      frames: Optional[Sequence[bytes]] = None,
+                      recovery: Optional[FaultRecovery] = None,
+                      keys: Optional[np.ndarray] = None,
+                      key_cmd: str = 'k',
+                      key_frames: Optional[Sequence[bytes]] = None
+                      ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict]:
+        """
+        Captures `n` traces in a single call.
+        For each trace the scope is armed, `inputs[i]` is sent with `cmd`, the response of `resp` is read
+        and the waveform is copied into row `i` of the trace matrix.
+        A failed iteration (write, read or capture) is retried for the same input.
+
+        :param n: Number of traces to capture
+        :param inputs: (n, payload_len) uint8 matrix or sequence of hex strings/bytes. Random if None
+        :param cmd: SimpleSerial command used to send the input
+        :param resp: SimpleSerial command expected in the response
+        :param payload_len: Length of each input in bytes
+        :param resp_len: Length of each response in bytes
+        :param out: Preallocated (n, samples) trace matrix.
+                    Allocated as float64 (uint16 in raw mode) if None
+        :param max_retries: Retry budget per trace. None means retrying until success
+        :param timeout: Serial timeout in ms
+        :param frames: Frames already encoded from `inputs` (e.g. by a producer thread), to skip encoding
+        :param recovery: Escalation ladder run after every failure (flush / target reset / reconnect).
+                         With it, I/O errors of the scope or serial link (`recovery.recoverable_errors`) are
+                         recovered from instead of raised; any other exception is still raised
+        :param keys: (n, key_len) uint8 matrix of per-trace keys sent with `key_cmd` before each trace
+                     (e.g. `FixedVsRandomKey.keys`). None keeps the key already loaded in the target
+        :param key_frames: Frames already encoded from `keys`, to skip encoding
+        :return: (traces, plains, ciphers, report)
+                 `report` holds per-trace retry counts ("retries"), a mask of traces which exhausted the
+                 retry budget ("failed"), a list of (index, stage) failure records ("failures"),
+                 the elapsed time ("elapsed") and the achieved rate ("traces_per_sec").
+        """
+        assert n >= 0
+        assert 1 <= payload_len <= 64 and 1 <= resp_len <= 64
+        assert max_retries is None or max_retries >= 0
+        samples = self._mirror["samples"]
+        if out is None:
+            out = np.empty(shape=(n, samples), dtype=np.uint16 if self._raw_mode else np.float64)
+        assert self._raw_mode or out.dtype.kind == 'f', "Float traces cannot be stored in an integer matrix."
+        assert out.ndim == 2 and out.shape[0] >= n and out.shape[1] == samples, \
+            f"'out' must have the shape of at least ({n}, {samples})."
+
+        if inputs is None:
+            plains = np.random.randint(0, 256, size=(n, payload_len), dtype=np.uint8)
+        elif isinstance(inputs, np.ndarray):
+            assert inputs.shape[0] >= n and inputs.shape[1] == payload_len
+            plains = np.ascontiguousarray(inputs[:n], dtype=np.uint8)
+        else:
+            assert len(inputs) >= n
+            plains = np.empty(shape=(n, payload_len), dtype=np.uint8)
+            for i in range(n):
+                x = inputs[i]
+                plains[i] = np.frombuffer(bytes.fromhex(x.strip()) if isinstance(x, str) else bytes(x),
+                                          dtype=np.uint8)
+        responses = [bytes(resp_len)] * n
+        retries = np.zeros(shape=n, dtype=np.int32)
+        failed = np.zeros(shape=n, dtype=bool)
+        failures = []
+
+        # Everything that does not depend on the USB round trip is hoisted out of the loop.
+        if frames is None:
+            frames = self._ss_target.encode_batch(cmd, plains)
+        assert len(frames) >= n
+        if key_frames is None and keys is not None:
+            assert keys.shape[0] >= n
+            key_frames = self._ss_target.encode_batch(key_cmd, np.ascontiguousarray(keys[:n], dtype=np.uint8))
+        assert key_frames is None or len(key_frames) >= n
+        # With a tracer installed, `self.arm` records the "arm" span; otherwise the device is armed directly.
+        tracer = tracing.active
+        arm = self._scope.arm if tracer is None else self.arm
+        ss_write_frame = self._ss_target.ss_write_frame
+        ss_read_bytes = self._ss_target.ss_read_bytes
+        get_waveform = self.get_waveform
+
+        started = time.perf_counter()
+        batch_started = tracing.now() if tracer is not None else 0
+        for i in range(n):
+            frame = frames[i]
+            if tracer is not None:
+                trace_started = tracing.now()
+            while True:
+                try:
+                    if key_frames is not None and not ss_write_frame(key_frames[i], following_ack=True,
+                                                                     timeout=timeout):
+                        t, c, stage = None, None, "key"
+                    else:
+                        arm()
+                        if not ss_write_frame(frame, following_ack=False, timeout=timeout):
+                            c = None
+                            stage = "write"
+                        else:
+                            c = ss_read_bytes(resp, resp_len, following_ack=True, timeout=timeout)
+                            stage = "read"
+                        t = get_waveform()
+                except Exception as e:
+                    if recovery is None or not isinstance(e, recovery.recoverable_errors):
+                        raise
+                    t, c, stage = None, None, "exception"
+                if t is not None and c is not None:
+                    out[i] = t
+                    responses[i] = c
+                    if recovery is not None:
+                        recovery.on_success()
+                    break
+                stage = stage if c is None else "capture"
+                failures.append((i, stage))
+                if tracer is not None:
+                    tracer.event("trace.failure", {"index": i, "stage": stage})
+                if recovery is not None and self._recover(recovery, stage) == "reconnect":
+                    arm = self._scope.arm if tracer is None else self.arm
+                    ss_write_frame = self._ss_target.ss_write_frame
+                    ss_read_bytes = self._ss_target.ss_read_bytes
+                if max_retries is not None and retries[i] >= max_retries:
+                    failed[i] = True
+                    if tracer is not None:
+                        tracer.event("trace.dropped", {"index": i})
+                    break
+                retries[i] += 1
+            if tracer is not None:
+                tracer.span("trace", trace_started, {"index": i})
+        elapsed = time.perf_counter() - started
+        if tracer is not None:
+            tracer.span("capture_batch", batch_started, {"n": n})
+        ciphers = np.frombuffer(b"".join(responses), dtype=np.uint8).reshape(n, resp_len).copy()
+
+        report = {
+            "retries": retries,
+            "failed": failed,
+            "failures": failures,
+            "elapsed": elapsed,
+            "traces_per_sec": (n / elapsed) if elapsed > 0 else float("inf"),
+        }
+        return out[:n], plains, ciphers, report
+
+    def capture_multi(self,
+                      n: int,
+                      k: int,
+                      period: Optional[int] = None,
+                      segment_len: Optional[int] = None,
+                      first_offset: int = 0,
+                      markers: Optional[Sequence[int]] = None,
+                      inputs: Optional[np.ndarray] = None,
+                      cmd: str = 'b',
+                      resp: str = 'r',
+                      block_len: int = 16,
+                      out: Optional[np.ndarray] = None,
+                      max_retries: Optional[int] = None,
+                      timeout: int = 500,
+                      recovery: Optional[FaultRecovery] = None
+                      ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict]:
+        """
+        Captures `n` traces with `k` operations per trigger.
+        The target receives `k` concatenated input blocks through one batch command (`cmd`), runs them
+        back to back and answers with `k` concatenated output blocks (`resp`). The single captured window
+        is then cut into `k` traces, so the arm/serial/USB round trip is paid once per `k` traces.
+
+        One batch frame carries `k * block_len` bytes, which must fit the firmware buffer of the batch command
+        (and the protocol: 64 bytes for SimpleSerial 1.x, 249 for 2.0). E.g. the simulated SimpleSerial 1.x
+        target accepts 64 bytes, so at most 4 AES blocks per trigger.
+        The segment geometry is checked against the scope's `samples` before capturing.
+
+        :param n: Number of traces to capture (multiple of `k`)
+        :param k: Number of operations per trigger
+        :param period: Distance between operations in samples.
+                       If None (and no `markers`), derived from the trigger count of each capture
+        :param segment_len: Length of each trace (default: `period`)
+        :param first_offset: Sample of the window at which the first operation starts
+        :param markers: Start samples of the `k` operations (instead of `period`)
+        :param inputs: (n, block_len) uint8 matrix. Random if None
+        :param cmd: Batch SimpleSerial command
+        :param resp: SimpleSerial command expected in the response
+        :param block_len: Length of one input/output block in bytes
+        :param out: Preallocated (n, segment_len) trace matrix
+        :param max_retries: Retry budget per trigger. None means retrying until success
+        :param timeout: Serial timeout in ms
+        :param recovery: Escalation ladder run after every failure (see `capture_batch`)
+        :return: (traces, plains, ciphers, report) as `capture_batch`, with per-trigger "retries"/"failed"
+        :raises ValueError: A window could not be cut into `k` segments (with the period from the trigger count)
+        """
+        assert k >= 1 and n >= 0 and n % k == 0, "'n' must be a multiple of 'k'."
+        assert markers is None or len(markers) == k
+        groups = n // k
+        if segment_len is None:
+            if period is not None:
+                segment_len = period
+            else:
+                assert markers is not None and k > 1, "'segment_len' is required without 'period'."
+                segment_len = int(np.min(np.diff(np.sort(markers))))
+        max_frame_len = 64 if isinstance(self._ss_target, SS1xTarget) else 249
+        assert 1 <= k * block_len <= max_frame_len, \
+            f"k * block_len ({k * block_len} bytes) exceeds the {max_frame_len} bytes of one batch frame."
+        # A window which cannot hold the segments would make every trigger fail (and retry), so it is rejected here.
+        samples = self._mirror["samples"]
+        assert segment_len >= 1 and first_offset >= 0
+        if markers is not None:
+            assert min(markers) >= 0 and max(markers) + segment_len <= samples, \
+                f"A segment of {segment_len} samples at marker {max(markers)} exceeds the window ({samples} samples)."
+        elif period is not None:
+            assert period >= 1 and first_offset + (k - 1) * period + segment_len <= samples, \
+                f"The window ({samples} samples) is shorter than {k} segments of period {period} " \
+                f"from offset {first_offset}."
+        else:  # the period is only known per capture (from the trigger count)
+            assert first_offset + segment_len <= samples, \
+                f"The window ({samples} samples) cannot hold a segment of {segment_len} samples " \
+                f"from offset {first_offset}."
+        if out is None:
+            out = np.empty(shape=(n, segment_len), dtype=np.uint16 if self._raw_mode else np.float64)
+        assert out.ndim == 2 and out.shape[0] >= n and out.shape[1] == segment_len
+        if inputs is None:
+            plains = np.random.randint(0, 256, size=(n, block_len), dtype=np.uint8)
+        else:
+            assert inputs.shape[0] >= n and inputs.shape[1] == block_len
+            plains = np.ascontiguousarray(inputs[:n], dtype=np.uint8)
+        retries = np.zeros(shape=groups, dtype=np.int32)
+        failed = np.zeros(shape=groups, dtype=bool)
+        failures = []
+        responses = [bytes(k * block_len)] * groups
+
+        encode_kwargs = {"variable_len_flag": True} if isinstance(self._ss_target, SS1xTarget) else {}
+        frames = self._ss_target.encode_batch(cmd, plains.reshape(groups, k * block_len), **encode_kwargs)
+        # With a tracer installed, `self.arm` records the "arm" span; otherwise the device is armed directly.
+        tracer = tracing.active
+        arm = self._scope.arm if tracer is None else self.arm
+        ss_write_frame = self._ss_target.ss_write_frame
+        ss_read_bytes = self._ss_target.ss_read_bytes
+        get_waveform = self.get_waveform
+
+        started = time.perf_counter()
+        batch_started = tracing.now() if tracer is not None else 0
+        for g in range(groups):
+            frame = frames[g]
+            if tracer is not None:
+                trace_started = tracing.now()
+            while True:
+                try:
+                    arm()
+                    if not ss_write_frame(frame, following_ack=False, timeout=timeout):
+                        c = None
+                        stage = "write"
+                    else:
+                        c = ss_read_bytes(resp, k * block_len, following_ack=True, timeout=timeout)
+                        stage = "read"
+                    t = get_waveform()
+                except Exception as e:
+                    if recovery is None or not isinstance(e, recovery.recoverable_errors):
+                        raise
+                    t, c, stage = None, None, "exception"
+                if t is not None and c is not None:
+                    # The geometry was checked up front; only a period derived from the trigger count can still
+                    # overflow the window, and it would do so on every retry.
+                    try:
+                        if markers is not None:
+                            segments = segment_by_markers(t, markers, segment_len)
+                        else:
+                            p = period if period is not None else \
+                                period_from_trig_count(self._scope.adc.trig_count, k)
+                            segments = segment_by_period(t, k, p, first_offset, segment_len)
+                    except AssertionError as e:
+                        raise ValueError(f"The captured window cannot be cut into {k} segments ({e}). "
+                                         f"Increase 'samples' or pass 'period'/'markers'.") from e
+                    out[g * k:(g + 1) * k] = segments
+                    responses[g] = c
+                    if recovery is not None:
+                        recovery.on_success()
+                    break
+                stage = stage if c is None else "capture"
+                failures.append((g, stage))
+                if tracer is not None:
+                    tracer.event("trace.failure", {"index": g, "stage": stage})
+                if recovery is not None and self._recover(recovery, stage) == "reconnect":
+                    arm = self._scope.arm if tracer is None else self.arm
+                    ss_write_frame = self._ss_target.ss_write_frame
+                    ss_read_bytes = self._ss_target.ss_read_bytes
+                if max_retries is not None and retries[g] >= max_retries:
+                    failed[g] = True
+                    if tracer is not None:
+                        tracer.event("trace.dropped", {"index": g})
+                    break
+                retries[g] += 1
+            if tracer is not None:
+                tracer.span("trace", trace_started, {"index": g, "k": k})
+        elapsed = time.perf_counter() - started
+        if tracer is not None:
+            tracer.span("capture_multi", batch_started, {"n": n})
+        ciphers = np.frombuffer(b"".join(responses), dtype=np.uint8).reshape(n, block_len).copy()
+
+        report = {
+            "retries": retries,
+            "failed": failed,
+            "failures": failures,
+            "elapsed": elapsed,
+            "traces_per_sec": (n / elapsed) if elapsed > 0 else float("inf"),
+        }
+        return out[:n], plains, ciphers, report
+
+    def capture_long(self,
+                     n: int,
+                     total_samples: int,
+                     window: int = 24400,
+                     overlap: int = 1000,
+                     max_shift: int = 32,
+                     min_score: float = 0.5,
+                     start_offset: int = 0,
+                     inputs: Optional[Union[np.ndarray, Sequence[Union[str, bytes, bytearray]]]] = None,
+                     out: Optional[np.ndarray] = None,
+                     **capture_kwargs
+                     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict]:
+        """
+        Captures `n` traces longer than one ADC window (24400 samples) by replaying the same inputs
+        once per window while sweeping `adc.offset`, then stitching the windows of each trace.
+        Neighbouring windows overlap by at least `overlap` samples; the overlap is cross-correlated to find
+        the displacement of each window (trigger jitter), which is compensated before stitching.
+
+        Windows are swept in order (all `n` traces per window), so a call changes `adc.offset` once per window
+        rather than once per trace. Consecutive calls sweep in alternating directions, starting from the window
+        the scope is left on. The window plan is cached, and only settings which differ from the cached scope
+        state are written. The scope is left with `samples=window` and the offset of the last window swept.
+
+        :param n: Number of traces to capture
+        :param total_samples: Length of each stitched trace
+        :param window: Samples per ADC window
+        :param overlap: Minimum overlap of neighbouring windows (more than 2 * max_shift)
+        :param max_shift: Largest displacement between neighbouring windows searched, in samples
+        :param min_score: Displacements whose correlation score is below this are ignored (e.g. flat overlaps)
+        :param start_offset: `adc.offset` at which the stitched trace starts
+        :param inputs: Inputs for all `n` traces (see `capture_batch`). Random if None
+        :param out: Preallocated (n, total_samples) trace matrix
+        :param capture_kwargs: Passed through to `capture_batch` (e.g. `max_retries`, `recovery`)
+        :return: (traces, plains, ciphers, report) as `capture_batch`. A trace failed if any of its windows
+                 failed or if a window got a different response. The report also holds the window offsets
+                 ("windows"), the sweep order ("order"), per-trace window displacements ("shifts") and
+                 correlation scores ("scores"), and the number of offset changes ("reconfigurations").
+        """
+        assert n >= 0 and total_samples >= 1 and max_shift >= 0
+        window = min(window, total_samples)
+        assert 1 <= window <= 24400
+        plan_key = (total_samples, window, overlap, start_offset)
+        if plan_key not in self._window_plans:
+            offsets = plan_windows(total_samples, window, overlap, start_offset)
+            assert len(offsets) == 1 or overlap > 2 * max_shift, "'overlap' must exceed 2 * max_shift."
+            self._window_plans[plan_key] = offsets
+        offsets = self._window_plans[plan_key]
+        n_windows = len(offsets)
+        # Start from the end of the sweep closest to the current offset, so back-to-back calls snake.
+        current = self._mirror["offset"]
+        order = list(range(n_windows))
+        if abs(offsets[-1] - current) < abs(offsets[0] - current):
+            order.reverse()
+
+        if out is None:
+            out = np.empty(shape=(n, total_samples), dtype=np.uint16 if self._raw_mode else np.float64)
+        assert out.ndim == 2 and out.shape[0] >= n and out.shape[1] == total_samples, \
+            f"'out' must have the shape of at least ({n}, {total_samples})."
+        out = out[:n]
+        buf = np.empty(shape=(n, window), dtype=out.dtype)
+        shifts = np.zeros(shape=(n, n_windows), dtype=np.int64)
+        scores = np.ones(shape=(n, n_windows))
+        positions = np.zeros(shape=n, dtype=np.int64)
+        covered = np.tile(np.array([total_samples, 0], dtype=np.int64), (n, 1))
+        retries = np.zeros(shape=n, dtype=np.int32)
+        failed = np.zeros(shape=n, dtype=bool)
+        failures = []
+        reconfigurations = 0
+        plains, ciphers, frames, edge = inputs, None, None, None
+        if self._mirror["samples"] != window:
+            self.set_scope_detail(samples=window)
+
+        started = time.perf_counter()
+        for step, w in enumerate(order):
+            if self._mirror["offset"] != offsets[w]:
+                self.set_scope_detail(offset=offsets[w])
+                reconfigurations += 1
+            _, p, c, report = self.capture_batch(n, inputs=plains, out=buf, frames=frames, **capture_kwargs)
+            if step == 0:
+                plains, ciphers = p, c
+                frames = self._ss_target.encode_batch(capture_kwargs.get("cmd", 'p'), plains)
+                positions[:] = offsets[w] - offsets[0]
+            else:
+                failed |= np.any(c != ciphers, axis=1)
+                v = order[step - 1]  # neighbouring window captured just before
+                d = abs(offsets[w] - offsets[v])
+                length = window - d
+                if w > v:
+                    s, score = overlap_shifts(edge, buf[:, :length], max_shift)
+                else:
+                    s, score = overlap_shifts(buf[:, window - length:], edge, max_shift)
+                s[score < min_score] = 0
+                positions += (d - s) if w > v else -(d - s)
+                shifts[:, w] = positions - (offsets[w] - offsets[0])
+                scores[:, w] = score
+            retries += report["retries"]
+            failed |= report["failed"]
+            failures.extend(report["failures"])
+            place_segment(out, buf, positions, covered)
+            if step + 1 < n_windows:
+                # Keeps the part of this window which overlaps the next one in the sweep.
+                nxt = order[step + 1]
+                length = window - abs(offsets[nxt] - offsets[w])
+                edge = buf[:, window - length:].copy() if nxt > w else buf[:, :length].copy()
+        fill_uncovered(out, covered)
+        elapsed = time.perf_counter() - started
+
+        report = {
+            "retries": retries,
+            "failed": failed,
+            "failures": failures,
+            "windows": offsets,
+            "order": order,
+            "shifts": shifts,
+            "scores": scores,
+            "reconfigurations": reconfigurations,
+            "elapsed": elapsed,
+            "traces_per_sec": (n / elapsed) if elapsed > 0 else float("inf"),
+        }
+        return out, plains, ciphers, report
+
+    def capture_stream(self,
+                       n: int,
+                       sinks,
+                       batch_size: int = 1000,
+                       inputs: Optional[Union[np.ndarray, Sequence[Union[str, bytes, bytearray]]]] = None,
+                       trace_dtype: Optional[Union[str, np.dtype]] = None,
+                       stop_when: Optional[Callable[[], bool]] = None,
+                       **capture_kwargs
+                       ) -> Dict:
+        """
+        Captures `n` traces in batches and hands each batch to `sinks` while the capture runs,
+        so at most `batch_size` traces are held in memory.
+        A sink is any object with `append_batch(traces, plains, ciphers)`, e.g. `TraceStoreWriter`.
+        The traces are a view into a buffer which is overwritten by the next batch, so they are only valid
+        during `append_batch`; a sink which keeps them must copy them.
+        Traces which exhausted their retry budget are not passed to the sinks.
+
+        :param n: Number of traces to capture
+        :param sinks: A sink or a sequence of sinks
+        :param batch_size: Number of traces captured per `capture_batch` call
+        :param inputs: Inputs for all `n` traces (see `capture_batch`)
+        :param trace_dtype: dtype of the reused trace buffer. float64 (uint16 in raw mode) if None
+        :param stop_when: Called after every batch; the capture stops early when it returns True
+                          (e.g. `CPAAccumulator.converged`)
+        :param capture_kwargs: Passed through to `capture_batch`
+        :return: Summary report (stored/failed traces, retries, elapsed time and rate)
+        """
+        assert n >= 0 and batch_size > 0
+        if hasattr(sinks, "append_batch"):
+            sinks = (sinks,)
+        samples = self._mirror["samples"]
+        if trace_dtype is None:
+            trace_dtype = np.uint16 if self._raw_mode else np.float64
+        buf = np.empty(shape=(min(batch_size, n), samples), dtype=trace_dtype)
+        stored, n_failed, n_retries = 0, 0, 0
+        stopped_early = False
+        started = time.perf_counter()
+        for pos in range(0, n, batch_size):
+            k = min(batch_size, n - pos)
+            traces, plains, ciphers, report = self.capture_batch(
+                k, inputs=inputs[pos:pos + k] if inputs is not None else None, out=buf, **capture_kwargs)
+            if report["failed"].any():
+                ok = ~report["failed"]
+                traces, plains, ciphers = traces[ok], plains[ok], ciphers[ok]
+            for sink in sinks:
+                sink.append_batch(traces, plains, ciphers)
+            stored += traces.shape[0]
+            n_failed += int(report["failed"].sum())
+            n_retries += int(report["retries"].sum())
+            if stop_when is not None and stop_when():
+                stopped_early = pos + k < n
+                break
+        elapsed = time.perf_counter() - started
+        return {
+            "stored": stored,
+            "failed": n_failed,
+            "retries": n_retries,
+            "elapsed": elapsed,
+            "traces_per_sec": (stored / elapsed) if elapsed > 0 else float("inf"),
+            "stopped_early": stopped_early,
+        }
+
     def programming_target(self,
                            dot_hex_path: str,
                            programmer_type: str,
@@ -169,26 +796,63 @@ class CWScope:
             self._ss_target.reset_via_VCC()
         pass
 
-    def reset_target_via_UFO_nRST(self, duration: float = 0.5) -> None:
+    def reset_target_via_UFO_nRST(self, duration: Optional[float] = None) -> None:
         self._ss_target.reset_via_UFO_nRST(duration)
         pass
 
-    def reset_target_via_VCC(self, duration: float = 0.5) -> None:
+    def reset_target_via_VCC(self, duration: Optional[float] = None) -> None:
         self._ss_target.reset_via_VCC(duration)
         pass
 
     def set_target_clock_freq(self,
                               freq: int = 7.37e6,
-                              wait_for_ready: float = 0.5,
+                              wait_for_ready: Optional[float] = None,
                               verbose: bool = True
                               ) -> None:
+        """
+        :param wait_for_ready: Time to wait after the target reset. If None: the `ready_delay` of the applied
+                               profile, or 0.5s without a profile
+        """
+        if wait_for_ready is None:
+            wait_for_ready = 0.5 if self._profile is None else self._ss_target.ready_delay
         assert 0 <= wait_for_ready <= 10
-        saved_adc_src = self._scope.clock.adc_src
-        self._ss_target.set_clock_freq(freq, wait_for_ready=0)
-        self._scope.clock.adc_src = saved_adc_src
+        saved_adc_src = self._mirror["scale"]
+        self._ss_target.set_clock_freq(freq, wait_for_ready=0, verbose=False)
+        self._scope.clock.adc_src = saved_adc_src  # the ADC clock source is re-applied after the clock change
+        # The PLL rounds the requested frequency, so the actual one is read back once.
+        self._mirror["clkgen_freq"] = self._scope.clock.clkgen_freq
         if wait_for_ready:
             time.sleep(wait_for_ready)
         if verbose:
+            print(f"Adjusted clock frequency: {int(self._mirror['clkgen_freq']) * 1e-6:.4f}MHz")
             print(f"Adjusted sampling rate: {int(self._scope.clock.adc_freq) * 1e-6:.4f}MS/s ({saved_adc_src})")
         pass
+
+    def apply_profile(self,
+                      profile: Union[str, Dict],
+                      verbose: bool = True
+                      ) -> Dict:
+        """
+        Applies a target timing profile found by `ClockTuner`: clock frequency, baud multiplier and
+        reset/ready delays (the target is reset).
+
+        :param profile: Profile dict, or name/path of a saved profile (see `load_profile`)
+        :return: The applied profile
+        """
+        if isinstance(profile, str):
+            profile = load_profile(profile)
+        if profile.get("ss_version") not in (None, self._ss_version):
+            print(f"[SCOPE] The profile was tuned for SimpleSerial {profile['ss_version']}, "
+                  f"not {self._ss_version}.", file=sys.stderr)
+        self._ss_target.baud_multiplier = profile.get("baud_multiplier", 1.0)
+        self._ss_target.reset_duration = profile.get("reset_duration", self._ss_target.reset_duration)
+        self._ss_target.ready_delay = profile.get("ready_delay", self._ss_target.ready_delay)
+        self.set_target_clock_freq(profile["clkgen_freq"], wait_for_ready=self._ss_target.ready_delay, verbose=False)
+        if profile.get("baud") is not None:
+            self._target.baud = profile["baud"]
+        self._profile = profile
+        if verbose:
+            print(f"Applied profile '{profile.get('name', 'unsaved')}': {self._mirror['clkgen_freq'] * 1e-6:.4f}MHz, "
+                  f"baud {self._target.baud}, ready delay {self._ss_target.ready_delay * 1e3:.1f}ms")
+        return profile
     pass
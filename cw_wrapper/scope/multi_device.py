@@ -0,0 +1,227 @@
+import os
+import sys
+import time
+import queue
+import shutil
+import numpy as np
+import multiprocessing as mp
+from typing import Optional, Sequence, Union, Dict, List
+from ..utils.trace_store import TraceStoreWriter, TraceStoreReader
+
+
+def _capture_worker(device_index: int,
+                    connect_kwargs: dict,
+                    ss_version: str,
+                    scope_setting: dict,
+                    raw_mode: bool,
+                    capture_kwargs: dict,
+                    store_path: str,
+                    block_queue,
+                    result_queue
+                    ) -> None:
+    """
+    Runs in a child process: connects one device and captures blocks from `block_queue` until a None arrives.
+    """
+    from .cw_scope import CWScope
+    result = {"device": device_index, "blocks": [], "stored": 0, "failed": 0, "retries": 0,
+              "elapsed": 0.0, "started_at": None, "finished_at": None, "error": None}
+    scope = CWScope()
+    try:
+        scope.connect(verbose=False, ss_version=ss_version, **connect_kwargs)
+        scope.set_scope_detail(**scope_setting)
+        scope.set_raw_mode(raw_mode)
+        samples = scope_setting["samples"]
+        scale, offset = scope.get_trace_scale() if raw_mode else (None, None)
+        writer = TraceStoreWriter(store_path, samples, trace_dtype=np.uint16 if raw_mode else np.float64,
+                                  flush_interval=None, scale=scale, offset=offset)
+        buf = None
+        result["started_at"] = time.time()
+        started = time.perf_counter()
+        while True:
+            item = block_queue.get()
+            if item is None:
+                break
+            block_id, plains = item
+            if buf is None or buf.shape[0] < plains.shape[0]:
+                buf = np.empty(shape=(plains.shape[0], samples), dtype=np.uint16 if raw_mode else np.float64)
+            traces, plains, ciphers, report = scope.capture_batch(plains.shape[0], inputs=plains,
+                                                                  out=buf, **capture_kwargs)
+            if report["failed"].any():
+                ok = ~report["failed"]
+                traces, plains, ciphers = traces[ok], plains[ok], ciphers[ok]
+            writer.append_batch(traces, plains, ciphers)
+            result["blocks"].append((block_id, result["stored"], traces.shape[0]))
+            result["stored"] += traces.shape[0]
+            result["failed"] += int(report["failed"].sum())
+            result["retries"] += int(report["retries"].sum())
+        result["elapsed"] = time.perf_counter() - started
+        result["finished_at"] = time.time()
+        writer.close()
+    except BaseException as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if scope._scope is not None:
+            scope.disconnect(verbose=False)
+        result_queue.put(result)
+    pass
+
+
+class MultiDeviceCapture:
+    """
+    Runs one capture process per ChipWhisperer (selected by serial number) and merges their traces.
+
+    The campaign's inputs are cut into blocks which the workers pull from a shared queue, so faster
+    devices take more blocks. Every worker writes its own `TraceStoreWriter` store; the stores are then
+    merged into one dataset in block order, so the order of the rows only depends on the inputs,
+    not on which device captured which block.
+    """
+    def __init__(self,
+                 devices: Sequence[Union[str, dict]],
+                 backend: str = "chipwhisperer",
+                 ss_version: str = "1.1",
+                 scope_setting: Optional[dict] = None,
+                 block_size: int = 500,
+                 raw_mode: bool = False,
+                 mp_context: str = "spawn",
+                 **capture_kwargs
+                 ):
+        """
+        :param devices: Serial number (`sn`) of each scope, or a dict of `connect` kwargs per device
+                        (e.g. `{"backend": "sim", "seed": 1}`)
+        :param backend: Default backend of the devices
+        :param ss_version: SimpleSerial version of the targets
+        :param scope_setting: `CWScope.set_scope_detail` kwargs applied on every device (`samples` is required)
+        :param block_size: Number of traces per work item
+        :param raw_mode: Capture and store raw ADC integers
+        :param mp_context: multiprocessing start method
+        :param capture_kwargs: Passed through to `CWScope.capture_batch` (cmd, resp, payload_len, ...)
+        """
+        assert len(devices) >= 1 and block_size >= 1
+        assert scope_setting is not None and "samples" in scope_setting, "'scope_setting' must set 'samples'."
+        self._connect_kwargs = []
+        for device in devices:
+            kwargs = {"backend": backend, "sn": device} if isinstance(device, str) else dict(device)
+            kwargs.setdefault("backend", backend)
+            self._connect_kwargs.append(kwargs)
+        self._ss_version = ss_version
+        self._scope_setting = dict(scope_setting)
+        self._block_size = block_size
+        self._raw_mode = raw_mode
+        self._mp_context = mp_context
+        self._capture_kwargs = capture_kwargs
+        pass
+
+    @property
+    def n_devices(self) -> int:
+        return len(self._connect_kwargs)
+
+    def run(self,
+            path: str,
+            n: Optional[int] = None,
+            inputs: Optional[np.ndarray] = None,
+            seed: Optional[int] = None,
+            keep_device_stores: bool = False
+            ) -> Dict:
+        """
+        :param path: Directory of the merged `TraceStoreWriter` store (must not contain traces yet)
+        :param n: Number of traces (`len(inputs)` if None)
+        :param inputs: (n, payload_len) uint8 inputs. Random (reproducible with `seed`) if None
+        :param keep_device_stores: Keep the per-device stores (`<path>.parts/device_XX`) after merging
+        :return: Aggregate and per-device report
+        """
+        payload_len = self._capture_kwargs.get("payload_len", 16)
+        if inputs is None:
+            assert n is not None, "Either 'n' or 'inputs' is required."
+            inputs = np.random.default_rng(seed).integers(0, 256, size=(n, payload_len), dtype=np.uint8)
+        inputs = np.ascontiguousarray(inputs, dtype=np.uint8)
+        n = inputs.shape[0] if n is None else n
+        assert 0 <= n <= inputs.shape[0]
+        if os.path.exists(os.path.join(path, "meta.json")):
+            assert len(TraceStoreReader(path)) == 0, f"'{path}' already contains traces."
+        parts_path = path.rstrip("/\\") + ".parts"
+        shutil.rmtree(parts_path, ignore_errors=True)
+
+        ctx = mp.get_context(self._mp_context)
+        block_queue = ctx.Queue()
+        result_queue = ctx.Queue()
+        n_blocks = (n + self._block_size - 1) // self._block_size
+        for b in range(n_blocks):
+            block_queue.put((b, inputs[b * self._block_size:min((b + 1) * self._block_size, n)]))
+        for _ in range(self.n_devices):
+            block_queue.put(None)
+
+        started = time.perf_counter()
+        workers = []
+        for i, connect_kwargs in enumerate(self._connect_kwargs):
+            worker = ctx.Process(target=_capture_worker, name=f"capture-device-{i}", daemon=True,
+                                 args=(i, connect_kwargs, self._ss_version, self._scope_setting, self._raw_mode,
+                                       self._capture_kwargs, os.path.join(parts_path, f"device_{i:02d}"),
+                                       block_queue, result_queue))
+            worker.start()
+            workers.append(worker)
+        results: List[dict] = []
+        while len(results) < len(workers):
+            try:
+                results.append(result_queue.get(timeout=1.0))
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break
+        for worker in workers:
+            worker.join()
+        results.sort(key=lambda x: x["device"])
+        errors = [x for x in results if x["error"] is not None]
+        if errors or len(results) < len(workers):
+            for x in errors:
+                print(f"[MULTI_DEVICE] Device {x['device']} failed. ({x['error']})", file=sys.stderr)
+            raise RuntimeError(f"{len(workers) - len(results) + len(errors)} capture worker(s) failed. "
+                               f"(device stores are kept in '{parts_path}')")
+
+        # Aggregate rate over the window in which the devices were capturing (process start-up excluded).
+        capture_elapsed = max(x["finished_at"] for x in results) - min(x["started_at"] for x in results)
+        stored = self._merge(path, parts_path, results)
+        if not keep_device_stores:
+            shutil.rmtree(parts_path, ignore_errors=True)
+        elapsed = time.perf_counter() - started
+        return {
+            "stored": stored,
+            "failed": sum(x["failed"] for x in results),
+            "retries": sum(x["retries"] for x in results),
+            "capture_elapsed": capture_elapsed,
+            "elapsed": elapsed,
+            "traces_per_sec": (stored / capture_elapsed) if capture_elapsed > 0 else float("inf"),
+            "devices": [{
+                "device": x["device"],
+                "blocks": len(x["blocks"]),
+                "stored": x["stored"],
+                "failed": x["failed"],
+                "elapsed": x["elapsed"],
+                "traces_per_sec": (x["stored"] / x["elapsed"]) if x["elapsed"] > 0 else float("inf"),
+            } for x in results],
+        }
+
+    def _merge(self,
+               path: str,
+               parts_path: str,
+               results: List[dict]
+               ) -> int:
+        """
+        Concatenates the blocks of all device stores into `path` in block order.
+        """
+        location = {}  # block id -> (device, start row in the device store, count)
+        for x in results:
+            for block_id, start, count in x["blocks"]:
+                location[block_id] = (x["device"], start, count)
+        readers = {x["device"]: TraceStoreReader(os.path.join(parts_path, f"device_{x['device']:02d}"))
+                   for x in results}
+        first = readers[results[0]["device"]]
+        scale, offset = first.trace_scale
+        writer = TraceStoreWriter(path, first.meta["samples"], first.meta["plain_len"], first.meta["cipher_len"],
+                                  trace_dtype=first.meta["trace_dtype"], flush_interval=None,
+                                  scale=scale if first.is_raw else None, offset=offset if first.is_raw else None)
+        for block_id in sorted(location):
+            device, start, count = location[block_id]
+            if count > 0:
+                writer.append_batch(*readers[device].read(start, start + count))
+        writer.close()
+        return len(writer)
+    pass
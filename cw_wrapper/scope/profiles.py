@@ -0,0 +1,59 @@
+import os
+import json
+import time
+from typing import Dict, Optional, List
+
+# Target timing profiles (see `ClockTuner`) are stored as "<name>.json" in this directory.
+PROFILE_DIR_ENV = "CW_WRAPPER_PROFILE_DIR"
+
+
+def profile_dir() -> str:
+    """
+    :return: Directory of the saved profiles ($CW_WRAPPER_PROFILE_DIR or ~/.cw_wrapper/profiles)
+    """
+    return os.environ.get(PROFILE_DIR_ENV) or os.path.join(os.path.expanduser("~"), ".cw_wrapper", "profiles")
+
+
+def _profile_path(name: str, directory: Optional[str] = None) -> str:
+    if name.endswith(".json") or os.sep in name:  # already a path
+        return name
+    return os.path.join(profile_dir() if directory is None else directory, f"{name}.json")
+
+
+def save_profile(name: str,
+                 profile: Dict,
+                 directory: Optional[str] = None
+                 ) -> str:
+    """
+    Saves a target timing profile under `name` (e.g. the target board), replacing the previous one atomically.
+
+    :return: Path of the profile file
+    """
+    assert "clkgen_freq" in profile, "A profile needs at least 'clkgen_freq'."
+    path = _profile_path(name, directory)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    profile = dict(profile, name=name, saved=time.time())
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_profile(name: str,
+                 directory: Optional[str] = None
+                 ) -> Dict:
+    """
+    :param name: Name of a saved profile, or path of a profile file
+    """
+    path = _profile_path(name, directory)
+    assert os.path.isfile(path), f"No profile '{name}' ({path})."
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def list_profiles(directory: Optional[str] = None) -> List[str]:
+    directory = profile_dir() if directory is None else directory
+    if not os.path.isdir(directory):
+        return []
+    return sorted(x[:-len(".json")] for x in os.listdir(directory) if x.endswith(".json"))
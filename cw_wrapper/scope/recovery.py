@@ -0,0 +1,179 @@
+import time
+import numpy as np
+from typing import Optional, Callable, Dict, Tuple, Type
+from ..utils import tracing
+from ..simpleserial_target.ss1x_codec import Payload, to_bytes
+
+
+class RecoveryError(RuntimeError):
+    """
+    Raised when the recovery budget is exhausted and the capture cannot continue.
+    """
+    pass
+
+
+class FaultRecovery:
+    """
+    Escalation ladder for the capture loop, driven by the number of consecutive failed iterations:
+
+        1. flush       : drop whatever is left in the serial receive buffer (cheap, on every failure)
+        2. reset       : reset the target (VCC or nRST) and re-send the key, after `reset_after` failures in a row
+        3. reconnect   : reconnect the scope (settings preserved) and re-send the key, after `reconnect_after`
+                         failures in a row or when the scope/USB link raised an exception
+
+    A successful capture resets the streak, so isolated glitches only ever cost a flush.
+    Resets and reconnects have a budget which refills after `budget_window` consecutive successful captures;
+    when the reconnect budget is exhausted, `RecoveryError` is raised instead of retrying forever.
+    Every action is counted and timed (`report()`); with a tracer installed, each reset or reconnect is also
+    recorded as a "recovery" span.
+    """
+    LEVELS = ("flush", "reset", "reconnect")
+
+    def __init__(self,
+                 key: Optional[Payload] = None,
+                 key_cmd: str = 'k',
+                 reset_method: str = "VCC",
+                 reset_after: int = 3,
+                 reconnect_after: int = 6,
+                 max_resets: int = 20,
+                 max_reconnects: int = 3,
+                 budget_window: int = 1000,
+                 reset_duration: Optional[float] = None,
+                 wait_for_ready: Optional[float] = None,
+                 on_restored: Optional[Callable] = None,
+                 recoverable_errors: Tuple[Type[BaseException], ...] = (OSError,),
+                 verbose: bool = True
+                 ):
+        """
+        :param key: Key re-sent with `key_cmd` after a reset or reconnect (None: nothing is re-sent)
+        :param reset_method: "VCC" or "nRST" (UFO target boards)
+        :param reset_after: Consecutive failures before the target is reset
+        :param reconnect_after: Consecutive failures before the scope is reconnected
+        :param max_resets: Target reset budget (further resets escalate to a reconnect)
+        :param max_reconnects: Reconnect budget (exhausting it raises `RecoveryError`)
+        :param budget_window: Consecutive successful captures after which the budgets are refilled
+        :param reset_duration: Power-down period of a reset (the target's tuned `reset_duration` if None)
+        :param wait_for_ready: Wait after a reset (the target's tuned `ready_delay` if None)
+        :param on_restored: `on_restored(scope)` called after the key was re-sent, for any other target setup
+        :param recoverable_errors: Exceptions of the capture loop handled by a reconnect. The default `OSError`
+                                   covers pyusb's `USBError` and pyserial's `SerialException`; anything else
+                                   (e.g. a programming error) is raised
+        """
+        assert reset_method in ("VCC", "nRST")
+        assert 1 <= reset_after <= reconnect_after
+        assert max_resets >= 0 and max_reconnects >= 0 and budget_window >= 1
+        self._key = None if key is None else to_bytes(key)
+        self._key_cmd = key_cmd
+        self._reset_method = reset_method
+        self._reset_after = reset_after
+        self._reconnect_after = reconnect_after
+        self._max_resets = max_resets
+        self._max_reconnects = max_reconnects
+        self._budget_window = budget_window
+        self._reset_duration = reset_duration
+        self._wait_for_ready = wait_for_ready
+        self._on_restored = on_restored
+        self.recoverable_errors = tuple(recoverable_errors)
+        self._verbose = verbose
+        self.reset_stats()
+        pass
+
+    def on_success(self) -> None:
+        self._streak = 0
+        self._successes += 1
+        if self._successes == self._budget_window:
+            self._used = {"reset": 0, "reconnect": 0}
+        pass
+
+    def on_failure(self,
+                   scope,
+                   stage: str
+                   ) -> str:
+        """
+        Called by the capture loop after a failed iteration.
+
+        :param scope: `CWScope` being captured with
+        :param stage: Failed stage ("key", "write", "read", "capture" or "exception"),
+                      or "reconnect" after a reconnect which failed (the scope is gone)
+        :return: The action taken ("flush", "reset" or "reconnect")
+        """
+        self._streak += 1
+        self._successes = 0
+        self._failures += 1
+        if stage in ("exception", "reconnect") or self._streak >= self._reconnect_after:
+            level = "reconnect"
+        elif self._streak >= self._reset_after:
+            level = "reset" if self._used["reset"] < self._max_resets else "reconnect"
+        else:
+            level = "flush"
+        if level == "reconnect" and self._used["reconnect"] >= self._max_reconnects:
+            raise RecoveryError(f"Recovery budget exhausted after {self._failures} failures "
+                                f"({self._used['reset']} resets, {self._used['reconnect']} reconnects "
+                                f"within {self._budget_window} captures).")
+
+        started = time.perf_counter()
+        tracer = tracing.active
+        traced = tracing.now() if tracer is not None else 0
+        if level != "flush":
+            tracing.warn("recovery.escalate", f"[RECOVERY] {self._streak} consecutive failures (last stage: {stage}). "
+                                              f"Escalating to {level}.",
+                         {"level": level, "stage": stage, "streak": self._streak}, echo=self._verbose)
+        try:
+            if level == "flush":
+                scope.get_simple_serial_target().flush_recv_buf(verbose=False)
+            else:
+                if level == "reset":
+                    self._reset_target(scope)
+                else:
+                    scope.reconnect(verbose=False, preserve_scope_setting=True)
+                    self._reset_target(scope)
+                    self._streak = 0
+                self._restore(scope)
+        except Exception as e:  # the next failure escalates further
+            tracing.warn("recovery.failed", f"[RECOVERY] {level} failed. ({type(e).__name__}: {e})",
+                         {"level": level, "error": type(e).__name__})
+        if tracer is not None and level != "flush":
+            tracer.span("recovery", traced, {"level": level, "stage": stage})
+        self._counts[level] += 1
+        self._seconds[level] += time.perf_counter() - started
+        if level in self._used:
+            self._used[level] += 1
+        return level
+
+    def _reset_target(self, scope) -> None:
+        ss_target = scope.get_simple_serial_target()
+        if self._reset_method == "VCC":
+            ss_target.reset_via_VCC(self._reset_duration, self._wait_for_ready)
+        else:
+            ss_target.reset_via_UFO_nRST(self._reset_duration, self._wait_for_ready)
+        pass
+
+    def _restore(self, scope) -> None:
+        ss_target = scope.get_simple_serial_target()
+        ss_target.flush_recv_buf(verbose=False)
+        if self._key is not None:
+            frame = ss_target.encode_batch(self._key_cmd, np.frombuffer(self._key, dtype=np.uint8)[None, :])[0]
+            if not ss_target.ss_write_frame(frame, following_ack=True):
+                tracing.warn("recovery.key_nack", "[RECOVERY] The target did not acknowledge the key.")
+        if self._on_restored is not None:
+            self._on_restored(scope)
+        pass
+
+    def reset_stats(self) -> None:
+        self._streak = 0
+        self._successes = 0
+        self._used = {"reset": 0, "reconnect": 0}
+        self._failures = 0
+        self._counts = {level: 0 for level in self.LEVELS}
+        self._seconds = {level: 0.0 for level in self.LEVELS}
+        pass
+
+    def report(self) -> Dict:
+        """
+        :return: Number of failures, and count/total seconds of each recovery action
+        """
+        return {
+            "failures": self._failures,
+            **{level: {"count": self._counts[level], "seconds": self._seconds[level]} for level in self.LEVELS},
+        }
+    pass
@@ -0,0 +1,58 @@
+import numpy as np
+from typing import Optional, Sequence
+
+
+def segment_by_period(window: np.ndarray,
+                      k: int,
+                      period: int,
+                      first_offset: int = 0,
+                      segment_len: Optional[int] = None
+                      ) -> np.ndarray:
+    """
+    Cuts a capture window which contains `k` operations spaced `period` samples apart into `k` traces.
+    No data is copied; the result is a read-only strided view on `window`.
+
+    :param window: 1-D captured trace
+    :param k: Number of operations in the window
+    :param period: Distance between two operations in samples
+    :param first_offset: Sample at which the first operation starts
+    :param segment_len: Length of each trace (default: `period`)
+    :return: (k, segment_len) view
+    """
+    segment_len = period if segment_len is None else segment_len
+    assert window.ndim == 1 and k >= 1 and period >= 1 and segment_len >= 1 and first_offset >= 0
+    assert first_offset + (k - 1) * period + segment_len <= window.shape[0], \
+        f"The window ({window.shape[0]} samples) is shorter than {k} segments of period {period}."
+    stride = window.strides[0]
+    return np.lib.stride_tricks.as_strided(window[first_offset:], shape=(k, segment_len),
+                                           strides=(period * stride, stride), writeable=False)
+
+
+def segment_by_markers(window: np.ndarray,
+                       markers: Sequence[int],
+                       segment_len: int
+                       ) -> np.ndarray:
+    """
+    Cuts `window` into one trace per marker (start sample of each operation, e.g. found from trigger edges).
+
+    :return: (len(markers), segment_len) array
+    """
+    markers = np.asarray(markers, dtype=np.int64)
+    assert window.ndim == 1 and markers.ndim == 1 and segment_len >= 1
+    assert markers.min() >= 0 and markers.max() + segment_len <= window.shape[0], \
+        "A segment exceeds the captured window."
+    return window[markers[:, None] + np.arange(segment_len)]
+
+
+def period_from_trig_count(trig_count: int,
+                           k: int,
+                           samples_per_cycle: int = 1
+                           ) -> int:
+    """
+    Estimates the operation period when the trigger stays high for all `k` operations.
+
+    :param trig_count: `scope.adc.trig_count` of the last capture
+    :param samples_per_cycle: ADC samples per trig_count cycle
+    """
+    assert k >= 1 and trig_count >= k
+    return int(trig_count * samples_per_cycle) // k
@@ -0,0 +1,101 @@
+import numpy as np
+from typing import List, Tuple
+
+
+def plan_windows(total_samples: int,
+                 window: int,
+                 overlap: int,
+                 start_offset: int = 0
+                 ) -> List[int]:
+    """
+    Splits `total_samples` samples after the trigger into ADC windows of `window` samples which overlap
+    by at least `overlap` samples. All windows have the same length (the last one is moved back to end
+    exactly at `total_samples`), so only `adc.offset` changes between them.
+
+    :param start_offset: `adc.offset` of the first window
+    :return: `adc.offset` of every window, ascending
+    """
+    assert total_samples >= 1 and window >= 1 and start_offset >= 0
+    if total_samples <= window:
+        return [start_offset]
+    assert 0 <= overlap < window, "'overlap' must be shorter than the window."
+    step = window - overlap
+    offsets = list(range(0, total_samples - window, step)) + [total_samples - window]
+    return [start_offset + x for x in offsets]
+
+
+def overlap_shifts(left: np.ndarray,
+                   right: np.ndarray,
+                   max_shift: int
+                   ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Estimates, row by row, how far the content of `right` is displaced relative to `left`, where both hold
+    the same nominal samples (the overlap of two neighbouring windows), by normalized cross-correlation
+    computed with FFTs for all rows at once.
+
+    :param left: (N, L) tail of the earlier window
+    :param right: (N, L) head of the later window
+    :param max_shift: Largest displacement searched in either direction (L > 2 * max_shift)
+    :return: Displacement of each row (a sample at index j of `right` lies at j - shift of `left`)
+             and its correlation score in [-1, 1]
+    """
+    left = np.asarray(left, dtype=np.float64)
+    right = np.asarray(right, dtype=np.float64)
+    n, length = left.shape
+    assert right.shape == left.shape and max_shift >= 0 and length > 2 * max_shift, \
+        "The overlap must be longer than 2 * max_shift."
+    pattern = left[:, max_shift:length - max_shift]
+    pattern = pattern - pattern.mean(axis=1, keepdims=True)
+    pattern_len = pattern.shape[1]
+    pattern_norm = np.sqrt(np.einsum('ij,ij->i', pattern, pattern))
+    n_fft = 1 << (length - 1).bit_length()
+    corr = np.fft.irfft(np.fft.rfft(right, n_fft, axis=1) * np.conj(np.fft.rfft(pattern, n_fft, axis=1)),
+                        n_fft, axis=1)[:, :2 * max_shift + 1]
+    # Norm of each mean-removed window of `right`, from running sums.
+    c1 = np.concatenate((np.zeros((n, 1)), np.cumsum(right, axis=1)), axis=1)
+    c2 = np.concatenate((np.zeros((n, 1)), np.cumsum(right * right, axis=1)), axis=1)
+    s1 = c1[:, pattern_len:pattern_len + 2 * max_shift + 1] - c1[:, :2 * max_shift + 1]
+    s2 = c2[:, pattern_len:pattern_len + 2 * max_shift + 1] - c2[:, :2 * max_shift + 1]
+    denom = pattern_norm[:, None] * np.sqrt(np.maximum(s2 - s1 * s1 / pattern_len, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = np.where(denom > 0, corr / denom, 0.0)
+    best = np.argmax(score, axis=1)
+    return best - max_shift, score[np.arange(n), best]
+
+
+def place_segment(out: np.ndarray,
+                  segment: np.ndarray,
+                  positions: np.ndarray,
+                  covered: np.ndarray
+                  ) -> None:
+    """
+    Copies row r of `segment` into row r of `out` starting at column `positions[r]` (clipped to `out`),
+    overwriting what earlier segments wrote there, and widens the covered column range of each row.
+
+    :param covered: (N, 2) [first, end) columns written so far per row; updated in place
+    """
+    window = segment.shape[1]
+    total = out.shape[1]
+    for r, p in enumerate(positions.tolist()):
+        lo, hi = max(p, 0), min(p + window, total)
+        if lo < hi:
+            out[r, lo:hi] = segment[r, lo - p:hi - p]
+            covered[r, 0] = min(covered[r, 0], lo)
+            covered[r, 1] = max(covered[r, 1], hi)
+    pass
+
+
+def fill_uncovered(out: np.ndarray,
+                   covered: np.ndarray
+                   ) -> None:
+    """
+    Repeats the edge values into the columns no segment reached (rows whose windows drifted inwards).
+    """
+    total = out.shape[1]
+    for r in np.flatnonzero((covered[:, 0] > 0) | (covered[:, 1] < total)).tolist():
+        lo, hi = int(covered[r, 0]), int(covered[r, 1])
+        if lo >= hi:
+            continue
+        out[r, :lo] = out[r, lo]
+        out[r, hi:] = out[r, hi - 1]
+    pass
@@ -0,0 +1,239 @@
+import sys
+import time
+import numpy as np
+from typing import Optional, Sequence, Dict, List, Callable
+from ..simpleserial_target.ss1x_codec import Payload, to_bytes
+from ..utils.inputs import InputGenerator
+from ..analysis.verify import verify_ciphertexts
+from .cw_scope import CWScope
+from .profiles import save_profile
+
+
+class ClockTuner:
+    """
+    Searches the fastest reliable timing of a target: the clkgen frequency, the baud rate (as a multiple of the
+    default baud scaled with the clock) and the shortest reset/ready delays.
+
+    Every (frequency, baud multiplier) point is measured with known-answer encryptions: the target is reset,
+    the key is loaded and `n_traces` captures are checked against the AES-128 model, which gives the rate of
+    correct traces/sec and the error rate (failed captures and wrong ciphertexts).
+    Higher multipliers of a frequency are skipped once one fails after a stable one, and the search stops after
+    `patience` consecutive frequencies without a stable point. The fastest points are re-measured `repeats`
+    times; the first which stays within `max_error_rate` wins. The delays are then lowered to the shortest
+    values which still pass `delay_trials` resets in a row (plus `delay_margin`).
+
+    `run(save_as="my_target")` saves the profile, which `connect(profile="my_target")` applies later.
+    """
+    def __init__(self,
+                 scope: CWScope,
+                 key: Payload,
+                 freqs: Sequence[float] = (3.2e6, 5e6, 7.37e6, 10e6, 14.74e6, 18e6, 22e6, 25e6),
+                 baud_multipliers: Sequence[float] = (1.0, 2.0, 4.0),
+                 reset_durations: Sequence[float] = (0.05, 0.1, 0.2, 0.5),
+                 ready_delays: Sequence[float] = (0.0, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5),
+                 n_traces: int = 200,
+                 repeats: int = 3,
+                 max_error_rate: float = 0.0,
+                 patience: int = 2,
+                 delay_trials: int = 3,
+                 delay_margin: float = 1.5,
+                 key_cmd: str = 'k',
+                 timeout: int = 100,
+                 seed: int = 0,
+                 verbose: bool = True,
+                 **capture_kwargs
+                 ):
+        """
+        :param scope: Connected `CWScope` whose target runs AES-128 (key loaded with `key_cmd`)
+        :param key: Key used for the known-answer encryptions
+        :param freqs: clkgen frequencies searched (3.2MHz - 25MHz)
+        :param baud_multipliers: Baud rates searched, as multiples of the default baud scaled with the clock
+        :param reset_durations: Power-down periods searched (seconds, >= 0.05)
+        :param ready_delays: Waits after a reset searched (seconds)
+        :param n_traces: Known-answer captures per measurement
+        :param repeats: Confirmation measurements of the chosen point
+        :param max_error_rate: Largest error rate of a stable point
+        :param patience: Consecutive frequencies without a stable point after which the search stops
+        :param delay_trials: Consecutive successful resets required for a delay
+        :param delay_margin: Factor applied to the shortest working ready delay
+        :param timeout: Serial timeout in ms (a lost frame costs this much)
+        :param capture_kwargs: Passed through to `capture_batch` (e.g. `cmd`, `resp`)
+        """
+        assert all(3.2e6 <= f <= 25.0e6 for f in freqs) and len(freqs) > 0
+        assert all(m > 0 for m in baud_multipliers) and len(baud_multipliers) > 0
+        assert all(d >= 0.05 for d in reset_durations) and len(reset_durations) > 0
+        assert all(d >= 0 for d in ready_delays) and len(ready_delays) > 0
+        assert n_traces >= 1 and repeats >= 0 and 0 <= max_error_rate < 1 and patience >= 1
+        assert delay_trials >= 1 and delay_margin >= 1
+        self._scope = scope
+        self._key = np.frombuffer(to_bytes(key), dtype=np.uint8)
+        self._freqs = sorted(freqs)
+        self._baud_multipliers = sorted(baud_multipliers)
+        self._reset_durations = sorted(reset_durations)
+        self._ready_delays = sorted(ready_delays)
+        self._n_traces = n_traces
+        self._repeats = repeats
+        self._max_error_rate = max_error_rate
+        self._patience = patience
+        self._delay_trials = delay_trials
+        self._delay_margin = delay_margin
+        self._key_cmd = key_cmd
+        self._timeout = timeout
+        self._inputs = InputGenerator(seed)
+        self._next_input = 0
+        self._verbose = verbose
+        self._capture_kwargs = capture_kwargs
+        self.results: List[Dict] = []
+        pass
+
+    def _set_point(self,
+                   freq: float,
+                   baud_multiplier: float,
+                   reset_duration: float,
+                   ready_delay: float
+                   ) -> None:
+        ss_target = self._scope.get_simple_serial_target()
+        ss_target.baud_multiplier = baud_multiplier
+        ss_target.reset_duration = reset_duration
+        ss_target.ready_delay = ready_delay
+        self._scope.set_target_clock_freq(freq, wait_for_ready=ready_delay, verbose=False)  # also resets the target
+        pass
+
+    def _load_key(self) -> bool:
+        ss_target = self._scope.get_simple_serial_target()
+        ss_target.flush_recv_buf(verbose=False)
+        frame = ss_target.encode_batch(self._key_cmd, self._key[None, :])[0]
+        try:
+            return ss_target.ss_write_frame(frame, following_ack=True, timeout=self._timeout)
+        except Exception:
+            return False
+
+    def _known_answer(self, n: int) -> Dict:
+        # Loads the key and checks `n` encryptions; every lost or wrong trace is an error.
+        started = time.perf_counter()
+        if not self._load_key():
+            return {"traces_per_sec": 0.0, "error_rate": 1.0, "errors": n, "stage": "key"}
+        plains = self._inputs(self._next_input, n)
+        self._next_input += n
+        try:
+            _, plains, ciphers, report = self._scope.capture_batch(n, inputs=plains, max_retries=0,
+                                                                   timeout=self._timeout, **self._capture_kwargs)
+        except Exception as e:
+            return {"traces_per_sec": 0.0, "error_rate": 1.0, "errors": n, "stage": f"{type(e).__name__}: {e}"}
+        ok = verify_ciphertexts(plains, ciphers, self._key)[0] & ~report["failed"]
+        n_ok = int(ok.sum())
+        elapsed = time.perf_counter() - started
+        return {"traces_per_sec": n_ok / elapsed if elapsed > 0 else float("inf"),
+                "error_rate": (n - n_ok) / n, "errors": n - n_ok}
+
+    def measure(self,
+                freq: float,
+                baud_multiplier: float
+                ) -> Dict:
+        """
+        Measures one point with conservative delays (the longest ones searched).
+
+        :return: Frequency (as set by the PLL), baud, traces/sec and error rate of the point
+        """
+        self._set_point(freq, baud_multiplier, self._reset_durations[-1], self._ready_delays[-1])
+        result = {
+            "clkgen_freq": self._scope._mirror["clkgen_freq"],
+            "baud_multiplier": baud_multiplier,
+            "baud": self._scope._target.baud,
+            **self._known_answer(self._n_traces),
+        }
+        result["stable"] = result["error_rate"] <= self._max_error_rate
+        self.results.append(result)
+        if self._verbose:
+            print(f"[TUNE] {result['clkgen_freq'] * 1e-6:.4f}MHz baud {result['baud']}: "
+                  f"{result['traces_per_sec']:.1f} traces/s, error rate {result['error_rate']:.3f}")
+        return result
+
+    def _confirm(self, point: Dict) -> bool:
+        for _ in range(self._repeats):
+            if not self.measure(point["clkgen_freq"], point["baud_multiplier"])["stable"]:
+                return False
+        return True
+
+    def _shortest_delay(self,
+                        candidates: Sequence[float],
+                        reset: Callable[[float], None]
+                        ) -> Optional[float]:
+        # Shortest candidate for which `delay_trials` resets in a row are followed by a correct encryption.
+        def trial(delay: float) -> bool:
+            reset(delay)
+            return self._known_answer(1)["errors"] == 0
+
+        for delay in candidates:
+            if all(trial(delay) for _ in range(self._delay_trials)):
+                return delay
+        return None
+
+    def tune_delays(self) -> Dict[str, float]:
+        """
+        Finds the shortest reset duration (with the longest ready delay), then the shortest ready delay,
+        at the current clock and baud.
+        """
+        ss_target = self._scope.get_simple_serial_target()
+        longest_ready = self._ready_delays[-1]
+        reset_duration = self._shortest_delay(
+            self._reset_durations, lambda d: ss_target.reset_via_VCC(d, longest_ready))
+        reset_duration = self._reset_durations[-1] if reset_duration is None else reset_duration
+        ready_delay = self._shortest_delay(
+            self._ready_delays, lambda d: ss_target.reset_via_VCC(reset_duration, d))
+        ready_delay = longest_ready if ready_delay is None else min(ready_delay * self._delay_margin, 10.0)
+        if self._verbose:
+            print(f"[TUNE] reset duration {reset_duration * 1e3:.1f}ms, ready delay {ready_delay * 1e3:.1f}ms")
+        return {"reset_duration": reset_duration, "ready_delay": ready_delay}
+
+    def run(self,
+            save_as: Optional[str] = None,
+            apply: bool = True
+            ) -> Optional[Dict]:
+        """
+        Runs the search.
+
+        :param save_as: Name under which the best profile is saved (see `save_profile`); not saved if None
+        :param apply: Leave the scope configured with the best profile
+        :return: Best stable profile, or None if no point was stable
+        """
+        self.results = []
+        unstable_in_a_row = 0
+        for freq in self._freqs:
+            stable = False
+            for baud_multiplier in self._baud_multipliers:
+                if self.measure(freq, baud_multiplier)["stable"]:
+                    stable = True
+                elif stable:
+                    break  # faster bauds of this clock will not work either
+            unstable_in_a_row = 0 if stable else unstable_in_a_row + 1
+            if unstable_in_a_row >= self._patience:
+                break
+
+        candidates = sorted((x for x in self.results if x["stable"]), key=lambda x: x["traces_per_sec"],
+                            reverse=True)
+        best = next((x for x in candidates if self._confirm(x)), None)
+        if best is None:
+            print("[TUNE] No stable point found.", file=sys.stderr)
+            return None
+        self._set_point(best["clkgen_freq"], best["baud_multiplier"], self._reset_durations[-1],
+                        self._ready_delays[-1])
+        profile = {
+            "clkgen_freq": best["clkgen_freq"],
+            "baud_multiplier": best["baud_multiplier"],
+            "baud": best["baud"],
+            **self.tune_delays(),
+            "traces_per_sec": best["traces_per_sec"],
+            "error_rate": best["error_rate"],
+            "ss_version": self._scope._ss_version,
+        }
+        if save_as is not None:
+            profile["name"] = save_as
+            path = save_profile(save_as, profile)
+            if self._verbose:
+                print(f"[TUNE] Profile saved to {path}")
+        if apply:
+            self._scope.apply_profile(profile, verbose=self._verbose)
+            self._load_key()
+        return profile
+    pass
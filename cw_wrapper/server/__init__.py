@@ -0,0 +1,16 @@
+__all__ = ['CaptureServer', 'CaptureClient', 'JobError', 'ProtocolError']
+
+from typing import TYPE_CHECKING
+from ..utils.lazy import lazy_exports
+
+# Imported on first access (PEP 562), so `import cw_wrapper` stays cheap for headless workers.
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'CaptureServer': '.daemon',
+    'CaptureClient': '.client', 'JobError': '.client',
+    'ProtocolError': '.protocol',
+})
+
+if TYPE_CHECKING:
+    from .daemon import CaptureServer
+    from .client import CaptureClient, JobError
+    from .protocol import ProtocolError
@@ -0,0 +1,5 @@
+import sys
+from .daemon import main
+
+# python -m cw_wrapper.server (--unix PATH | --tcp [HOST:]PORT) [--backend sim] [options]
+sys.exit(main())
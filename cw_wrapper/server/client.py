@@ -0,0 +1,210 @@
+import json
+import socket
+import numpy as np
+from typing import Optional, Dict, Tuple, Iterator, Callable
+from .protocol import Address, ProtocolError, open_socket, recv_header, recv_exact, recv_into, send_parts, \
+    send_json, encode_submit, TRACES_HEADER, DTYPE_CODES, HELLO, SUBMIT, TRACES, DONE, ERROR, CANCEL, STATUS
+
+
+class JobError(RuntimeError):
+    """
+    Raised when the capture server rejects or aborts a job.
+    """
+    pass
+
+
+class CaptureClient:
+    """
+    Client of a `CaptureServer`: submits capture jobs and receives their traces straight into NumPy arrays.
+    Several clients (processes) can share one scope through the same server; the jobs of one client run in order.
+    """
+    def __init__(self,
+                 address: Address,
+                 timeout: Optional[float] = None
+                 ):
+        """
+        :param address: Path of the server's Unix socket, or (host, port) of its TCP socket
+        :param timeout: Socket timeout in seconds (None: block until the server answers)
+        """
+        self._sock = open_socket(address)
+        self._sock.settimeout(timeout)
+        self._sock.connect(address)
+        self._next_job_id = 1
+        self.last_report: Optional[Dict] = None
+        kind, _, payload = self._recv_json()
+        if kind != HELLO:
+            raise ProtocolError(f"Expected the server greeting, got message type {kind}.")
+        self.info: Dict = payload  # device name, samples, ss_version, raw_scale/raw_offset, max_batch
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        pass
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        pass
+
+    def _recv_json(self) -> Tuple[int, int, Dict]:
+        header = recv_header(self._sock)
+        if header is None:
+            raise ProtocolError("The server closed the connection.")
+        kind, job_id, length = header
+        payload = recv_exact(self._sock, length)
+        return kind, job_id, (json.loads(payload.decode('utf-8')) if kind != TRACES else payload)
+
+    def status(self) -> Dict:
+        """
+        :return: Connected clients with their pending jobs, traces served and uptime of the server
+        """
+        send_json(self._sock, STATUS, 0, {})
+        while True:
+            kind, _, payload = self._recv_json()
+            if kind == STATUS:
+                return payload
+
+    def submit(self,
+               n: int,
+               inputs: Optional[np.ndarray] = None,
+               batch_size: int = 256,
+               raw: bool = False,
+               scope_setting: Optional[Dict] = None,
+               **capture_kwargs
+               ) -> int:
+        """
+        Queues a capture job on the server (see `capture` for the arguments).
+
+        :return: Job id, to be passed to `receive`
+        """
+        assert n >= 0 and batch_size >= 1
+        payload_len = capture_kwargs.get("payload_len", 16)
+        if inputs is not None:
+            inputs = np.ascontiguousarray(inputs, dtype=np.uint8)
+            assert inputs.ndim == 2 and inputs.shape[0] >= n and inputs.shape[1] == payload_len
+            inputs = inputs[:n]
+        job_id = self._next_job_id
+        self._next_job_id += 1
+        job = dict(capture_kwargs, n=n, batch_size=batch_size, raw=raw, scope_setting=scope_setting or {},
+                   payload_len=payload_len)
+        send_parts(self._sock, SUBMIT, job_id, encode_submit(job, inputs))
+        return job_id
+
+    def cancel(self, job_id: int) -> None:
+        """
+        Asks the server to drop the batches of the job which were not captured yet.
+        """
+        send_parts(self._sock, CANCEL, job_id, ())
+        pass
+
+    def receive(self,
+                job_id: int,
+                allocate: Callable[[int, int, int, np.dtype, int, int], Tuple[np.ndarray, np.ndarray, np.ndarray]]
+                ) -> Iterator[Tuple[int, int]]:
+        """
+        Receives the batches of a job. For every batch, `allocate(first_row, rows, samples, dtype, plain_len,
+        resp_len)` returns the (traces, plains, ciphers) arrays the batch is read into (C-contiguous views,
+        e.g. rows of a preallocated matrix); then (first_row, rows) is yielded.
+        When the job is done its report is in `last_report`.
+        """
+        while True:
+            header = recv_header(self._sock)
+            if header is None:
+                raise ProtocolError("The server closed the connection.")
+            kind, msg_job_id, length = header
+            if kind != TRACES or msg_job_id != job_id:
+                payload = recv_exact(self._sock, length)
+                if msg_job_id != job_id:
+                    continue  # e.g. the rest of a cancelled job
+                message = json.loads(payload.decode('utf-8'))
+                if kind == DONE:
+                    self.last_report = message
+                    return
+                if kind == ERROR:
+                    raise JobError(message["message"])
+                continue
+            first_row, rows, samples, code, plain_len, resp_len = \
+                TRACES_HEADER.unpack(recv_exact(self._sock, TRACES_HEADER.size))
+            traces, plains, ciphers = allocate(first_row, rows, samples, DTYPE_CODES[code], plain_len, resp_len)
+            for dst in (traces, plains, ciphers):
+                recv_into(self._sock, memoryview(dst))
+            yield first_row, rows
+
+    def capture(self,
+                n: int,
+                inputs: Optional[np.ndarray] = None,
+                batch_size: int = 256,
+                raw: bool = False,
+                scope_setting: Optional[Dict] = None,
+                **capture_kwargs
+                ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict]:
+        """
+        Captures `n` traces on the server's scope. Traces which exhausted their retry budget are dropped
+        by the server, so fewer than `n` rows can be returned.
+
+        :param inputs: (n, payload_len) uint8 matrix. Random (generated by the server) if None
+        :param batch_size: Traces per batch streamed back
+        :param raw: Return the raw ADC readings (uint16; float = raw * info["raw_scale"] + info["raw_offset"])
+        :param scope_setting: `set_scope_detail` arguments applied before every batch of this job
+                              (e.g. {"samples": 3000}); the server's current settings if None
+        :param capture_kwargs: `cmd`, `resp`, `payload_len`, `resp_len`, `max_retries` or `timeout`
+        :return: (traces, plains, ciphers, report) as `CWScope.capture_batch`
+        """
+        arrays = {}
+
+        def allocate(first_row, rows, samples, dtype, plain_len, resp_len):
+            if not arrays:
+                arrays["traces"] = np.empty(shape=(n, samples), dtype=dtype)
+                arrays["plains"] = np.empty(shape=(n, plain_len), dtype=np.uint8)
+                arrays["ciphers"] = np.empty(shape=(n, resp_len), dtype=np.uint8)
+            return tuple(arrays[x][first_row:first_row + rows] for x in ("traces", "plains", "ciphers"))
+
+        job_id = self.submit(n, inputs, batch_size, raw, scope_setting, **capture_kwargs)
+        stored = 0
+        for first_row, rows in self.receive(job_id, allocate):
+            stored = first_row + rows
+        if not arrays:
+            samples = (scope_setting or {}).get("samples", self.info["samples"])
+            return (np.empty(shape=(0, samples), dtype=np.uint16 if raw else np.float64),
+                    np.empty(shape=(0, capture_kwargs.get("payload_len", 16)), dtype=np.uint8),
+                    np.empty(shape=(0, capture_kwargs.get("resp_len", 16)), dtype=np.uint8), self.last_report)
+        return arrays["traces"][:stored], arrays["plains"][:stored], arrays["ciphers"][:stored], self.last_report
+
+    def capture_stream(self,
+                       n: int,
+                       sinks,
+                       inputs: Optional[np.ndarray] = None,
+                       batch_size: int = 256,
+                       raw: bool = False,
+                       scope_setting: Optional[Dict] = None,
+                       **capture_kwargs
+                       ) -> Dict:
+        """
+        Like `CWScope.capture_stream`: every received batch is handed to `sinks` (objects with
+        `append_batch(traces, plains, ciphers)`) and only one batch is held in memory. The arrays are reused
+        for the next batch, so they are only valid during `append_batch`.
+
+        :return: Job report of the server
+        """
+        if hasattr(sinks, "append_batch"):
+            sinks = (sinks,)
+        buffers = {}
+
+        def allocate(first_row, rows, samples, dtype, plain_len, resp_len):
+            key = (samples, dtype, plain_len, resp_len)
+            if buffers.get("key") != key or buffers["traces"].shape[0] < rows:
+                buffers.update(key=key, traces=np.empty(shape=(max(rows, batch_size), samples), dtype=dtype),
+                               plains=np.empty(shape=(max(rows, batch_size), plain_len), dtype=np.uint8),
+                               ciphers=np.empty(shape=(max(rows, batch_size), resp_len), dtype=np.uint8))
+            return tuple(buffers[x][:rows] for x in ("traces", "plains", "ciphers"))
+
+        job_id = self.submit(n, inputs, batch_size, raw, scope_setting, **capture_kwargs)
+        for _, rows in self.receive(job_id, allocate):
+            for sink in sinks:
+                sink.append_batch(buffers["traces"][:rows], buffers["plains"][:rows], buffers["ciphers"][:rows])
+        return self.last_report
+    pass
@@ -0,0 +1,410 @@
+import os
+import sys
+import time
+import queue
+import socket
+import argparse
+import threading
+import collections
+import numpy as np
+from typing import Optional, Sequence, Dict, List
+from ..scope import CWScope
+from .protocol import Address, ProtocolError, open_socket, recv_header, recv_exact, send_json, send_traces, \
+    decode_submit, HELLO, SUBMIT, DONE, ERROR, CANCEL, STATUS
+
+# Options of `capture_batch` a client may set per job; anything else (e.g. `recovery`) is set by the server.
+JOB_CAPTURE_KWARGS = ("cmd", "resp", "payload_len", "resp_len", "max_retries", "timeout")
+# Scope settings a job may override; the others are shared by all jobs.
+_SCOPE_SETTING_KEYS = ("samples", "trigger_mode", "offset", "pre_samples", "scale")
+
+
+class _Job:
+    def __init__(self,
+                 job_id: int,
+                 n: int,
+                 inputs: Optional[np.ndarray],
+                 batch_size: int,
+                 raw: bool,
+                 scope_setting: Dict,
+                 capture_kwargs: Dict
+                 ):
+        self.job_id = job_id
+        self.n = n
+        self.inputs = inputs
+        self.batch_size = batch_size
+        self.raw = raw
+        self.scope_setting = scope_setting
+        self.capture_kwargs = capture_kwargs
+        self.attempted = 0  # inputs captured so far (stored or failed)
+        self.stored = 0
+        self.failed = 0
+        self.retries = 0
+        self.cancelled = False
+        self.started = time.perf_counter()
+        pass
+
+    @property
+    def finished(self) -> bool:
+        return self.cancelled or self.attempted >= self.n
+
+    def report(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {"stored": self.stored, "failed": self.failed, "retries": self.retries, "elapsed": elapsed,
+                "traces_per_sec": (self.stored / elapsed) if elapsed > 0 else float("inf"),
+                "cancelled": self.cancelled}
+    pass
+
+
+class _Session:
+    # One connected client: its job queue (FIFO), scheduling deficit and the writer thread which owns its sends.
+    def __init__(self, sock: socket.socket, name: str):
+        self.sock = sock
+        self.name = name
+        self.jobs = collections.deque()
+        self.deficit = 0
+        self.outbox = queue.Queue()
+        self.in_flight = 0  # trace batches queued but not sent yet (guarded by the server's lock)
+        self.closed = False
+        self.served = 0
+        pass
+    pass
+
+
+class CaptureServer:
+    """
+    Capture daemon: holds the `CWScope` connection and serves batched capture jobs to several clients
+    (`CaptureClient`) over a Unix or TCP socket.
+
+    Traces are streamed back batch by batch as binary frames (see `protocol`) which the client receives
+    directly into NumPy buffers. The scope is driven by a single scheduler thread which serves the clients
+    with pending jobs by deficit round robin: each turn a client earns `quantum` traces of credit, so clients
+    get equal shares of capture time whatever their batch sizes, and the jobs of one client run in order.
+    A client which does not read its traces fast enough (more than `max_in_flight` batches unsent) skips
+    its turns instead of stalling the others.
+
+    The scope settings at `start()` are the baseline of every job: a job's `scope_setting` only overrides them
+    for its own batches, so the settings of one client never leak into the jobs of another.
+    """
+    def __init__(self,
+                 scope: CWScope,
+                 address: Address,
+                 quantum: int = 256,
+                 max_batch: int = 4096,
+                 max_in_flight: int = 4,
+                 capture_kwargs: Optional[Dict] = None,
+                 verbose: bool = True
+                 ):
+        """
+        :param scope: Connected scope served to the clients
+        :param address: Path of a Unix socket, or (host, port) of a TCP socket
+        :param quantum: Traces of credit a client earns per scheduling turn
+        :param max_batch: Largest batch size a job may request
+        :param max_in_flight: Captured batches per client waiting to be sent before the client is skipped
+        :param capture_kwargs: Options passed to every `capture_batch` (e.g. `recovery`)
+        """
+        assert quantum >= 1 and max_batch >= 1 and max_in_flight >= 1
+        self._scope = scope
+        self._address = address
+        self._quantum = quantum
+        self._max_batch = max_batch
+        self._max_in_flight = max_in_flight
+        self._capture_kwargs = {} if capture_kwargs is None else capture_kwargs
+        self._verbose = verbose
+        self._cond = threading.Condition()
+        self._sessions: List[_Session] = []
+        self._listener: Optional[socket.socket] = None
+        self._threads: List[threading.Thread] = []
+        self._closed = threading.Event()
+        self._started_at = None
+        self._served = 0
+        self._baseline_setting: Dict = {}
+        pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        pass
+
+    @property
+    def address(self) -> Address:
+        """
+        Bound address (with the actual port if the TCP port was 0).
+        """
+        if self._listener is not None and not isinstance(self._address, str):
+            return self._listener.getsockname()[:2]
+        return self._address
+
+    def start(self) -> "CaptureServer":
+        """
+        Binds the socket and starts serving in background threads.
+        """
+        assert self._listener is None, "The server is already running."
+        listener = open_socket(self._address)
+        if isinstance(self._address, str):
+            if os.path.exists(self._address):
+                os.unlink(self._address)  # stale socket of a previous run
+        else:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(self._address)
+        listener.listen()
+        listener.settimeout(0.5)  # lets the accept loop notice `close()`
+        self._listener = listener
+        self._started_at = time.time()
+        mirror = self._scope._mirror
+        self._baseline_setting = {key: mirror[key] for key in _SCOPE_SETTING_KEYS}
+        for target, name in ((self._accept_loop, "capture-server-accept"), (self._schedule_loop, "capture-server")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self._verbose:
+            print(f"[SERVER] Serving {self._scope.get_status(verbose=False)['name']} on {self.address}")
+        return self
+
+    def serve_forever(self) -> None:
+        """
+        Serves until `close()` is called or the process is interrupted.
+        """
+        if self._listener is None:
+            self.start()
+        try:
+            while not self._closed.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+        pass
+
+    def close(self) -> None:
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        with self._cond:
+            sessions = list(self._sessions)
+            self._cond.notify_all()
+        for session in sessions:
+            self._drop_session(session)
+        if self._listener is not None:
+            self._listener.close()
+            if isinstance(self._address, str) and os.path.exists(self._address):
+                os.unlink(self._address)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        pass
+
+    def status(self) -> Dict:
+        with self._cond:
+            clients = [{"client": s.name, "jobs": len(s.jobs), "pending": sum(j.n - j.attempted for j in s.jobs),
+                        "served": s.served} for s in self._sessions]
+        samples = self._baseline_setting["samples"] if self._baseline_setting else self._scope.get_samples()
+        return {"clients": clients, "served": self._served, "samples": samples,
+                "uptime": time.time() - self._started_at if self._started_at is not None else 0.0}
+
+    def _accept_loop(self) -> None:
+        while not self._closed.is_set():
+            try:
+                sock, peer = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:  # the listener was closed
+                break
+            sock.settimeout(None)
+            session = _Session(sock, str(peer) if peer else f"unix-{sock.fileno()}")
+            for target in (self._read_loop, self._write_loop):
+                threading.Thread(target=target, args=(session,), name=f"capture-server-{session.name}",
+                                 daemon=True).start()
+            scope = self._scope
+            scale, offset = scope.get_trace_scale()
+            session.outbox.put((HELLO, 0, {"name": scope.get_status(verbose=False)["name"],
+                                           "samples": self._baseline_setting["samples"],
+                                           "ss_version": scope._ss_version,
+                                           "raw_scale": scale, "raw_offset": offset,
+                                           "max_batch": self._max_batch}))
+            with self._cond:
+                self._sessions.append(session)
+            if self._verbose:
+                print(f"[SERVER] Client {session.name} connected.")
+        pass
+
+    def _read_loop(self, session: _Session) -> None:
+        try:
+            while True:
+                header = recv_header(session.sock)
+                if header is None:
+                    break
+                kind, job_id, length = header
+                payload = recv_exact(session.sock, length)
+                if kind == SUBMIT:
+                    self._submit(session, job_id, payload)
+                elif kind == CANCEL:
+                    with self._cond:
+                        for job in session.jobs:
+                            if job.job_id == job_id:
+                                job.cancelled = True
+                elif kind == STATUS:
+                    session.outbox.put((STATUS, job_id, self.status()))
+                else:
+                    raise ProtocolError(f"Unexpected message type {kind}.")
+        except (OSError, ProtocolError, ValueError) as e:
+            if not session.closed and self._verbose:
+                print(f"[SERVER] Client {session.name}: {type(e).__name__}: {e}", file=sys.stderr)
+        self._drop_session(session)
+        pass
+
+    def _submit(self, session: _Session, job_id: int, payload: bytearray) -> None:
+        try:
+            request, inputs = decode_submit(payload)
+            n, batch_size = int(request["n"]), int(request.get("batch_size", self._quantum))
+            assert n >= 0 and 1 <= batch_size <= self._max_batch, \
+                f"'batch_size' must be in [1, {self._max_batch}]."
+            capture_kwargs = {k: request[k] for k in JOB_CAPTURE_KWARGS if request.get(k) is not None}
+            scope_setting = request.get("scope_setting") or {}
+            assert set(scope_setting) <= set(_SCOPE_SETTING_KEYS), \
+                "Unknown scope setting."
+            job = _Job(job_id, n, inputs, batch_size, bool(request.get("raw", False)), scope_setting,
+                       capture_kwargs)
+        except (KeyError, AssertionError, ValueError) as e:
+            session.outbox.put((ERROR, job_id, {"message": f"Invalid job: {e}"}))
+            return
+        with self._cond:
+            session.jobs.append(job)
+            self._cond.notify_all()
+        pass
+
+    def _write_loop(self, session: _Session) -> None:
+        try:
+            while True:
+                item = session.outbox.get()
+                if item is None:
+                    break
+                kind = item[0]
+                if kind is None:  # a trace batch
+                    _, job_id, first_row, traces, plains, ciphers = item
+                    try:
+                        send_traces(session.sock, job_id, first_row, traces, plains, ciphers)
+                    finally:
+                        with self._cond:
+                            session.in_flight -= 1
+                else:
+                    send_json(session.sock, kind, item[1], item[2])
+        except OSError:
+            pass
+        self._drop_session(session)
+        pass
+
+    def _drop_session(self, session: _Session) -> None:
+        with self._cond:
+            if session.closed:
+                return
+            session.closed = True
+            session.jobs.clear()
+            if session in self._sessions:
+                self._sessions.remove(session)
+        try:
+            session.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        session.sock.close()
+        session.outbox.put(None)
+        if self._verbose and not self._closed.is_set():
+            print(f"[SERVER] Client {session.name} disconnected.")
+        pass
+
+    def _schedule_loop(self) -> None:
+        turn = 0
+        while not self._closed.is_set():
+            with self._cond:
+                while not self._closed.is_set() and not any(s.jobs for s in self._sessions):
+                    self._cond.wait(0.5)
+                active = [s for s in self._sessions if s.jobs]
+            if not active:
+                continue
+            ran = False
+            turn += 1
+            for i in range(len(active)):
+                session = active[(turn + i) % len(active)]  # rotated, so no client is always first
+                with self._cond:
+                    job = session.jobs[0] if session.jobs and not session.closed else None
+                if job is None:
+                    continue
+                if not job.finished:
+                    if session.in_flight >= self._max_in_flight:
+                        continue  # the client is behind on reading: skip its turn (and its credit)
+                    session.deficit += self._quantum
+                    # Batches are captured while the credit lasts; the rest carries over to the next turn.
+                    while not job.finished and session.deficit >= min(job.batch_size, job.n - job.attempted) \
+                            and session.in_flight < self._max_in_flight:
+                        k = min(job.batch_size, job.n - job.attempted)
+                        session.deficit -= k
+                        self._run_batch(session, job, k)
+                        ran = True
+                if job.finished:
+                    with self._cond:
+                        if session.jobs and session.jobs[0] is job:
+                            session.jobs.popleft()
+                        if not session.jobs:
+                            session.deficit = 0
+                    if not session.closed:
+                        session.outbox.put((DONE, job.job_id, job.report()))
+            if not ran:
+                time.sleep(0.001)  # every active client is behind on reading
+        pass
+
+    def _run_batch(self, session: _Session, job: _Job, k: int) -> None:
+        scope = self._scope
+        try:
+            # Applied on top of the baseline for every batch; only the settings which differ are written.
+            scope.set_scope_detail(**{**self._baseline_setting, **job.scope_setting})
+            scope.set_raw_mode(job.raw)
+            inputs = job.inputs[job.attempted:job.attempted + k] if job.inputs is not None else None
+            traces, plains, ciphers, report = scope.capture_batch(k, inputs=inputs,
+                                                                  **{**self._capture_kwargs, **job.capture_kwargs})
+        except Exception as e:
+            job.cancelled = True
+            session.outbox.put((ERROR, job.job_id, {"message": f"{type(e).__name__}: {e}"}))
+            return
+        if report["failed"].any():
+            ok = ~report["failed"]
+            traces, plains, ciphers = traces[ok], plains[ok], ciphers[ok]
+        with self._cond:
+            session.in_flight += 1
+        session.outbox.put((None, job.job_id, job.stored, traces, plains, ciphers))
+        job.attempted += k
+        job.stored += traces.shape[0]
+        job.failed += int(report["failed"].sum())
+        job.retries += int(report["retries"].sum())
+        session.served += traces.shape[0]
+        self._served += traces.shape[0]
+        pass
+    pass
+
+
+def _parse_address(unix: Optional[str], tcp: Optional[str]) -> Address:
+    if unix is not None:
+        return unix
+    host, _, port = tcp.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cw_wrapper.server",
+                                     description="Capture daemon sharing one scope with several clients.")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--unix", help="path of the Unix socket")
+    where.add_argument("--tcp", help="[host:]port of the TCP socket (default host: 127.0.0.1)")
+    parser.add_argument("--backend", default="chipwhisperer", help="connect() backend")
+    parser.add_argument("--ss-version", default="1.1", choices=("1.0", "1.1", "2.0"))
+    parser.add_argument("--profile", default=None, help="target timing profile applied on connect")
+    parser.add_argument("--samples", type=int, default=None)
+    parser.add_argument("--quantum", type=int, default=256, help="traces per client per scheduling turn")
+    args = parser.parse_args(argv)
+
+    scope = CWScope()
+    scope.connect(ss_version=args.ss_version, backend=args.backend, profile=args.profile)
+    if args.samples is not None:
+        scope.set_scope_detail(samples=args.samples)
+    CaptureServer(scope, _parse_address(args.unix, args.tcp), quantum=args.quantum).serve_forever()
+    scope.disconnect()
+    return 0
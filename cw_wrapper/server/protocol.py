@@ -0,0 +1,138 @@
+import json
+import socket
+import struct
+import numpy as np
+from typing import Tuple, Dict, Union, Optional, Sequence
+
+# Every message: HEADER (magic, version, type, job id, payload length) followed by the payload.
+# Control messages carry a UTF-8 JSON payload; TRACES carries TRACES_HEADER followed by the raw
+# little-endian traces, plaintexts and ciphertexts of the batch (no pickling or hex encoding).
+MAGIC = b"CW"
+VERSION = 1
+HEADER = struct.Struct("<2sBBIQ")
+TRACES_HEADER = struct.Struct("<QIIBHH")  # first row, rows, samples, dtype code, plaintext length, response length
+
+HELLO = 1       # server -> client: device info (samples, name, ss_version, scale/offset of raw traces)
+SUBMIT = 2      # client -> server: capture job (JSON length, JSON, optional raw inputs)
+TRACES = 3      # server -> client: one captured batch
+DONE = 4        # server -> client: job report
+ERROR = 5       # server -> client: the job (or request) failed
+CANCEL = 6      # client -> server: drop the remaining batches of a job
+STATUS = 7      # client -> server: request the server status; server -> client: the status
+
+DTYPE_CODES = {1: np.dtype('<u2'), 2: np.dtype('<f4'), 3: np.dtype('<f8')}
+_CODE_OF_DTYPE = {dtype: code for code, dtype in DTYPE_CODES.items()}
+
+Address = Union[str, Tuple[str, int]]
+
+
+class ProtocolError(RuntimeError):
+    """
+    Raised when the peer sends a malformed message or closes the connection mid-message.
+    """
+    pass
+
+
+def dtype_code(dtype) -> int:
+    dtype = np.dtype(dtype).newbyteorder('<')
+    assert dtype in _CODE_OF_DTYPE, f"Traces of dtype {dtype} cannot be streamed."
+    return _CODE_OF_DTYPE[dtype]
+
+
+def open_socket(address: Address) -> socket.socket:
+    """
+    :param address: Path of a Unix socket, or (host, port) of a TCP socket
+    """
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def recv_into(sock: socket.socket, view: memoryview) -> None:
+    """
+    Fills `view` (e.g. the bytes of a NumPy buffer) from the socket.
+    """
+    view = view.cast('B') if view.format != 'B' or view.ndim != 1 else view
+    received = 0
+    while received < view.nbytes:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ProtocolError("The connection was closed mid-message.")
+        received += n
+    pass
+
+
+def recv_exact(sock: socket.socket, n: int) -> bytearray:
+    buf = bytearray(n)
+    recv_into(sock, memoryview(buf))
+    return buf
+
+
+def recv_header(sock: socket.socket) -> Optional[Tuple[int, int, int]]:
+    """
+    :return: (message type, job id, payload length), or None if the peer closed the connection cleanly
+    """
+    first = sock.recv(HEADER.size)
+    if len(first) == 0:
+        return None
+    buf = bytearray(first)
+    if len(buf) < HEADER.size:
+        buf += recv_exact(sock, HEADER.size - len(buf))
+    magic, version, kind, job_id, length = HEADER.unpack(buf)
+    if magic != MAGIC or version != VERSION:
+        raise ProtocolError(f"Unexpected header {bytes(buf)!r}.")
+    return kind, job_id, length
+
+
+def send_parts(sock: socket.socket,
+               kind: int,
+               job_id: int,
+               parts: Sequence[Union[bytes, bytearray, memoryview]]
+               ) -> None:
+    # Parts are sent as they are (no concatenation), so array payloads are not copied.
+    length = sum(memoryview(x).nbytes for x in parts)
+    sock.sendall(HEADER.pack(MAGIC, VERSION, kind, job_id, length))
+    for part in parts:
+        sock.sendall(part)
+    pass
+
+
+def send_json(sock: socket.socket, kind: int, job_id: int, obj: Dict) -> None:
+    send_parts(sock, kind, job_id, (json.dumps(obj).encode('utf-8'),))
+    pass
+
+
+def send_traces(sock: socket.socket,
+                job_id: int,
+                first_row: int,
+                traces: np.ndarray,
+                plains: np.ndarray,
+                ciphers: np.ndarray
+                ) -> None:
+    traces = np.ascontiguousarray(traces, dtype=traces.dtype.newbyteorder('<'))
+    plains = np.ascontiguousarray(plains, dtype=np.uint8)
+    ciphers = np.ascontiguousarray(ciphers, dtype=np.uint8)
+    rows, samples = traces.shape
+    head = TRACES_HEADER.pack(first_row, rows, samples, dtype_code(traces.dtype), plains.shape[1], ciphers.shape[1])
+    send_parts(sock, TRACES, job_id, (head, memoryview(traces).cast('B'), memoryview(plains).cast('B'),
+                                      memoryview(ciphers).cast('B')))
+    pass
+
+
+def encode_submit(job: Dict, inputs: Optional[np.ndarray] = None) -> Tuple[bytes, ...]:
+    body = json.dumps(dict(job, has_inputs=inputs is not None)).encode('utf-8')
+    parts = (struct.pack("<I", len(body)), body)
+    if inputs is not None:
+        parts += (memoryview(np.ascontiguousarray(inputs, dtype=np.uint8)).cast('B'),)
+    return parts
+
+
+def decode_submit(payload: bytearray) -> Tuple[Dict, Optional[np.ndarray]]:
+    (json_len,) = struct.unpack_from("<I", payload)
+    job = json.loads(payload[4:4 + json_len].decode('utf-8'))
+    inputs = None
+    if job.get("has_inputs"):
+        inputs = np.frombuffer(payload, dtype=np.uint8, offset=4 + json_len).reshape(job["n"], job["payload_len"])
+    return job, inputs
@@ -0,0 +1,14 @@
+__all__ = ['SimulatedScope', 'SimulatedSS1xTarget', 'SimulatedSS2xTarget', 'hw_sbox_leakage']
+
+from typing import TYPE_CHECKING
+from ..utils.lazy import lazy_exports
+
+# Imported on first access (PEP 562), so `import cw_wrapper` stays cheap for headless workers.
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'SimulatedScope': '.sim_scope', 'hw_sbox_leakage': '.sim_scope',
+    'SimulatedSS1xTarget': '.sim_target', 'SimulatedSS2xTarget': '.sim_target',
+})
+
+if TYPE_CHECKING:
+    from .sim_scope import SimulatedScope, hw_sbox_leakage
+    from .sim_target import SimulatedSS1xTarget, SimulatedSS2xTarget
@@ -0,0 +1,249 @@
+import time
+import numpy as np
+from typing import Optional, Callable, Union
+from ..utils.aes import SBOX, HW
+
+_SBOX = np.array(SBOX, dtype=np.uint8)
+_HW = np.array(HW, dtype=np.uint8)
+
+
+def hw_sbox_leakage(key: Union[bytes, bytearray], plain: Union[bytes, bytearray]) -> np.ndarray:
+    """
+    Default leakage model: Hamming weight of the first-round S-box outputs (16 values).
+    """
+    k = np.frombuffer(bytes(key), dtype=np.uint8)
+    p = np.frombuffer(bytes(plain), dtype=np.uint8)
+    return _HW[_SBOX[p ^ k]].astype(np.float64)
+
+
+class _SimADC:
+    def __init__(self):
+        self.samples = 5000
+        self.offset = 0
+        self.presamples = 0
+        self.basic_mode = "rising_edge"
+        self.trig_count = 0
+        self.timeout = 2
+        pass
+
+    def __str__(self):
+        return (f"samples    = {self.samples}\n"
+                f"offset     = {self.offset}\n"
+                f"presamples = {self.presamples}\n"
+                f"basic_mode = {self.basic_mode}\n"
+                f"trig_count = {self.trig_count}")
+    pass
+
+
+class _SimClock:
+    def __init__(self):
+        self.clkgen_freq = 7.37e6
+        self.adc_src = "clkgen_x4"
+        pass
+
+    @property
+    def adc_freq(self) -> float:
+        return self.clkgen_freq * (4 if self.adc_src == "clkgen_x4" else 1)
+
+    @property
+    def adc_locked(self) -> bool:
+        return True
+
+    def __str__(self):
+        return (f"clkgen_freq = {self.clkgen_freq}\n"
+                f"adc_src     = {self.adc_src}\n"
+                f"adc_freq    = {self.adc_freq}")
+    pass
+
+
+class _SimCWExtra:
+    def __init__(self, scope):
+        self._scope = scope
+        pass
+
+    def setGPIOStatenrst(self, state) -> None:
+        if state == 0:
+            self._scope._power_down_target()
+        else:
+            self._scope._power_up_target()
+        pass
+
+    def setTargetPowerState(self, state: bool) -> None:
+        if not state:
+            self._scope._power_down_target()
+        else:
+            self._scope._power_up_target()
+        pass
+    pass
+
+
+class _SimAdvancedSettings:
+    def __init__(self, scope):
+        self.cwEXTRA = _SimCWExtra(scope)
+        pass
+    pass
+
+
+class SimulatedScope:
+    """
+    Stand-in for `chipwhisperer.capture.scopes.OpenADC` which synthesizes traces instead of measuring them.
+
+    Every operation a simulated target runs while the scope is armed is placed on the trace
+    `op_period` samples after the previous one. Operation `i` leaks `leakage_model(key, plain)[j] * leak_gain`
+    around sample `i * op_period + leak_start + j * leak_spacing` on top of a fixed background waveform,
+    then Gaussian noise is added and the result is quantized to 10 bits like the OpenADC.
+
+    With probability `link_error_rate` per capture the simulated USB link drops: `arm`/`capture`
+    raise `OSError` until the scope is reconnected (`con`).
+    With `trigger_jitter` > 0 the window of every capture is moved by a random number of samples in
+    [-trigger_jitter, trigger_jitter], like a target clocked asynchronously to the ADC.
+    """
+    def __init__(self,
+                 noise_std: float = 0.01,
+                 leak_gain: float = 0.01,
+                 leakage_model: Callable[[bytes, bytes], np.ndarray] = hw_sbox_leakage,
+                 leak_start: int = 500,
+                 leak_spacing: int = 40,
+                 leak_width: int = 3,
+                 op_period: int = 2000,
+                 seed: Optional[int] = None,
+                 realtime: bool = False,
+                 name: str = "Simulated OpenADC",
+                 link_error_rate: float = 0.0,
+                 trigger_jitter: int = 0
+                 ):
+        assert noise_std >= 0 and leak_width >= 1 and op_period >= 1 and 0 <= link_error_rate <= 1
+        assert trigger_jitter >= 0
+        self.adc = _SimADC()
+        self.clock = _SimClock()
+        self.advancedSettings = _SimAdvancedSettings(self)
+        self.noise_std = noise_std
+        self.leak_gain = leak_gain
+        self.leakage_model = leakage_model
+        self.leak_start = leak_start
+        self.leak_spacing = leak_spacing
+        self.leak_width = leak_width
+        self.op_period = op_period
+        self.realtime = realtime
+        self.link_error_rate = link_error_rate
+        self.trigger_jitter = trigger_jitter
+        self._link_down = False
+        self._name = name
+        self._rng = np.random.default_rng(seed)
+        bg_rng = np.random.default_rng(0 if seed is None else seed + 1)
+        # Fixed background: a clock-like ripple plus slowly varying activity, repeated every op_period.
+        n = np.arange(op_period)
+        self._background = 0.04 * np.sin(np.pi * n / 2) \
+            + 0.05 * np.convolve(bg_rng.standard_normal(op_period + 31), np.ones(32) / 32, mode='valid')
+        self._connected = False
+        self._armed = False
+        self._events = []
+        self._last_trace: Optional[np.ndarray] = None
+        self._last_int_trace: Optional[np.ndarray] = None
+        self._targets = []
+        pass
+
+    def __str__(self):
+        return f"{self._name}\n[adc]\n{self.adc}\n[clock]\n{self.clock}"
+
+    def con(self, **kwargs) -> bool:
+        self._connected = True
+        self._link_down = False
+        return True
+
+    def dis(self) -> bool:
+        self._connected = False
+        self._armed = False
+        return True
+
+    def getStatus(self) -> bool:
+        return self._connected
+
+    def get_name(self) -> str:
+        return self._name
+
+    def default_setup(self) -> None:
+        self.adc.samples = 5000
+        self.adc.offset = 0
+        self.adc.presamples = 0
+        self.adc.basic_mode = "rising_edge"
+        self.clock.clkgen_freq = 7.37e6
+        self.clock.adc_src = "clkgen_x4"
+        pass
+
+    def _attach_target(self, target) -> None:
+        self._targets.append(target)
+        pass
+
+    def _power_down_target(self) -> None:
+        for target in self._targets:
+            target.power_cycle()
+        pass
+
+    def _power_up_target(self) -> None:
+        for target in self._targets:
+            target.power_up()
+        pass
+
+    def _trigger(self,
+                 key: Union[bytes, bytearray],
+                 plain: Union[bytes, bytearray]
+                 ) -> None:
+        """
+        Called by a simulated target for each operation it runs.
+        """
+        if self._armed:
+            self._events.append(np.asarray(self.leakage_model(key, plain), dtype=np.float64))
+        pass
+
+    def _check_link(self) -> None:
+        if self._link_down:
+            raise OSError("Simulated USB link is down.")
+        pass
+
+    def arm(self) -> None:
+        self._check_link()
+        self._armed = True
+        self._events = []
+        pass
+
+    def capture(self, poll_done: bool = False) -> bool:
+        """
+        :return: True if timeout happened (no operation triggered the armed scope)
+        """
+        self._check_link()
+        if self.link_error_rate > 0 and self._rng.random() < self.link_error_rate:
+            self._link_down = True
+            self._check_link()
+        if not self._armed or not self._events:
+            self._armed = False
+            return True
+        self._armed = False
+        samples = self.adc.samples
+        start = self.adc.offset - self.adc.presamples
+        if self.trigger_jitter > 0:
+            start += int(self._rng.integers(-self.trigger_jitter, self.trigger_jitter + 1))
+        idx = np.arange(start, start + samples)
+        trace = self._background[idx % self.op_period]
+        for i, leaks in enumerate(self._events):
+            base = i * self.op_period + self.leak_start - start
+            for j, leak in enumerate(leaks):
+                lo = base + j * self.leak_spacing
+                if lo + self.leak_width <= 0 or lo >= samples:
+                    continue
+                trace[max(lo, 0):min(lo + self.leak_width, samples)] += self.leak_gain * leak
+        if self.noise_std > 0:
+            trace += self._rng.normal(0.0, self.noise_std, size=samples)
+        self._last_int_trace = np.clip(np.floor((trace + 0.5) * 1024), 0, 1023).astype(np.int16)
+        self._last_trace = self._last_int_trace / 1024.0 - 0.5
+        self.adc.trig_count = len(self._events) * self.op_period
+        if self.realtime:
+            # 10-bit samples are packed 3 per 4 bytes and read at roughly 8 MB/s over USB.
+            time.sleep(0.001 + samples * 4 / 3 / 8e6)
+        return False
+
+    def get_last_trace(self, as_int: bool = False) -> np.ndarray:
+        if as_int:
+            return self._last_int_trace
+        return self._last_trace
+    pass
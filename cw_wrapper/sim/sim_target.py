@@ -0,0 +1,314 @@
+import time
+import random
+from typing import Optional, Union, Tuple
+from ..utils.aes import aes128_expand_key, aes128_encrypt_block
+from ..simpleserial_target.ss2x_codec import crc8, crc8_table, cobs_stuff, cobs_unstuff
+
+# Error codes of SimpleSerial (shared by the v1.1 'z' ack and the v2 'e' packet)
+SS_OK = 0x00
+SS_ERR_CMD = 0x01
+SS_ERR_CRC = 0x02
+SS_ERR_TIMEOUT = 0x03
+SS_ERR_LEN = 0x04
+SS_ERR_FRAME_BYTE = 0x05
+
+# Command flag: the payload length is variable (up to the declared length)
+CMD_FLAG_VARIABLE_LEN = 0x01
+
+
+class _SimulatedTargetBase:
+    """
+    Loopback SimpleSerial target which runs AES-128 in software.
+    Implements the subset of `chipwhisperer.targets.SimpleSerial(2)` used by `SSTargetBase`.
+
+    Commands:
+        'k' (16 bytes)     : set the key
+        'p' (16 bytes)     : encrypt the plaintext with the key, respond with 'r' (16 bytes)
+        'b' (16 * K bytes) : encrypt K plaintexts back to back under one trigger, respond with 'r' (16 * K bytes)
+        'x' (0 bytes)      : no-op
+
+    Faults can be injected for testing recovery: with probability `drop_rate` a frame is silently ignored
+    (transient), with probability `hang_rate` the target stops answering until it is power cycled.
+
+    Timing limits of a real target can be emulated for tuning (`ClockTuner`):
+    frames arriving within `boot_time` seconds after power-up are ignored, a power-down shorter than
+    `min_reset_time` browns the target out (it hangs), the UART only works if the host baud is within 3% of
+    `firmware_baud` scaled with the clock, and above `max_clock` a growing share of the encryptions is corrupted.
+    With `realtime`, an encryption also takes `op_cycles` clock cycles.
+    """
+    def __init__(self,
+                 scope,
+                 key: Optional[Union[bytes, bytearray]] = None,
+                 baud: int = 38400,
+                 realtime: bool = False,
+                 max_batch_len: int = 64,
+                 drop_rate: float = 0.0,
+                 hang_rate: float = 0.0,
+                 seed: Optional[int] = None,
+                 boot_time: float = 0.0,
+                 min_reset_time: float = 0.0,
+                 firmware_baud: Optional[int] = None,
+                 max_clock: Optional[float] = None,
+                 op_cycles: int = 0
+                 ):
+        assert 0 <= drop_rate <= 1 and 0 <= hang_rate <= 1
+        assert boot_time >= 0 and min_reset_time >= 0 and op_cycles >= 0
+        self._scope = scope
+        self._default_key = bytes(16) if key is None else bytes(key)
+        self.baud = baud
+        self.realtime = realtime
+        self.drop_rate = drop_rate
+        self.hang_rate = hang_rate
+        self._rng = random.Random(seed)
+        self.boot_time = boot_time
+        self.min_reset_time = min_reset_time
+        self.firmware_baud = firmware_baud
+        self.max_clock = max_clock
+        self.op_cycles = op_cycles
+        self._hung = False
+        self._powered_down_at: Optional[float] = None
+        self._ready_at = 0.0
+        self._rx = bytearray()
+        self._tx = bytearray()
+        # cmd -> (length, handler, flags)
+        self._commands = {
+            ord('k'): (16, self._cmd_set_key, 0),
+            ord('p'): (16, self._cmd_encrypt, 0),
+            ord('b'): (max_batch_len, self._cmd_encrypt_batch, CMD_FLAG_VARIABLE_LEN),
+            ord('x'): (0, self._cmd_nop, 0),
+        }
+        self.power_cycle()
+        if scope is not None:
+            scope._attach_target(self)
+        pass
+
+    def power_cycle(self) -> None:
+        """
+        Called by the simulated scope when the target loses power (VCC or nRST reset).
+        """
+        self._key = self._default_key
+        self._round_keys = aes128_expand_key(self._key)
+        self._hung = False
+        self._rx.clear()
+        self._tx.clear()
+        self._powered_down_at = time.perf_counter()
+        pass
+
+    def power_up(self) -> None:
+        """
+        Called by the simulated scope when the power (or nRST) is restored after `power_cycle`.
+        """
+        now = time.perf_counter()
+        if self._powered_down_at is not None and now - self._powered_down_at < self.min_reset_time:
+            self._hung = True  # brown-out
+        self._powered_down_at = None
+        self._ready_at = now + self.boot_time
+        pass
+
+    def _clock(self) -> float:
+        return 7.37e6 if self._scope is None else self._scope.clock.clkgen_freq
+
+    def _link_ok(self) -> bool:
+        if self.firmware_baud is None:
+            return True
+        target_baud = self.firmware_baud * self._clock() / 7.37e6  # the firmware UART divider is fixed
+        return abs(self.baud / target_baud - 1.0) <= 0.03
+
+    @property
+    def key(self) -> bytes:
+        return self._key
+
+    def _cmd_set_key(self, data: bytes) -> Tuple[int, Optional[Tuple[int, bytes]]]:
+        self._key = bytes(data)
+        self._round_keys = aes128_expand_key(self._key)
+        return SS_OK, None
+
+    def _cmd_encrypt(self, data: bytes) -> Tuple[int, Optional[Tuple[int, bytes]]]:
+        if self._scope is not None:
+            self._scope._trigger(self._key, data)
+        cipher = aes128_encrypt_block(self._key, data, self._round_keys)
+        if self.realtime and self.op_cycles > 0:
+            time.sleep(self.op_cycles / self._clock())
+        if self.max_clock is not None and self._clock() > self.max_clock \
+                and self._rng.random() < min(1.0, 5.0 * (self._clock() / self.max_clock - 1.0)):
+            cipher = bytes((cipher[0] ^ 0x01,)) + cipher[1:]  # overclocked: a glitched result
+        return SS_OK, (ord('r'), cipher)
+
+    def _cmd_encrypt_batch(self, data: bytes) -> Tuple[int, Optional[Tuple[int, bytes]]]:
+        if len(data) == 0 or len(data) % 16 != 0:
+            return SS_ERR_LEN, None
+        result = bytearray()
+        for i in range(0, len(data), 16):
+            result += self._cmd_encrypt(data[i:i + 16])[1][1]
+        return SS_OK, (ord('r'), bytes(result))
+
+    def _cmd_nop(self, data: bytes) -> Tuple[int, Optional[Tuple[int, bytes]]]:
+        return SS_OK, None
+
+    def _sleep_for_transfer(self, n_bytes: int) -> None:
+        if self.realtime and n_bytes > 0:
+            time.sleep(n_bytes * 10 / self.baud)  # 8N1: 10 bits per byte
+        pass
+
+    def _process(self) -> None:
+        raise NotImplementedError()
+
+    def con(self, scope=None, **kwargs) -> None:
+        pass
+
+    def dis(self) -> None:
+        pass
+
+    def write(self, data, timeout=0) -> None:
+        if isinstance(data, str):
+            data = data.encode('latin-1')
+        elif isinstance(data, list):
+            data = bytearray(data)
+        self._sleep_for_transfer(len(data))
+        if self.hang_rate > 0 and not self._hung and self._rng.random() < self.hang_rate:
+            self._hung = True
+        if self._hung or (self.drop_rate > 0 and self._rng.random() < self.drop_rate):
+            return
+        if not self._link_ok() or time.perf_counter() < self._ready_at:  # garbled or still booting
+            return
+        self._rx.extend(data)
+        self._process()
+        pass
+
+    def read(self, num_char: int = 0, timeout: int = 250) -> str:
+        if num_char == 0:
+            num_char = len(self._tx)
+        result = bytes(self._tx[:num_char])
+        del self._tx[:num_char]
+        self._sleep_for_transfer(len(result))
+        return result.decode('latin-1')
+
+    def in_waiting(self) -> int:
+        return len(self._tx)
+
+    def in_waiting_tx(self) -> int:
+        return 0
+
+    def flush(self) -> None:
+        self._tx.clear()
+        pass
+
+    def get_simpleserial_commands(self, timeout: int = 250, ack: bool = True) -> list:
+        return [{"cmd": bytes((cmd,)), "len": length, "flags": flags}
+                for cmd, (length, _, flags) in self._commands.items()]
+    pass
+
+
+class SimulatedSS1xTarget(_SimulatedTargetBase):
+    """
+    SimpleSerial v1.x loopback target: "<cmd><hex payload>\\n" frames, acked with "z<hex code>\\n" (v1.1 only).
+    """
+    def __init__(self,
+                 scope,
+                 key: Optional[Union[bytes, bytearray]] = None,
+                 baud: int = 38400,
+                 realtime: bool = False,
+                 ss_version: str = "1.1",
+                 **fault_kwargs
+                 ):
+        assert ss_version in ("1.0", "1.1")
+        self._ack = ss_version == "1.1"
+        super().__init__(scope, key, baud, realtime, max_batch_len=64, **fault_kwargs)
+        pass
+
+    def _process(self) -> None:
+        while True:
+            end = self._rx.find(b'\n')
+            if end < 0:
+                return
+            line = bytes(self._rx[:end])
+            del self._rx[:end + 1]
+            if not line:
+                continue
+            cmd, body = line[0], line[1:]
+            if cmd not in self._commands:
+                self._respond_ack(SS_ERR_CMD)
+                continue
+            length, handler, flags = self._commands[cmd]
+            try:
+                if flags & CMD_FLAG_VARIABLE_LEN:  # "<cmd><2-digit hex length><hex payload>\n"
+                    max_len, length = length, int(body[:2].decode('latin-1'), 16)
+                    body = body[2:]
+                    if length > max_len:
+                        raise ValueError()
+                data = bytes.fromhex(body.decode('latin-1'))
+            except ValueError:
+                self._respond_ack(SS_ERR_LEN)
+                continue
+            if len(data) != length:
+                self._respond_ack(SS_ERR_LEN)
+                continue
+            err, resp = handler(data)
+            if resp is not None:
+                self._tx.extend(bytes((resp[0],)) + resp[1].hex().upper().encode('latin-1') + b'\n')
+            self._respond_ack(err)
+        pass
+
+    def _respond_ack(self, err: int) -> None:
+        if self._ack:
+            self._tx.extend(f"z{err:02X}\n".encode('latin-1'))
+        pass
+    pass
+
+
+class SimulatedSS2xTarget(_SimulatedTargetBase):
+    """
+    SimpleSerial v2 loopback target: COBS-framed [cmd, scmd, len, data..., crc] packets,
+    answered with [cmd, len, data..., crc] packets and an 'e' (error code) packet.
+    """
+    def __init__(self,
+                 scope,
+                 key: Optional[Union[bytes, bytearray]] = None,
+                 baud: int = 230400,
+                 realtime: bool = False,
+                 crc_poly: int = 0xA6,
+                 **fault_kwargs
+                 ):
+        self._crc_table = crc8_table(crc_poly)
+        super().__init__(scope, key, baud, realtime, max_batch_len=240, **fault_kwargs)
+        pass
+
+    def _send_packet(self, cmd: int, data: bytes) -> None:
+        body = bytes((cmd, len(data))) + data
+        self._tx.extend(cobs_stuff(body + bytes((crc8(body, self._crc_table),))))
+        pass
+
+    def _process(self) -> None:
+        while True:
+            end = self._rx.find(b'\x00')
+            if end < 0:
+                return
+            frame = bytes(self._rx[:end])
+            del self._rx[:end + 1]
+            if not frame:  # bare frame bytes are used to reset the communication
+                continue
+            packet = cobs_unstuff(frame)
+            if packet is None or len(packet) < 4:
+                self._send_packet(ord('e'), bytes((SS_ERR_FRAME_BYTE,)))
+                continue
+            cmd, scmd, length = packet[0], packet[1], packet[2]
+            data, crc = packet[3:-1], packet[-1]
+            if len(data) != length:
+                self._send_packet(ord('e'), bytes((SS_ERR_LEN,)))
+                continue
+            if crc8(packet[:-1], self._crc_table) != crc:
+                self._send_packet(ord('e'), bytes((SS_ERR_CRC,)))
+                continue
+            if cmd not in self._commands:
+                self._send_packet(ord('e'), bytes((SS_ERR_CMD,)))
+                continue
+            expected_len, handler, flags = self._commands[cmd]
+            if length > expected_len if flags & CMD_FLAG_VARIABLE_LEN else length != expected_len:
+                self._send_packet(ord('e'), bytes((SS_ERR_LEN,)))
+                continue
+            err, resp = handler(data)
+            if resp is not None:
+                self._send_packet(resp[0], resp[1])
+            self._send_packet(ord('e'), bytes((err,)))
+        pass
+    pass
@@ -1,9 +1,26 @@
 __all__ = ['SSTargetBase', 'SS1xTarget', 'SS2xTarget',
-           'SS1xTargetStandAlone', 'SS2xTargetStandAlone', 'programming_target']
+           'SS1xTargetStandAlone', 'SS2xTargetStandAlone', 'programming_target',
+           'RingBuffer', 'TranscriptWriter', 'read_transcript', 'replay_transcript']
 
-from .ss_target_base import SSTargetBase
-from .ss1x_target import SS1xTarget
-from .ss2x_target import SS2xTarget
-from .standalone import SS1xTargetStandAlone, SS2xTargetStandAlone
+from typing import TYPE_CHECKING
+from ..utils.lazy import lazy_exports
+
+# The function shadows its submodule's name, so it is bound eagerly (the module itself is light).
 from .programming_target import programming_target
 
+# Imported on first access (PEP 562), so `import cw_wrapper` stays cheap for headless workers.
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'SSTargetBase': '.ss_target_base',
+    'SS1xTarget': '.ss1x_target',
+    'SS2xTarget': '.ss2x_target',
+    'SS1xTargetStandAlone': '.standalone', 'SS2xTargetStandAlone': '.standalone',
+    'RingBuffer': '.transcript', 'TranscriptWriter': '.transcript',
+    'read_transcript': '.transcript', 'replay_transcript': '.transcript',
+})
+
+if TYPE_CHECKING:
+    from .ss_target_base import SSTargetBase
+    from .ss1x_target import SS1xTarget
+    from .ss2x_target import SS2xTarget
+    from .standalone import SS1xTargetStandAlone, SS2xTargetStandAlone
+    from .transcript import RingBuffer, TranscriptWriter, read_transcript, replay_transcript
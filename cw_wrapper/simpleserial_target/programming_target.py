@@ -1,5 +1,4 @@
 import os
-import chipwhisperer as cw
 
 
 def programming_target(scope,
@@ -11,6 +10,7 @@ def programming_target(scope,
     assert programmer_type.lower() in ('xmega', 'stm32f', 'avr')
     assert os.path.exists(dot_hex_path), "The .hex file does not exist."
     assert 7.37 <= round(scope.clock.clkgen_freq * 1e-6, 2) <= (8.01 if is_STM32F1 else 7.38)
+    import chipwhisperer as cw
     if programmer_type.lower() == "xmega":
         programmer = cw.programmers.XMEGAProgrammer
     elif programmer_type.lower() == "stm32f":
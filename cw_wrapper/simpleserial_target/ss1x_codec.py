@@ -0,0 +1,155 @@
+import numpy as np
+from typing import Union, Optional, Sequence, Tuple
+
+Payload = Union[bytes, bytearray, memoryview, np.ndarray, str, np.str_]
+
+# ASCII of the upper-case hex digits of every byte value, and the inverse (-1 for non-hex characters).
+_HEX_ENCODE = np.frombuffer(bytes(range(256)).hex().upper().encode('ascii'), dtype=np.uint8).reshape(256, 2)
+_HEX_DECODE = np.full(256, -1, dtype=np.int16)
+for _i, _c in enumerate(b"0123456789ABCDEF"):
+    _HEX_DECODE[_c] = _i
+for _i, _c in enumerate(b"abcdef"):
+    _HEX_DECODE[_c] = 10 + _i
+_NEWLINE = ord('\n')
+
+
+def to_bytes(payload: Optional[Payload]) -> bytes:
+    """
+    Normalizes a payload given as hex str, bytes-like object or uint8 ndarray to bytes.
+    """
+    if payload is None:
+        return b""
+    if isinstance(payload, (str, np.str_)):
+        return bytes.fromhex(payload.strip())
+    if isinstance(payload, np.ndarray):
+        assert payload.dtype == np.uint8, "ndarray payloads must be uint8."
+        return payload.tobytes()
+    return bytes(payload)
+
+
+class SS1xFrame:
+    """
+    Precomputed SimpleSerial v1.x frame for one command: "<cmd>[<len>]<HEX payload>\\n".
+    Only the hex part is rewritten when a frame is encoded.
+    """
+    def __init__(self,
+                 cmd: str,
+                 payload_len: int,
+                 variable_len_flag: bool = False
+                 ):
+        assert len(cmd) == 1, "The length of 'cmd' must be 1."
+        assert 0 <= payload_len <= 64
+        prefix = cmd.encode('latin-1')
+        if variable_len_flag:
+            prefix += format(payload_len, "02X").encode('ascii')
+        self.cmd = cmd
+        self.payload_len = payload_len
+        self._start = len(prefix)
+        self._buf = bytearray(prefix + b"0" * (2 * payload_len) + b"\n")
+        pass
+
+    def encode(self, payload: Optional[Payload]) -> bytes:
+        data = to_bytes(payload)
+        assert len(data) == self.payload_len, \
+            f"Payload length mismatch. (expected: {self.payload_len}, received: {len(data)})"
+        self._buf[self._start:self._start + 2 * self.payload_len] = data.hex().upper().encode('ascii')
+        return bytes(self._buf)
+
+    def encode_batch(self, payloads: np.ndarray) -> np.ndarray:
+        """
+        Encodes N payloads at once.
+
+        :param payloads: (N, payload_len) uint8 matrix
+        :return: (N, frame_len) uint8 matrix, one frame per row (`row.tobytes()` is ready to write)
+        """
+        payloads = np.asarray(payloads, dtype=np.uint8)
+        assert payloads.ndim == 2 and payloads.shape[1] == self.payload_len
+        frames = np.empty(shape=(payloads.shape[0], len(self._buf)), dtype=np.uint8)
+        frames[:] = np.frombuffer(bytes(self._buf), dtype=np.uint8)
+        frames[:, self._start:self._start + 2 * self.payload_len] = \
+            _HEX_ENCODE[payloads].reshape(payloads.shape[0], 2 * self.payload_len)
+        return frames
+    pass
+
+
+def encode_frame(cmd: str,
+                 payload: Optional[Payload],
+                 variable_len_flag: bool = False
+                 ) -> bytes:
+    data = to_bytes(payload)
+    return SS1xFrame(cmd, len(data), variable_len_flag).encode(data)
+
+
+def decode_response(buf: Union[str, bytes],
+                    cmd: str,
+                    payload_len: int
+                    ) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Validates and decodes a "<cmd><HEX payload>\\n" response.
+
+    :return: (payload, None) on success, (None, reason) otherwise
+    """
+    if isinstance(buf, str):
+        buf = buf.encode('latin-1')
+    if len(buf) != 2 * payload_len + 2 or buf[-1] != _NEWLINE:
+        return None, "format"
+    if buf[0] != ord(cmd):
+        return None, "cmd"
+    body = buf[1:-1]
+    try:
+        payload = bytes.fromhex(body.decode('ascii'))
+    except (ValueError, UnicodeDecodeError):
+        return None, "hex"
+    # bytes.fromhex() skips whitespace, which must not be accepted inside a frame.
+    if len(payload) != payload_len:
+        return None, "hex"
+    return payload, None
+
+
+def decode_responses(responses: Union[Sequence[Union[str, bytes]], np.ndarray],
+                     cmd: str,
+                     payload_len: int
+                     ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decodes N responses in one vectorized pass.
+
+    :param responses: N response frames (str/bytes, or an (N, 2 * payload_len + 2) uint8 matrix)
+    :return: ((N, payload_len) uint8 matrix, (N,) bool validity mask). Invalid rows are zero
+    """
+    frame_len = 2 * payload_len + 2
+    if isinstance(responses, np.ndarray):
+        frames = responses.astype(np.uint8, copy=False)
+        valid = np.ones(frames.shape[0], dtype=bool)
+    else:
+        n = len(responses)
+        frames = np.zeros(shape=(n, frame_len), dtype=np.uint8)
+        valid = np.zeros(n, dtype=bool)
+        for i, x in enumerate(responses):
+            if x is None:
+                continue
+            if isinstance(x, str):
+                x = x.encode('latin-1')
+            if len(x) == frame_len:
+                frames[i] = np.frombuffer(x, dtype=np.uint8)
+                valid[i] = True
+    assert frames.ndim == 2 and frames.shape[1] == frame_len
+    nibbles = _HEX_DECODE[frames[:, 1:-1]]
+    valid &= (frames[:, 0] == ord(cmd)) & (frames[:, -1] == _NEWLINE) & (nibbles >= 0).all(axis=1)
+    nibbles = nibbles.astype(np.uint8)  # -1 wraps around, but those rows are zeroed below
+    payloads = (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+    payloads[~valid] = 0
+    return payloads, valid
+
+
+def parse_ack(buf: Union[str, bytes]) -> Optional[int]:
+    """
+    :return: Error code of a "z<HEX code>\\n" ack packet, or None if the packet is malformed
+    """
+    if isinstance(buf, str):
+        buf = buf.encode('latin-1')
+    if len(buf) < 4 or buf[0] != ord('z') or buf[-1] != _NEWLINE:
+        return None
+    hi, lo = _HEX_DECODE[buf[1]], _HEX_DECODE[buf[2]]
+    if hi < 0 or lo < 0:
+        return None
+    return int(hi) << 4 | int(lo)
@@ -1,89 +1,146 @@
-import sys
 import numpy as np
-import binascii
-from typing import Union, Optional
+from typing import Union, Optional, List, Tuple
 from .ss_target_base import SSTargetBase
+from .ss1x_codec import Payload, SS1xFrame, decode_response, decode_responses, parse_ack
+from ..utils import tracing
 
 
 class SS1xTarget(SSTargetBase):
     """
     ChipWhisperer SimpleSerial v1.1 target
     """
-    def ss_wait_ack(self, timeout: int = 500) -> bool:
-        ack_payload = self._serial_raw_read(4)
+    def __init__(self, scope, target):
+        super().__init__(scope, target)
+        self._frames = {}
+        pass
+
+    def _get_frame(self,
+                   cmd: str,
+                   payload_len: int,
+                   variable_len_flag: bool = False
+                   ) -> SS1xFrame:
+        key = (cmd, payload_len, variable_len_flag)
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = self._frames[key] = SS1xFrame(cmd, payload_len, variable_len_flag)
+        return frame
+
+    def _wait_ack(self, timeout: int) -> bool:
+        ack_payload = self._serial_raw_read(4, timeout=timeout)
         if ack_payload is None:
-            print(f"[SS_ACK] Target did not ack.", file=sys.stderr)
-            return False
-        if ack_payload[0] != 'z' or not ack_payload.endswith("\n") or len(ack_payload) < 4:
-            print(f"[SS_ACK] Invalid ACK packet format detected. "
-                  f"(received: " + ack_payload.replace("\n", "\\n") + ")", file=sys.stderr)
+            tracing.warn("ack.missing", f"[SS_ACK] Target did not ack.")
             return False
-        try:
-            ret = int(ack_payload[1:3], 16)
-        except ValueError:
-            print(f"[SS_ACK] Invalid ACK packet format detected. "
-                  f"(received: " + ack_payload.replace("\n", "\\n") + ")", file=sys.stderr)
+        ret = parse_ack(ack_payload)
+        if ret is None:
+            tracing.warn("ack.format", f"[SS_ACK] Invalid ACK packet format detected. "
+                                       f"(received: " + ack_payload.replace("\n", "\\n") + ")")
             return False
         if ret != 0:
-            print(f"[SS_ACK] The error code was passed through an ACK packet. (0x{ret:02X})", file=sys.stderr)
+            tracing.warn("ack.error", f"[SS_ACK] The error code was passed through an ACK packet. (0x{ret:02X})",
+                         {"code": ret})
             return False
         return True
 
     def ss_write(self,
                  cmd: str,
                  payload_len: int,
-                 payload: Optional[Union[bytearray, str, np.str_]],
+                 payload: Optional[Payload],
                  following_ack: bool = True,
                  variable_len_flag: bool = False,
                  timeout: int = 500
                  ) -> bool:
-        assert len(cmd) == 1, "The length of 'cmd' must be 1."
-        assert 0 <= payload_len <= 64
-        if payload is None:
-            payload = bytearray()
-        if type(payload) is not bytearray:
-            payload = bytearray.fromhex(payload.strip())
-        encoded_payload = binascii.hexlify(payload).decode().upper()
-        assert len(encoded_payload) == payload_len * 2
-        if variable_len_flag:
-            cmd += format(payload_len, "02X")
-        cmd += encoded_payload + "\n"
-        if self._serial_raw_write(cmd) is False:
+        """
+        :param payload: hex str, bytes, bytearray, memoryview or uint8 ndarray
+        """
+        frame = self._get_frame(cmd, payload_len, variable_len_flag).encode(payload)
+        return self.ss_write_frame(frame, following_ack, timeout)
+
+    def ss_write_frame(self,
+                       frame: bytes,
+                       following_ack: bool = True,
+                       timeout: int = 500
+                       ) -> bool:
+        """
+        Writes a frame which was already encoded (e.g. by `encode_batch`).
+        """
+        if self._serial_raw_write(frame) is False:
             return False
         if following_ack:
             if self.ss_wait_ack(timeout) is False:
                 return False
         return True
 
+    def encode_batch(self,
+                     cmd: str,
+                     payloads: np.ndarray,
+                     variable_len_flag: bool = False
+                     ) -> List[bytes]:
+        """
+        Encodes the rows of an (N, payload_len) uint8 matrix into N frames for `ss_write_frame`.
+        """
+        frames = self._get_frame(cmd, payloads.shape[1], variable_len_flag).encode_batch(payloads)
+        return [row.tobytes() for row in frames]
+
+    def decode_batch(self,
+                     cmd: str,
+                     payload_len: int,
+                     responses: Union[List[Union[str, bytes]], np.ndarray]
+                     ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decodes N raw responses into an (N, payload_len) uint8 matrix and an (N,) validity mask.
+        """
+        return decode_responses(responses, cmd, payload_len)
+
+    def _ss_read_frame(self,
+                       cmd: str,
+                       payload_len: int,
+                       following_ack: bool,
+                       timeout: int
+                       ) -> Tuple[Optional[str], Optional[bytes]]:
+        assert len(cmd) == 1, "The length of 'cmd' must be 1."
+        assert 1 <= payload_len <= 64
+        buf = self._serial_raw_read(payload_len * 2 + 1 + 1, timeout=timeout)
+        if buf is None:
+            return None, None
+        payload, reason = decode_response(buf, cmd, payload_len)
+        if reason == "format":
+            tracing.warn("read.format", f"[SS_READ] Invalid SimpleSerial response packet format detected. "
+                                        f"(received: " + buf.replace("\n", "\\n") + ")")
+            return None, None
+        if reason == "cmd":
+            tracing.warn("read.cmd", f"[SS_READ] Unexpected response command detected. "
+                                     f"(expected: '{cmd}', received: '{buf[0]}')")
+            return None, None
+        if reason == "hex":
+            tracing.warn("read.hex", f"[SS_READ] Invalid hexadecimal str was detected in the SimpleSerial "
+                                     f"response packet.")
+            return None, None
+        if following_ack:
+            if not self.ss_wait_ack(timeout):
+                tracing.warn("read.no_ack", f"[SS_READ] Response '{buf}' received. But target did not ack.")
+                return None, None
+        return buf, payload
+
     def ss_read(self,
                 cmd: str,
                 payload_len: int,
                 following_ack: bool = True,
                 timeout: int = 500
                 ) -> Optional[str]:
-        assert len(cmd) == 1, "The length of 'cmd' must be 1."
-        assert 1 <= payload_len <= 64
-        buf = self._serial_raw_read(payload_len * 2 + 1 + 1)
+        buf, _ = self._ss_read_frame(cmd, payload_len, following_ack, timeout)
         if buf is None:
             return None
-        if not buf.endswith("\n"):
-            print(f"[SS_READ] Invalid SimpleSerial response packet format detected. "
-                  f"(received: " + buf.replace("\n", "\\n") + ")", file=sys.stderr)
-            return None
-        if buf[0] != cmd:
-            print(f"[SS_READ] Unexpected response command detected. "
-                  f"(expected: '{cmd}', received: '{buf[0]}')", file=sys.stderr)
-            return None
-        try:
-            for i in range(1, payload_len * 2 + 1, 2):
-                _ = int(buf[i:i+2], 16)
-        except ValueError:
-            print(f"[SS_READ] Invalid hexadecimal str was detected in the SimpleSerial response packet.",
-                  file=sys.stderr)
-            return None
-        if following_ack:
-            if not self.ss_wait_ack(timeout):
-                print(f"[SS_READ] Response '{buf}' received. But target did not ack.", file=sys.stderr)
-                return None
         return buf[1:2 * payload_len + 1]
+
+    def ss_read_bytes(self,
+                      cmd: str,
+                      payload_len: int,
+                      following_ack: bool = True,
+                      timeout: int = 500
+                      ) -> Optional[bytes]:
+        """
+        Same as `ss_read`, but returns the decoded payload.
+        """
+        _, payload = self._ss_read_frame(cmd, payload_len, following_ack, timeout)
+        return payload
     pass
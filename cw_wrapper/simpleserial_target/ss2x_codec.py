@@ -0,0 +1,171 @@
+import numpy as np
+from functools import lru_cache
+from typing import Union, Optional, Tuple, List
+from .ss1x_codec import Payload, to_bytes
+
+FRAME_BYTE = 0x00
+
+# Error codes carried by the 'e' (ack) packet
+SS2_ERR_NAMES = {
+    0x00: "No error",
+    0x01: "Invalid command",
+    0x02: "Bad CRC",
+    0x03: "Read timed out",
+    0x04: "Invalid frame length",
+    0x05: "Frame byte in expected spot",
+}
+
+
+@lru_cache(maxsize=None)
+def crc8_table(crc_poly: int = 0xA6) -> Tuple[int, ...]:
+    """
+    :param crc_poly: CRC-8 polynomial in Koopman notation (0xA6 is the SimpleSerial v2 default)
+    :return: 256-entry lookup table for `crc8`
+    """
+    assert 0x01 <= crc_poly <= 0xFF
+    poly = ((crc_poly << 1) | 1) & 0xFF  # Koopman notation -> normal notation (0xA6 -> 0x4D)
+    table = []
+    for b in range(256):
+        crc = b
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return tuple(table)
+
+
+def crc8(buf: Union[bytes, bytearray, memoryview],
+         table: Tuple[int, ...],
+         crc: int = 0x00
+         ) -> int:
+    for b in buf:
+        crc = table[crc ^ b]
+    return crc
+
+
+def cobs_stuff(body: Union[bytes, bytearray]) -> bytes:
+    """
+    Frames `body` as SimpleSerial v2 does: an overhead byte, `body` with every 0x00 replaced by the distance
+    to the next 0x00, and a terminating 0x00. `body` must be shorter than 254 bytes.
+    """
+    assert len(body) < 254
+    buf = bytearray(len(body) + 2)
+    buf[1:-1] = body
+    last = 0
+    i = buf.find(FRAME_BYTE, 1)
+    while i >= 0:
+        buf[last] = i - last
+        last = i
+        i = buf.find(FRAME_BYTE, i + 1)
+    return bytes(buf)
+
+
+def cobs_unstuff(frame: Union[bytes, bytearray]) -> Optional[bytes]:
+    """
+    :param frame: Stuffed frame, with or without its terminating 0x00
+    :return: The original body, or None if the frame is corrupted
+    """
+    if frame and frame[-1] == FRAME_BYTE:
+        frame = frame[:-1]
+    buf = bytearray(frame)
+    n = buf[0] if buf else 0
+    while 0 < n < len(buf):
+        step = buf[n]
+        if step == 0:
+            return None
+        buf[n] = FRAME_BYTE
+        n += step
+    if n != len(buf):
+        return None
+    return bytes(buf[1:])
+
+
+class SS2xFrame:
+    """
+    Precomputed SimpleSerial v2 command frame: COBS([cmd, scmd, len, data..., crc]) + 0x00.
+    The CRC of the fixed header is computed once.
+    """
+    def __init__(self,
+                 cmd: Union[str, int],
+                 scmd: int,
+                 payload_len: int,
+                 crc_poly: int = 0xA6
+                 ):
+        if isinstance(cmd, str):
+            assert len(cmd) == 1, "The length of 'cmd' must be 1."
+            cmd = ord(cmd)
+        assert 0 <= cmd <= 0xFF and 0 <= scmd <= 0xFF
+        assert 0 <= payload_len <= 249
+        self.cmd = cmd
+        self.scmd = scmd
+        self.payload_len = payload_len
+        self._table = crc8_table(crc_poly)
+        self._header = bytes((cmd, scmd, payload_len))
+        self._header_crc = crc8(self._header, self._table)
+        pass
+
+    def encode(self, payload: Optional[Payload]) -> bytes:
+        data = to_bytes(payload)
+        assert len(data) == self.payload_len, \
+            f"Payload length mismatch. (expected: {self.payload_len}, received: {len(data)})"
+        crc = crc8(data, self._table, self._header_crc)
+        return cobs_stuff(self._header + data + bytes((crc,)))
+
+    def encode_batch(self, payloads: np.ndarray) -> List[bytes]:
+        payloads = np.asarray(payloads, dtype=np.uint8)
+        assert payloads.ndim == 2 and payloads.shape[1] == self.payload_len
+        return [self.encode(row.tobytes()) for row in payloads]
+    pass
+
+
+def packet_len(payload_len: int) -> int:
+    """
+    :return: Length on the wire of a response packet carrying `payload_len` bytes
+    """
+    return payload_len + 5  # overhead byte, cmd, len, data, crc, frame byte
+
+
+def decode_packet(frame: Union[str, bytes],
+                  table: Tuple[int, ...]
+                  ) -> Tuple[Optional[int], Optional[bytes], Optional[str]]:
+    """
+    Decodes a [cmd, len, data..., crc] response packet.
+
+    :return: (cmd, data, None) on success, (None, None, reason) otherwise
+    """
+    if isinstance(frame, str):
+        frame = frame.encode('latin-1')
+    if len(frame) < 5 or frame[-1] != FRAME_BYTE:
+        return None, None, "frame"
+    packet = cobs_unstuff(frame)
+    if packet is None:
+        return None, None, "frame"
+    if packet[1] != len(packet) - 3:
+        return None, None, "len"
+    if crc8(packet[:-1], table) != packet[-1]:
+        return None, None, "crc"
+    return packet[0], packet[2:-1], None
+
+
+def decode_packets(frames: List[Optional[Union[str, bytes]]],
+                   cmd: Union[str, int],
+                   payload_len: int,
+                   crc_poly: int = 0xA6
+                   ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decodes N response packets of `cmd`.
+
+    :return: ((N, payload_len) uint8 matrix, (N,) bool validity mask). Invalid rows are zero
+    """
+    if isinstance(cmd, str):
+        cmd = ord(cmd)
+    table = crc8_table(crc_poly)
+    payloads = np.zeros(shape=(len(frames), payload_len), dtype=np.uint8)
+    valid = np.zeros(len(frames), dtype=bool)
+    for i, frame in enumerate(frames):
+        if frame is None:
+            continue
+        c, data, _ = decode_packet(frame, table)
+        if c == cmd and len(data) == payload_len:
+            payloads[i] = np.frombuffer(data, dtype=np.uint8)
+            valid[i] = True
+    return payloads, valid
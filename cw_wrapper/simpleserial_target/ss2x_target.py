@@ -1,7 +1,10 @@
 import binascii
 import numpy as np
-from typing import Union, Optional
+from typing import Union, Optional, List, Tuple
 from .ss_target_base import SSTargetBase
+from .ss1x_codec import Payload
+from .ss2x_codec import SS2xFrame, SS2_ERR_NAMES, crc8_table, decode_packet, decode_packets, packet_len
+from ..utils import tracing
 
 
 class SS2xTarget(SSTargetBase):
@@ -11,7 +14,10 @@ class SS2xTarget(SSTargetBase):
     def __init__(self, scope, target):
         super().__init__(scope, target)
         self._crc_poly = 0xA6
+        self._crc_table = crc8_table(self._crc_poly)
+        self._frames = {}
         self._default_baud = 230400
+        self.last_error: Optional[int] = None  # code of the last error ('e') packet the target sent
         pass
 
     def print_simpleserial_commsnds(self) -> None:
@@ -23,22 +29,142 @@ class SS2xTarget(SSTargetBase):
     def set_crc_poly(self, crc_poly: int = 0xA6):
         assert 0x01 <= crc_poly <= 0xFF
         self._crc_poly = crc_poly
+        self._crc_table = crc8_table(crc_poly)
+        self._frames = {}
         pass
 
-    def ss_wait_ack(self, timeout: int = 500) -> bool:
-        raise NotImplementedError()
-        pass
+    def _get_frame(self,
+                   cmd: Union[str, int],
+                   scmd: int,
+                   payload_len: int
+                   ) -> SS2xFrame:
+        key = (cmd, scmd, payload_len)
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = self._frames[key] = SS2xFrame(cmd, scmd, payload_len, self._crc_poly)
+        return frame
+
+    def _read_packet(self,
+                     payload_len: int,
+                     timeout: int
+                     ) -> Tuple[Optional[int], Optional[bytes], Optional[str]]:
+        # An error packet ('e' with a 1-byte code) is shorter than most responses. The first packet_len(1) bytes
+        # are read first: if they end with the frame byte the packet is complete, so an error is decoded right
+        # away instead of costing a timeout (and staying in the receive buffer).
+        total_len = packet_len(payload_len)
+        head_len = min(packet_len(1), total_len)
+        buf = self._serial_raw_read(head_len, timeout=timeout)
+        if buf is not None and head_len < total_len and buf[-1] != '\x00':
+            rest = self._serial_raw_read(total_len - head_len, timeout=timeout)
+            buf = None if rest is None else buf + rest
+        if buf is None:
+            return None, None, None
+        cmd, data, reason = decode_packet(buf, self._crc_table)
+        if reason is not None:
+            tracing.warn("read.packet", f"[SS2_READ] Invalid SimpleSerial v2 packet detected ({reason}). "
+                                        f"(received: {buf.encode('latin-1').hex().upper()})", {"reason": reason})
+        return cmd, data, reason
+
+    def _wait_ack(self, timeout: int) -> bool:
+        cmd, data, reason = self._read_packet(1, timeout)
+        if cmd is None:
+            if reason is None:
+                tracing.warn("ack.missing", f"[SS_ACK] Target did not ack.")
+            return False
+        if cmd != ord('e') or len(data) != 1:
+            tracing.warn("ack.format", f"[SS_ACK] Invalid ACK packet format detected. "
+                                       f"(cmd: 0x{cmd:02X}, len: {len(data)})")
+            return False
+        if data[0] != 0:
+            self.last_error = data[0]
+            tracing.warn("ack.error", f"[SS_ACK] The error code was passed through an ACK packet. "
+                                      f"(0x{data[0]:02X}: {SS2_ERR_NAMES.get(data[0], 'Unknown error')})",
+                         {"code": data[0]})
+            return False
+        return True
 
     def ss_write(self,
                  cmd: Union[str, int],
                  scmd: int,
                  payload_len: int,
-                 payload: Optional[Union[bytearray, str, np.str_]],
+                 payload: Optional[Payload],
                  following_ack: bool = True,
                  timeout: int = 500
                  ) -> bool:
-        raise NotImplementedError()
-        pass
+        """
+        :param payload: hex str, bytes, bytearray, memoryview or uint8 ndarray
+        """
+        frame = self._get_frame(cmd, scmd, payload_len).encode(payload)
+        return self.ss_write_frame(frame, following_ack, timeout)
+
+    def ss_write_frame(self,
+                       frame: bytes,
+                       following_ack: bool = True,
+                       timeout: int = 500
+                       ) -> bool:
+        """
+        Writes a frame which was already encoded (e.g. by `encode_batch`).
+        """
+        if self._serial_raw_write(frame) is False:
+            return False
+        if following_ack:
+            if self.ss_wait_ack(timeout) is False:
+                return False
+        return True
+
+    def encode_batch(self,
+                     cmd: Union[str, int],
+                     payloads: np.ndarray,
+                     scmd: int = 0
+                     ) -> List[bytes]:
+        """
+        Encodes the rows of an (N, payload_len) uint8 matrix into N frames for `ss_write_frame`.
+        """
+        return self._get_frame(cmd, scmd, payloads.shape[1]).encode_batch(payloads)
+
+    def decode_batch(self,
+                     cmd: Union[str, int],
+                     payload_len: int,
+                     responses: List[Union[str, bytes]]
+                     ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decodes N raw response packets into an (N, payload_len) uint8 matrix and an (N,) validity mask.
+        """
+        return decode_packets(responses, cmd, payload_len, self._crc_poly)
+
+    def ss_read_bytes(self,
+                      cmd: Union[str, int],
+                      payload_len: int,
+                      following_ack: bool = True,
+                      timeout: int = 500
+                      ) -> Optional[bytes]:
+        if isinstance(cmd, str):
+            assert len(cmd) == 1, "The length of 'cmd' must be 1."
+            cmd = ord(cmd)
+        assert 1 <= payload_len <= 249
+        recv_cmd, data, reason = self._read_packet(payload_len, timeout)
+        if recv_cmd is None:
+            return None
+        if recv_cmd != cmd:
+            if recv_cmd == ord('e') and len(data) == 1:
+                self.last_error = data[0]
+                tracing.warn("read.target_error", f"[SS_READ] The target reported an error instead of a response. "
+                                                  f"(0x{data[0]:02X}: {SS2_ERR_NAMES.get(data[0], 'Unknown error')})",
+                             {"code": data[0]})
+            else:
+                tracing.warn("read.cmd", f"[SS_READ] Unexpected response command detected. "
+                                         f"(expected: 0x{cmd:02X}, received: 0x{recv_cmd:02X})")
+            return None
+        if len(data) != payload_len:
+            tracing.warn("read.length", f"[SS_READ] Unexpected payload length. "
+                                        f"(expected: {payload_len}, received: {len(data)})")
+            return None
+        if following_ack:
+            if not self.ss_wait_ack(timeout):
+                tracing.warn("read.no_ack", f"[SS_READ] Response '{data.hex().upper()}' received. "
+                                            f"But target did not ack.")
+                return None
+        return data
 
     def ss_read(self,
                 cmd: Union[str, int],
@@ -46,6 +172,11 @@ class SS2xTarget(SSTargetBase):
                 following_ack: bool = True,
                 timeout: int = 500
                 ) -> Optional[str]:
-        raise NotImplementedError()
-        pass
+        """
+        :return: Payload as an upper-case hex str (like `SS1xTarget.ss_read`)
+        """
+        data = self.ss_read_bytes(cmd, payload_len, following_ack, timeout)
+        if data is None:
+            return None
+        return data.hex().upper()
     pass
@@ -1,18 +1,43 @@
-import sys
 import time
-import chipwhisperer as cw
-from typing import Union, Optional
-from chipwhisperer.capture import scopes
+from typing import Union, Optional, TYPE_CHECKING
+from .transcript import RingBuffer, TranscriptWriter, TX, RX
+from ..utils import tracing
+
+if TYPE_CHECKING:  # chipwhisperer is only needed by the "chipwhisperer" backend, which imports it on connect
+    import chipwhisperer as cw
 
 
 class SSTargetBase:
-    def __init__(self, scope, target):
-        self._scope: cw.capture.scopes.OpenADC = scope
-        self._target: Union[cw.targets.SimpleSerial, cw.targets.SimpleSerial2] = target
-        self.rx_history = list()
-        self.tx_history = list()
-        self.__history_size = 10
+    def __init__(self, scope, target, history_size: int = 10):
+        self._scope: "cw.capture.scopes.OpenADC" = scope
+        self._target: "Union[cw.targets.SimpleSerial, cw.targets.SimpleSerial2]" = target
+        self.rx_history = RingBuffer(history_size)  # newest first
+        self.tx_history = RingBuffer(history_size)
+        self._transcript: Optional[TranscriptWriter] = None
         self._default_baud = 38400
+        # Tunable timing of the target (see `ClockTuner`); used when the methods below get None.
+        self.baud_multiplier = 1.0
+        self.reset_duration = 0.5
+        self.ready_delay = 0.1
+        pass
+
+    def set_history_size(self, size: int) -> None:
+        self.rx_history.resize(size)
+        self.tx_history.resize(size)
+        pass
+
+    def start_transcript(self, path: str) -> None:
+        """
+        Records every tx/rx frame with a timestamp to a binary file (see `read_transcript` / `replay_transcript`).
+        """
+        self.stop_transcript()
+        self._transcript = TranscriptWriter(path)
+        pass
+
+    def stop_transcript(self) -> None:
+        if self._transcript is not None:
+            self._transcript.close()
+            self._transcript = None
         pass
 
     def print_simpleserial_commsnds(self) -> None:
@@ -28,97 +53,126 @@ class SSTargetBase:
         return {"rx": self._target.in_waiting(), "tx": self._target.in_waiting_tx()}
 
     def _update_rx_history(self, x: str) -> None:
-        if len(self.rx_history) >= self.__history_size:
-            self.rx_history.pop(-1)
-        self.rx_history.insert(0, x)
+        self.rx_history.append(x)
+        if self._transcript is not None:
+            self._transcript.write(RX, x)
         pass
 
-    def _update_tx_history(self, x: str) -> None:
-        if len(self.tx_history) >= self.__history_size:
-            self.tx_history.pop(-1)
-        self.tx_history.insert(0, x)
+    def _update_tx_history(self, x: Union[str, bytes]) -> None:
+        self.tx_history.append(x)
+        if self._transcript is not None:
+            self._transcript.write(TX, x)
         pass
 
     def reset_via_UFO_nRST(self,
-                           duration: float = 0.5,
-                           wait_for_ready: float = 0.1
+                           duration: Optional[float] = None,
+                           wait_for_ready: Optional[float] = None
                            ) -> None:
         """
         This method is used to reset the UFO target board mounted on the CW308 via nRST pin.
         When using nRST pin, unlike using VCC pin, the power supplied to the CW308 is maintained
         and only the power supply of the UFO target board is cut off.
 
-        :param duration: Power-down period
-        :param wait_for_ready: Time to wait for target to be ready after reset
+        :param duration: Power-down period (`reset_duration` if None)
+        :param wait_for_ready: Time to wait for target to be ready after reset (`ready_delay` if None)
         :return: None
         """
+        duration = self.reset_duration if duration is None else duration
+        wait_for_ready = self.ready_delay if wait_for_ready is None else wait_for_ready
         assert 0.05 <= duration <= 10
         assert 0 <= wait_for_ready <= 10
+        tracer = tracing.active
+        started = tracing.now() if tracer is not None else 0
         self._scope.advancedSettings.cwEXTRA.setGPIOStatenrst(0)
         time.sleep(duration)
         self._scope.advancedSettings.cwEXTRA.setGPIOStatenrst(None)
         if wait_for_ready > 0:
             time.sleep(wait_for_ready)
+        if tracer is not None:
+            tracer.span("reset", started, {"method": "nRST", "duration": duration, "wait_for_ready": wait_for_ready})
         pass
 
     def reset_via_VCC(self,
-                      duration: float = 0.5,
-                      wait_for_ready: float = 0.1
+                      duration: Optional[float] = None,
+                      wait_for_ready: Optional[float] = None
                       ) -> None:
         """
         This method is used to reset the target board via VCC pin.
         When using VCC pin, unlike using nRST pin, the power supplied from the capture board
         to the target board is cut off.
 
-        :param duration: Power-down period
-        :param wait_for_ready: Time to wait for target to be ready after reset
+        :param duration: Power-down period (`reset_duration` if None)
+        :param wait_for_ready: Time to wait for target to be ready after reset (`ready_delay` if None)
         :return: None
         """
+        duration = self.reset_duration if duration is None else duration
+        wait_for_ready = self.ready_delay if wait_for_ready is None else wait_for_ready
         assert 0.05 <= duration <= 10
         assert 0 <= wait_for_ready <= 10
+        tracer = tracing.active
+        started = tracing.now() if tracer is not None else 0
         self._scope.advancedSettings.cwEXTRA.setTargetPowerState(False)
         time.sleep(duration)
         self._scope.advancedSettings.cwEXTRA.setTargetPowerState(True)
         if wait_for_ready > 0:
             time.sleep(wait_for_ready)
+        if tracer is not None:
+            tracer.span("reset", started, {"method": "VCC", "duration": duration, "wait_for_ready": wait_for_ready})
         pass
 
     def set_clock_freq(self,
                        freq: int = 7.37e6,
-                       wait_for_ready: float = 0.1,
+                       wait_for_ready: Optional[float] = None,
                        verbose: bool = True
                        ) -> None:
+        """
+        Sets the target clock and scales the baud rate with it (`baud_multiplier` times the default baud
+        at 7.37MHz), then resets the target.
+        """
         assert 3.2e6 <= freq <= 25.0e6
         self._scope.clock.clkgen_freq = freq
-        self._target.baud = round(self._default_baud * (freq / 7.37e6))
+        self._target.baud = round(self._default_baud * self.baud_multiplier * (freq / 7.37e6))
         self.reset_via_VCC(wait_for_ready=wait_for_ready)
         if verbose:
             print(f"Adjusted clock frequency: {int(self._scope.clock.clkgen_freq) * 1e-6:.4f}MHz")
         pass
 
     def flush_recv_buf(self, verbose: bool = True):
+        tracer = tracing.active
+        started = tracing.now() if tracer is not None else 0
         in_wait_len = self._target.in_waiting()
         self._target.flush()
+        if tracer is not None:
+            tracer.span("flush", started)
         if verbose and in_wait_len > 0:
-            print(f"[FLUSH] Non-empty receive buffer was forcibly flushed. (length: {in_wait_len})", file=sys.stderr)
+            tracing.warn("flush.discarded", f"[FLUSH] Non-empty receive buffer was forcibly flushed. "
+                                            f"(length: {in_wait_len})", {"length": in_wait_len})
         pass
 
     def _serial_raw_write(self,
-                          data: str,
+                          data: Union[str, bytes, bytearray],
                           flush: bool = True
                           ) -> bool:
-        if not data.endswith("\n"):
+        # A str is a SimpleSerial 1.x line and gets its "\n" appended. bytes are written as complete frames.
+        if isinstance(data, str) and not data.endswith("\n"):
             data = data + "\n"
+        tracer = tracing.active
+        started = tracing.now() if tracer is not None else 0
         try:
             if flush:
                 in_wait_len = self._target.in_waiting()
                 self.flush_recv_buf(verbose=False)
                 if in_wait_len > 0:
-                    print(f"[RAW SERIAL WRITE] Non-empty receive buffer was forcibly flushed. "
-                          f"(length: {in_wait_len})", file=sys.stderr)
+                    tracing.warn("serial_write.flushed", f"[RAW SERIAL WRITE] Non-empty receive buffer was forcibly "
+                                                         f"flushed. (length: {in_wait_len})", {"length": in_wait_len})
             self._target.write(data)
         except:
+            if tracer is not None:
+                tracer.span("serial_write", started)
+                tracer.event("serial_write.error")
             return False
+        if tracer is not None:
+            tracer.span("serial_write", started)
         self._update_tx_history(data)
         return True
 
@@ -127,14 +181,21 @@ class SSTargetBase:
                          print_warning_msg: bool = True,
                          timeout: int = 500
                          ) -> Optional[str]:
-        payload = self._target.read(payload_len, timeout)
+        tracer = tracing.active
+        if tracer is None:
+            payload = self._target.read(payload_len, timeout)
+        else:
+            started = tracing.now()
+            payload = self._target.read(payload_len, timeout)
+            tracer.span("serial_read", started)
         if payload == "":
-            if print_warning_msg:
-                print("[RAW SERIAL READ] There is no data to receive from Target.", file=sys.stderr)
+            tracing.warn("serial_read.empty", "[RAW SERIAL READ] There is no data to receive from Target.",
+                         {"timeout_ms": timeout}, echo=print_warning_msg)
             return None
         if len(payload) < payload_len and print_warning_msg:
-            print(f"[RAW SERIAL READ] The data read from the target is less than expected. "
-                  f"(expected: {payload_len}, received: {len(payload)})", file=sys.stderr)
+            tracing.warn("serial_read.short", f"[RAW SERIAL READ] The data read from the target is less than "
+                                              f"expected. (expected: {payload_len}, received: {len(payload)})",
+                         {"expected": payload_len, "received": len(payload)})
             self._update_rx_history(payload)
             return None
         self._update_rx_history(payload)
@@ -142,7 +203,18 @@ class SSTargetBase:
 
     def ss_wait_ack(self,
                     timeout: int = 500
-                    ):
+                    ) -> bool:
+        tracer = tracing.active
+        if tracer is None:
+            return self._wait_ack(timeout)
+        started = tracing.now()
+        ret = self._wait_ack(timeout)
+        tracer.span("wait_ack", started)
+        return ret
+
+    def _wait_ack(self,
+                  timeout: int
+                  ) -> bool:
         raise NotImplementedError()
         pass
 
@@ -1,18 +1,27 @@
-import chipwhisperer as cw
 from ..ss_target_base import SSTargetBase
 from ..ss1x_target import SS1xTarget
 from ..ss2x_target import SS2xTarget
 from ..programming_target import programming_target
+from ...utils.backend import open_backend
 
 
 class SSTargetStandAlone(SSTargetBase):
+    _ss_version = "1.1"
+
     def __init__(self):
         super().__init__(None, None)
         pass
 
-    def connect(self) -> None:
-        self._scope = cw.scope(scope_type=cw.scopes.OpenADC)
-        self._scope.default_setup()
+    def connect(self,
+                backend: str = "chipwhisperer",
+                **backend_kwargs
+                ) -> None:
+        """
+        :param backend: "chipwhisperer" (hardware), "sim" (simulated scope and target) or any registered backend
+        :param backend_kwargs: Backend-specific options
+        :return: None
+        """
+        self._scope, self._target = open_backend(backend, self._ss_version, **backend_kwargs)
         pass
 
     def disconnect(self) -> None:
@@ -35,16 +44,10 @@ class SSTargetStandAlone(SSTargetBase):
 
 
 class SS1xTargetStandAlone(SSTargetStandAlone, SS1xTarget):
-    def connect(self) -> None:
-        super().connect()
-        self._target = cw.target(self._scope, target_type=cw.targets.SimpleSerial)
-        pass
+    _ss_version = "1.1"
     pass
 
 
 class SS2xTargetStandAlone(SSTargetStandAlone, SS2xTarget):
-    def connect(self) -> None:
-        super().connect()
-        self._target = cw.target(self._scope, target_type=cw.targets.SimpleSerial2)
-        pass
+    _ss_version = "2.0"
     pass
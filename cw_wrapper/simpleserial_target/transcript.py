@@ -0,0 +1,185 @@
+import time
+import struct
+from typing import Union, Optional, List, Iterator, Tuple, Any
+
+_MAGIC = b"CWSSTR"
+_VERSION = 1
+_HEADER = struct.Struct("<6sBd")  # magic, version, wall-clock time of the first record
+_RECORD = struct.Struct("<BQI")  # direction, nanoseconds since the start, frame length
+
+TX = 0
+RX = 1
+
+
+class RingBuffer:
+    """
+    Fixed-size history which overwrites its oldest entry in O(1).
+    Indexing and iteration are newest first (index 0 is the most recent entry).
+    """
+    def __init__(self, size: int = 10):
+        assert size >= 1
+        self._items: List[Any] = [None] * size
+        self._head = 0  # next slot to write
+        self._len = 0
+        pass
+
+    @property
+    def size(self) -> int:
+        return len(self._items)
+
+    def append(self, x) -> None:
+        self._items[self._head] = x
+        self._head = (self._head + 1) % len(self._items)
+        if self._len < len(self._items):
+            self._len += 1
+        pass
+
+    def clear(self) -> None:
+        self._items = [None] * len(self._items)
+        self._head = 0
+        self._len = 0
+        pass
+
+    def resize(self, size: int) -> None:
+        """
+        Changes the capacity, keeping the newest entries.
+        """
+        assert size >= 1
+        newest = self.to_list()[:size]
+        self._items = list(reversed(newest)) + [None] * (size - len(newest))
+        self._head = len(newest) % size
+        self._len = len(newest)
+        pass
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, i: int):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("RingBuffer index out of range")
+        return self._items[(self._head - 1 - i) % len(self._items)]
+
+    def __iter__(self) -> Iterator:
+        for i in range(self._len):
+            yield self._items[(self._head - 1 - i) % len(self._items)]
+
+    def to_list(self) -> list:
+        return list(iter(self))
+
+    def __repr__(self) -> str:
+        return repr(self.to_list())
+    pass
+
+
+class TranscriptWriter:
+    """
+    Appends every tx/rx frame to a binary file: a header followed by
+    (direction: u8, nanoseconds since start: u64, length: u32, frame bytes) records.
+    Writes go through a large buffer, so a record costs one `struct.pack` and two buffered writes.
+    """
+    def __init__(self,
+                 path: str,
+                 buffer_size: int = 1 << 20
+                 ):
+        self._file = open(path, 'wb', buffering=buffer_size)
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, time.time()))
+        self._started = time.perf_counter_ns()
+        self._path = path
+        pass
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        pass
+
+    def write(self,
+              direction: int,
+              data: Union[str, bytes, bytearray]
+              ) -> None:
+        if isinstance(data, str):
+            data = data.encode('latin-1')
+        self._file.write(_RECORD.pack(direction, time.perf_counter_ns() - self._started, len(data)))
+        self._file.write(data)
+        pass
+
+    def flush(self) -> None:
+        self._file.flush()
+        pass
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        pass
+    pass
+
+
+def read_transcript(path: str) -> Tuple[float, List[Tuple[int, float, bytes]]]:
+    """
+    :return: Wall-clock start time and the records as (direction, seconds since start, frame bytes)
+    """
+    with open(path, 'rb') as f:
+        buf = f.read()
+    magic, version, started_at = _HEADER.unpack_from(buf, 0)
+    assert magic == _MAGIC, f"'{path}' is not a SimpleSerial transcript."
+    assert version == _VERSION, f"Unsupported transcript version {version}."
+    records = []
+    pos = _HEADER.size
+    while pos + _RECORD.size <= len(buf):
+        direction, t_ns, length = _RECORD.unpack_from(buf, pos)
+        pos += _RECORD.size
+        if pos + length > len(buf):  # truncated last record (e.g. the process was killed)
+            break
+        records.append((direction, t_ns * 1e-9, buf[pos:pos + length]))
+        pos += length
+    return started_at, records
+
+
+def replay_transcript(path: str,
+                      target,
+                      realtime: bool = False
+                      ) -> dict:
+    """
+    Replays the tx frames of a transcript into a target (e.g. `SimulatedSS1xTarget`) and
+    compares what it answers with the recorded rx frames.
+
+    :param target: Object with `write(data)` and `read(num_char)` (latin-1 str)
+    :param realtime: Reproduce the recorded delays between frames
+    :return: Numbers of frames/bytes, elapsed time and the mismatching rx records (index, expected, received)
+    """
+    _, records = read_transcript(path)
+    mismatches = []
+    tx_frames, rx_frames, tx_bytes, rx_bytes = 0, 0, 0, 0
+    started = time.perf_counter()
+    for i, (direction, t, data) in enumerate(records):
+        if realtime:
+            delay = t - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        if direction == TX:
+            target.write(data)
+            tx_frames += 1
+            tx_bytes += len(data)
+        else:
+            received = target.read(len(data)).encode('latin-1')
+            if received != data:
+                mismatches.append((i, data, received))
+            rx_frames += 1
+            rx_bytes += len(data)
+    elapsed = time.perf_counter() - started
+    return {
+        "tx_frames": tx_frames,
+        "rx_frames": rx_frames,
+        "tx_bytes": tx_bytes,
+        "rx_bytes": rx_bytes,
+        "mismatches": mismatches,
+        "elapsed": elapsed,
+        "frames_per_sec": ((tx_frames + rx_frames) / elapsed) if elapsed > 0 else float("inf"),
+    }
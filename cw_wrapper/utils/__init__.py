@@ -1,3 +1,32 @@
-__all__ = ['make_random_hex', 'load_pickle_object', 'store_pickle_object', 'visualization_single_trace']
+__all__ = ['make_random_hex', 'load_pickle_object', 'store_pickle_object', 'visualization_single_trace',
+           'TraceStoreWriter', 'TraceStoreReader', 'open_backend', 'register_backend',
+           'InputGenerator', 'FixedVsRandom', 'FixedVsRandomKey', 'ChosenPlaintext', 'counter_bytes', 'split_classes',
+           'TraceDataset', 'convert_legacy_npy', 'hex_to_uint8',
+           'minmax_envelope', 'trace_density', 'mean_std', 'plot_traces', 'plot_mean_std', 'LiveTraceView',
+           'Tracer']
 
-from .utils import make_random_hex, load_pickle_object, store_pickle_object, visualization_single_trace
+from typing import TYPE_CHECKING
+from .lazy import lazy_exports
+
+# Imported on first access (PEP 562), so `import cw_wrapper` stays cheap for headless workers.
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'make_random_hex': '.utils', 'load_pickle_object': '.utils', 'store_pickle_object': '.utils',
+    'visualization_single_trace': '.utils',
+    'TraceStoreWriter': '.trace_store', 'TraceStoreReader': '.trace_store',
+    'open_backend': '.backend', 'register_backend': '.backend',
+    'InputGenerator': '.inputs', 'FixedVsRandom': '.inputs', 'FixedVsRandomKey': '.inputs',
+    'ChosenPlaintext': '.inputs', 'counter_bytes': '.inputs', 'split_classes': '.inputs',
+    'TraceDataset': '.dataset', 'convert_legacy_npy': '.dataset', 'hex_to_uint8': '.dataset',
+    'minmax_envelope': '.plotting', 'trace_density': '.plotting', 'mean_std': '.plotting',
+    'plot_traces': '.plotting', 'plot_mean_std': '.plotting', 'LiveTraceView': '.plotting',
+    'Tracer': '.tracing',
+})
+
+if TYPE_CHECKING:
+    from .utils import make_random_hex, load_pickle_object, store_pickle_object, visualization_single_trace
+    from .trace_store import TraceStoreWriter, TraceStoreReader
+    from .backend import open_backend, register_backend
+    from .inputs import InputGenerator, FixedVsRandom, FixedVsRandomKey, ChosenPlaintext, counter_bytes, split_classes
+    from .dataset import TraceDataset, convert_legacy_npy, hex_to_uint8
+    from .plotting import minmax_envelope, trace_density, mean_std, plot_traces, plot_mean_std, LiveTraceView
+    from .tracing import Tracer
@@ -0,0 +1,182 @@
+import numpy as np
+from typing import Union, List, Optional, Dict, Tuple
+
+SBOX = (
+    0x63, 0x7C, 0x77, 0x7B, 0xF2, 0x6B, 0x6F, 0xC5, 0x30, 0x01, 0x67, 0x2B, 0xFE, 0xD7, 0xAB, 0x76,
+    0xCA, 0x82, 0xC9, 0x7D, 0xFA, 0x59, 0x47, 0xF0, 0xAD, 0xD4, 0xA2, 0xAF, 0x9C, 0xA4, 0x72, 0xC0,
+    0xB7, 0xFD, 0x93, 0x26, 0x36, 0x3F, 0xF7, 0xCC, 0x34, 0xA5, 0xE5, 0xF1, 0x71, 0xD8, 0x31, 0x15,
+    0x04, 0xC7, 0x23, 0xC3, 0x18, 0x96, 0x05, 0x9A, 0x07, 0x12, 0x80, 0xE2, 0xEB, 0x27, 0xB2, 0x75,
+    0x09, 0x83, 0x2C, 0x1A, 0x1B, 0x6E, 0x5A, 0xA0, 0x52, 0x3B, 0xD6, 0xB3, 0x29, 0xE3, 0x2F, 0x84,
+    0x53, 0xD1, 0x00, 0xED, 0x20, 0xFC, 0xB1, 0x5B, 0x6A, 0xCB, 0xBE, 0x39, 0x4A, 0x4C, 0x58, 0xCF,
+    0xD0, 0xEF, 0xAA, 0xFB, 0x43, 0x4D, 0x33, 0x85, 0x45, 0xF9, 0x02, 0x7F, 0x50, 0x3C, 0x9F, 0xA8,
+    0x51, 0xA3, 0x40, 0x8F, 0x92, 0x9D, 0x38, 0xF5, 0xBC, 0xB6, 0xDA, 0x21, 0x10, 0xFF, 0xF3, 0xD2,
+    0xCD, 0x0C, 0x13, 0xEC, 0x5F, 0x97, 0x44, 0x17, 0xC4, 0xA7, 0x7E, 0x3D, 0x64, 0x5D, 0x19, 0x73,
+    0x60, 0x81, 0x4F, 0xDC, 0x22, 0x2A, 0x90, 0x88, 0x46, 0xEE, 0xB8, 0x14, 0xDE, 0x5E, 0x0B, 0xDB,
+    0xE0, 0x32, 0x3A, 0x0A, 0x49, 0x06, 0x24, 0x5C, 0xC2, 0xD3, 0xAC, 0x62, 0x91, 0x95, 0xE4, 0x79,
+    0xE7, 0xC8, 0x37, 0x6D, 0x8D, 0xD5, 0x4E, 0xA9, 0x6C, 0x56, 0xF4, 0xEA, 0x65, 0x7A, 0xAE, 0x08,
+    0xBA, 0x78, 0x25, 0x2E, 0x1C, 0xA6, 0xB4, 0xC6, 0xE8, 0xDD, 0x74, 0x1F, 0x4B, 0xBD, 0x8B, 0x8A,
+    0x70, 0x3E, 0xB5, 0x66, 0x48, 0x03, 0xF6, 0x0E, 0x61, 0x35, 0x57, 0xB9, 0x86, 0xC1, 0x1D, 0x9E,
+    0xE1, 0xF8, 0x98, 0x11, 0x69, 0xD9, 0x8E, 0x94, 0x9B, 0x1E, 0x87, 0xE9, 0xCE, 0x55, 0x28, 0xDF,
+    0x8C, 0xA1, 0x89, 0x0D, 0xBF, 0xE6, 0x42, 0x68, 0x41, 0x99, 0x2D, 0x0F, 0xB0, 0x54, 0xBB, 0x16,
+)
+
+HW = tuple(bin(x).count("1") for x in range(256))
+
+_RCON = (0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1B, 0x36)
+
+
+def _xtime(x: int) -> int:
+    return ((x << 1) ^ 0x1B) & 0xFF if x & 0x80 else x << 1
+
+
+def aes128_expand_key(key: Union[bytes, bytearray]) -> List[bytes]:
+    """
+    :return: The 11 round keys of AES-128
+    """
+    assert len(key) == 16, "AES-128 key must be 16 bytes."
+    w = bytearray(key)
+    for i in range(4, 44):
+        t = w[4 * (i - 1):4 * i]
+        if i % 4 == 0:
+            t = bytearray((SBOX[t[1]] ^ _RCON[i // 4 - 1], SBOX[t[2]], SBOX[t[3]], SBOX[t[0]]))
+        w.extend(w[4 * (i - 4) + j] ^ t[j] for j in range(4))
+    return [bytes(w[16 * r:16 * (r + 1)]) for r in range(11)]
+
+
+def aes128_encrypt_block(key: Union[bytes, bytearray],
+                         plain: Union[bytes, bytearray],
+                         round_keys: Optional[List[bytes]] = None
+                         ) -> bytes:
+    """
+    Encrypts a single 16-byte block with AES-128 (column-major state, as in FIPS-197).
+    `round_keys` may be passed to skip the key schedule when encrypting many blocks with one key.
+    """
+    assert len(plain) == 16, "AES block must be 16 bytes."
+    if round_keys is None:
+        round_keys = aes128_expand_key(key)
+    s = [p ^ k for p, k in zip(plain, round_keys[0])]
+    for r in range(1, 11):
+        s = [SBOX[x] for x in s]
+        # ShiftRows: row i of column c comes from column (c + i) % 4
+        s = [s[(4 * (c + i) + i) % 16] for c in range(4) for i in range(4)]
+        if r != 10:
+            m = []
+            for c in range(4):
+                a0, a1, a2, a3 = s[4 * c:4 * c + 4]
+                t = a0 ^ a1 ^ a2 ^ a3
+                m.extend((a0 ^ t ^ _xtime(a0 ^ a1), a1 ^ t ^ _xtime(a1 ^ a2),
+                          a2 ^ t ^ _xtime(a2 ^ a3), a3 ^ t ^ _xtime(a3 ^ a0)))
+            s = m
+        s = [x ^ k for x, k in zip(s, round_keys[r])]
+    return bytes(s)
+
+
+# Vectorized AES-128 (NumPy): the state of a batch is an (N, 16) uint8 matrix, one block per row.
+_SBOX_NP = np.array(SBOX, dtype=np.uint8)
+_HW_NP = np.array(HW, dtype=np.uint8)
+_XTIME_NP = np.array([_xtime(x) for x in range(256)], dtype=np.uint8)
+_SHIFT_ROWS = np.array([(4 * (c + i) + i) % 16 for c in range(4) for i in range(4)], dtype=np.intp)
+_NEXT_ROW = np.array([1, 2, 3, 0], dtype=np.intp)
+
+
+def _key_matrix(keys: Union[bytes, bytearray, np.ndarray]) -> np.ndarray:
+    if isinstance(keys, (bytes, bytearray)):
+        keys = np.frombuffer(keys, dtype=np.uint8)
+    return np.atleast_2d(np.asarray(keys, dtype=np.uint8))
+
+
+def aes128_expand_key_batch(keys: Union[bytes, bytearray, np.ndarray]) -> np.ndarray:
+    """
+    :param keys: 16-byte key or (N, 16) uint8 matrix of keys
+    :return: (N, 11, 16) round keys ((1, 11, 16) for a single key)
+    """
+    keys = _key_matrix(keys)
+    assert keys.shape[1] == 16, "AES-128 key must be 16 bytes."
+    w = np.empty((keys.shape[0], 44, 4), dtype=np.uint8)
+    w[:, :4] = keys.reshape(-1, 4, 4)
+    for i in range(4, 44):
+        t = w[:, i - 1]
+        if i % 4 == 0:
+            t = _SBOX_NP[t[:, [1, 2, 3, 0]]]
+            t[:, 0] ^= _RCON[i // 4 - 1]
+        w[:, i] = w[:, i - 4] ^ t
+    return w.reshape(-1, 11, 16)
+
+
+def _encrypt_rows(round_keys: np.ndarray,
+                  plains: np.ndarray,
+                  labels: Optional[Dict[str, np.ndarray]] = None
+                  ) -> np.ndarray:
+    # round_keys: (1 or N, 11, 16). `labels` receives the first-round S-box input/output and the last-round input.
+    s = plains ^ round_keys[:, 0]
+    for r in range(1, 11):
+        if labels is not None and r == 1:
+            labels["sbox_in"] = s
+            labels["sbox_out"] = np.take(_SBOX_NP, s)
+            s = np.take(labels["sbox_out"], _SHIFT_ROWS, axis=1)
+        else:
+            if labels is not None and r == 10:
+                labels["last_in"] = s
+            s = np.take(_SBOX_NP, np.take(s, _SHIFT_ROWS, axis=1))  # SubBytes is bytewise: commutes with ShiftRows
+        if r != 10:
+            # MixColumns on the four bytes of each column packed in a little-endian uint32 (byte i = row i):
+            # out_i = a_i ^ t ^ xtime(a_i ^ a_i+1), with t = a0 ^ a1 ^ a2 ^ a3 = u_i ^ u_i+2 for u_i = a_i ^ a_i+1
+            x = s.view('<u4')
+            u = x ^ ((x >> 8) | (x << 24))
+            x ^= u ^ ((u >> 16) | (u << 16)) ^ ((u & 0x7F7F7F7F) << 1) ^ (((u >> 7) & 0x01010101) * 0x1B)
+        s ^= round_keys[:, r]
+    return s
+
+
+def aes128_encrypt_batch(keys: Union[bytes, bytearray, np.ndarray],
+                         plains: np.ndarray,
+                         out: Optional[np.ndarray] = None,
+                         chunk_rows: int = 16384
+                         ) -> np.ndarray:
+    """
+    Encrypts a batch of blocks with AES-128, vectorized over the rows (chunks of `chunk_rows` stay in cache).
+
+    :param keys: 16-byte key shared by all blocks, or (N, 16) per-block keys
+    :param plains: (N, 16) uint8 plaintexts
+    :param out: (N, 16) uint8 output matrix. Allocated if None
+    :return: (N, 16) uint8 ciphertexts
+    """
+    plains = np.asarray(plains, dtype=np.uint8)
+    assert plains.ndim == 2 and plains.shape[1] == 16, "AES block must be 16 bytes."
+    keys = _key_matrix(keys)
+    assert keys.shape[0] in (1, plains.shape[0])
+    round_keys = aes128_expand_key_batch(keys) if keys.shape[0] == 1 else None
+    if out is None:
+        out = np.empty_like(plains)
+    for start in range(0, plains.shape[0], chunk_rows):
+        stop = start + chunk_rows
+        rk = round_keys if round_keys is not None else aes128_expand_key_batch(keys[start:stop])
+        out[start:stop] = _encrypt_rows(rk, np.ascontiguousarray(plains[start:stop]))
+    return out
+
+
+def aes128_encrypt_labels(keys: Union[bytes, bytearray, np.ndarray],
+                          plains: np.ndarray
+                          ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Encrypts a batch and returns the intermediate values used as leakage labels, from the same pass:
+        "sbox_out" : first-round S-box outputs SBOX[p ^ k]
+        "hw_sbox"  : Hamming weight of the S-box outputs
+        "hd_sbox"  : Hamming distance between S-box input and output
+        "hd_last"  : Hamming distance between the last-round input byte and the ciphertext byte replacing it
+
+    :return: ((N, 16) ciphertexts, dict of (N, 16) uint8 labels)
+    """
+    plains = np.asarray(plains, dtype=np.uint8)
+    assert plains.ndim == 2 and plains.shape[1] == 16, "AES block must be 16 bytes."
+    round_keys = aes128_expand_key_batch(keys)
+    assert round_keys.shape[0] in (1, plains.shape[0])
+    states = {}
+    ciphers = _encrypt_rows(round_keys, np.ascontiguousarray(plains), states)
+    labels = {
+        "sbox_out": states["sbox_out"],
+        "hw_sbox": _HW_NP[states["sbox_out"]],
+        "hd_sbox": _HW_NP[states["sbox_in"] ^ states["sbox_out"]],
+        "hd_last": _HW_NP[states["last_in"][:, _SHIFT_ROWS] ^ ciphers],
+    }
+    return ciphers, labels
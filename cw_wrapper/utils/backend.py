@@ -0,0 +1,71 @@
+from typing import Callable, Dict, Tuple, Any, Optional
+
+_backends: Dict[str, Callable[..., Tuple[Any, Any]]] = {}
+
+
+def register_backend(name: str, factory: Callable[..., Tuple[Any, Any]]) -> None:
+    """
+    Registers a backend which `CWScope.connect` and `SSTargetStandAlone.connect` can select by name.
+
+    :param name: Backend name
+    :param factory: `factory(ss_version, **kwargs)` which returns a connected (scope, target) pair
+    :return: None
+    """
+    _backends[name] = factory
+    pass
+
+
+def get_backend_names() -> list:
+    return list(_backends.keys())
+
+
+def open_backend(backend: str = "chipwhisperer",
+                 ss_version: str = "1.1",
+                 **kwargs
+                 ) -> Tuple[Any, Any]:
+    """
+    :param backend: Name of a registered backend ("chipwhisperer" or "sim" by default)
+    :param ss_version: SimpleSerial version of the target ("1.0", "1.1" or "2.0")
+    :param kwargs: Backend-specific options (e.g. `sn` for "chipwhisperer", `noise_std` for "sim")
+    :return: (scope, target)
+    """
+    assert backend in _backends, f"Unknown backend '{backend}'. (available: {get_backend_names()})"
+    assert ss_version in ("1.0", "1.1", "2.0")
+    return _backends[backend](ss_version, **kwargs)
+
+
+def _open_chipwhisperer(ss_version: str, **kwargs) -> Tuple[Any, Any]:
+    import chipwhisperer as cw
+    from chipwhisperer.capture import scopes
+    scope = cw.scope(scope_type=scopes.OpenADC, **kwargs)
+    scope.default_setup()
+    if ss_version == "2.0":
+        target = cw.target(scope, target_type=cw.targets.SimpleSerial2)
+    else:  # SimpleSerial 1.x
+        target = cw.target(scope, target_type=cw.targets.SimpleSerial)
+    return scope, target
+
+
+def _open_simulated(ss_version: str,
+                    key: Optional[bytes] = None,
+                    realtime: bool = False,
+                    drop_rate: float = 0.0,
+                    hang_rate: float = 0.0,
+                    target_kwargs: Optional[dict] = None,
+                    **kwargs
+                    ) -> Tuple[Any, Any]:
+    # target_kwargs: timing limits of the simulated target (boot_time, min_reset_time, firmware_baud, ...)
+    from ..sim import SimulatedScope, SimulatedSS1xTarget, SimulatedSS2xTarget
+    scope = SimulatedScope(realtime=realtime, **kwargs)
+    scope.con()
+    scope.default_setup()
+    fault_kwargs = dict(drop_rate=drop_rate, hang_rate=hang_rate, seed=kwargs.get("seed"), **(target_kwargs or {}))
+    if ss_version == "2.0":
+        target = SimulatedSS2xTarget(scope, key=key, realtime=realtime, **fault_kwargs)
+    else:  # SimpleSerial 1.x
+        target = SimulatedSS1xTarget(scope, key=key, realtime=realtime, ss_version=ss_version, **fault_kwargs)
+    return scope, target
+
+
+register_backend("chipwhisperer", _open_chipwhisperer)
+register_backend("sim", _open_simulated)
@@ -0,0 +1,341 @@
+import os
+import json
+import multiprocessing as mp
+import numpy as np
+from typing import Optional, Callable, Iterator, Tuple, Union, List, Dict, Any
+from .trace_store import TraceStoreWriter, TraceStoreReader
+from .utils import load_pickle_object
+from ..simpleserial_target.ss1x_codec import Payload, to_bytes
+
+_INDEX_DIR = "index"
+_TMP_SUFFIX = ".tmp"
+
+
+def _hex_table() -> np.ndarray:
+    table = np.full(256, 0xFF, dtype=np.uint8)  # 0xFF: not a hex digit
+    for i, c in enumerate("0123456789abcdef"):
+        table[ord(c)] = table[ord(c.upper())] = i
+    return table
+
+
+_HEX_VALUES = _hex_table()
+
+
+def _hex_nibbles(rows: np.ndarray) -> np.ndarray:
+    if rows.dtype.kind == 'U':
+        rows = rows.astype(f"S{max(rows.dtype.itemsize // 4, 1)}")  # UCS-4 -> ASCII
+    rows = np.ascontiguousarray(rows)
+    return _HEX_VALUES[rows.view(np.uint8).reshape(rows.shape[0], rows.dtype.itemsize)]
+
+
+def hex_to_uint8(rows) -> np.ndarray:
+    """
+    Vectorized conversion of hex strings (e.g. the `np.str_` arrays saved by older capture scripts) to a uint8 matrix.
+    Already numeric (N, len) arrays are returned as uint8.
+    """
+    rows = np.asarray(rows)
+    if rows.dtype.kind in ('u', 'i'):
+        return rows.astype(np.uint8, copy=False)
+    if rows.dtype.kind == 'O':
+        rows = rows.astype(str)
+    assert rows.dtype.kind in ('U', 'S'), f"Cannot convert dtype {rows.dtype} to hex digits."
+    nibbles = _hex_nibbles(rows)
+    if not (nibbles != 0xFF).all():  # slow path: surrounding whitespace
+        rows = np.char.strip(rows)
+        nibbles = _hex_nibbles(rows.astype(f"S{max(int(np.char.str_len(rows).max(initial=0)), 1)}"))
+    assert (nibbles != 0xFF).all(), "Invalid hex strings (or of different lengths)."
+    assert nibbles.shape[1] % 2 == 0, "Hex strings must have an even number of digits."
+    return (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+
+
+def _load_legacy(x) -> np.ndarray:
+    if not isinstance(x, str):
+        return np.asarray(x)
+    if not x.endswith(".npy"):
+        return np.asarray(load_pickle_object(x))
+    try:
+        return np.load(x, mmap_mode='r')
+    except ValueError:  # object arrays (lists of str) cannot be memory-mapped
+        return np.load(x, allow_pickle=True)
+
+
+def convert_legacy_npy(dst_path: str,
+                       traces,
+                       plains,
+                       ciphers,
+                       chunk_size: int = 10000,
+                       trace_dtype: Optional[Union[str, np.dtype]] = None,
+                       **meta
+                       ) -> int:
+    """
+    Converts the output of older capture scripts (`traces.npy` and `plains.npy`/`ciphers.npy` of hex strings,
+    or pickles of the same) into a trace store with uint8 inputs/outputs.
+
+    :param traces: Path of a .npy/.pkl file or array of (N, samples) traces (read memory-mapped from .npy)
+    :param plains: Path or array of N hex strings (or an (N, len) uint8 matrix)
+    :param ciphers: Path or array of N hex strings (or an (N, len) uint8 matrix)
+    :param meta: Additional metadata stored with the store (e.g. key)
+    :return: Number of rows written
+    """
+    traces = _load_legacy(traces)
+    plains = hex_to_uint8(_load_legacy(plains))
+    ciphers = hex_to_uint8(_load_legacy(ciphers))
+    assert traces.ndim == 2 and traces.shape[0] == plains.shape[0] == ciphers.shape[0]
+    trace_dtype = traces.dtype if trace_dtype is None else np.dtype(trace_dtype)
+    with TraceStoreWriter(dst_path, traces.shape[1], plains.shape[1], ciphers.shape[1], chunk_size=chunk_size,
+                          trace_dtype=trace_dtype, flush_interval=None) as writer:
+        if meta:
+            writer.set_meta(**meta)
+        for start in range(0, traces.shape[0], chunk_size):
+            stop = start + chunk_size
+            writer.append_batch(np.asarray(traces[start:stop]), plains[start:stop], ciphers[start:stop])
+        return len(writer)
+
+
+# Datasets opened by pool workers, one per store and process (see `TraceDataset.map_chunks`).
+_worker_datasets: Dict[str, "TraceDataset"] = {}
+
+
+def _apply_to_chunk(dataset: "TraceDataset",
+                    fn: Callable,
+                    c: int,
+                    rows: Union[slice, np.ndarray],
+                    as_float: bool
+                    ) -> Any:
+    # A slice of the memory map is a view; only row subsets (index groups) are gathered.
+    traces, plains, ciphers = (x[rows] for x in dataset.chunk(c))
+    return fn(dataset.to_float(traces) if as_float else traces, plains, ciphers)
+
+
+def _run_chunk_task(args) -> Any:
+    path, fn, c, rows, as_float = args
+    dataset = _worker_datasets.get(path)
+    if dataset is None or dataset.n_chunks <= c:
+        dataset = _worker_datasets[path] = TraceDataset(path)
+    return _apply_to_chunk(dataset, fn, c, rows, as_float)
+
+
+class TraceDataset(TraceStoreReader):
+    """
+    Trace store reader with persisted secondary indexes, for analyses which only need a subset of the rows.
+
+    An index groups the row ids by an integer label (e.g. the value of plaintext byte j, or fixed/random class).
+    It is stored in `<store>/index/<name>.npz` as the row ids sorted by label plus the offset of each label,
+    so reading a group costs one slice of the index and only the trace rows of that group are read from disk.
+    Built-in indexes are rebuilt automatically when the store has grown since they were built.
+    """
+    def __init__(self,
+                 path: str,
+                 mmap_mode: Optional[str] = 'r'
+                 ):
+        super().__init__(path, mmap_mode)
+        self._index_dir = os.path.join(path, _INDEX_DIR)
+        self._indexes: Dict[str, Dict[str, np.ndarray]] = {}
+        pass
+
+    # ---- secondary indexes ----
+
+    def _column(self, field: int, byte: int) -> np.ndarray:
+        if len(self._chunks) == 0:
+            return np.empty(0, dtype=np.uint8)
+        return np.concatenate([chunk[field][:, byte] for chunk in self._chunks])
+
+    def _labels(self, spec: Dict) -> Tuple[np.ndarray, int]:
+        if spec["kind"] == "plain_byte":
+            return self._column(1, spec["byte"]), 256
+        if spec["kind"] == "cipher_byte":
+            return self._column(2, spec["byte"]), 256
+        if spec["kind"] == "fixed":
+            fixed = np.frombuffer(bytes.fromhex(spec["fixed"]), dtype=np.uint8)
+            if len(self._chunks) == 0:
+                return np.empty(0, dtype=np.uint8), 2
+            return np.concatenate([(chunk[1] == fixed).all(axis=1) for chunk in self._chunks]).astype(np.uint8), 2
+        raise ValueError(f"Unknown index kind '{spec['kind']}'.")
+
+    def build_index(self,
+                    name: str,
+                    labels: np.ndarray,
+                    n_groups: Optional[int] = None,
+                    spec: Optional[Dict] = None
+                    ) -> None:
+        """
+        Builds and persists an index from one non-negative integer label per row.
+
+        :param name: Index name (file name in `<store>/index`)
+        :param labels: (len(self),) labels, e.g. `FixedVsRandom.is_fixed(0, len(ds))` or a model output
+        :param n_groups: Number of label values (max(labels) + 1 if None)
+        :param spec: Recipe of built-in indexes, used to rebuild them when the store grows
+        """
+        labels = np.asarray(labels).astype(np.int64, copy=False)
+        assert labels.ndim == 1 and labels.shape[0] == len(self), "One label per row is required."
+        assert labels.shape[0] == 0 or labels.min() >= 0, "Labels must be non-negative."
+        if n_groups is None:
+            n_groups = int(labels.max()) + 1 if labels.shape[0] > 0 else 1
+        order = np.argsort(labels, kind='stable')  # stable: row ids stay sorted within each group
+        index = {
+            "order": order.astype(np.uint32 if len(self) < 2 ** 32 else np.int64),
+            "offsets": np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=n_groups)))).astype(np.int64),
+            "n_rows": np.int64(len(self)),
+            "spec": np.array(json.dumps(spec or {"kind": "custom"})),
+        }
+        os.makedirs(self._index_dir, exist_ok=True)
+        path = os.path.join(self._index_dir, name + ".npz")
+        with open(path + _TMP_SUFFIX, 'wb') as f:
+            np.savez(f, **index)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + _TMP_SUFFIX, path)
+        self._indexes[name] = index
+        pass
+
+    def index_plain_byte(self, byte: int) -> str:
+        """
+        Builds (or loads) the index of rows by the value of plaintext byte `byte`.
+
+        :return: Index name ("plain_byte_<byte>")
+        """
+        return self._ensure_index(f"plain_byte_{byte}", {"kind": "plain_byte", "byte": byte})
+
+    def index_cipher_byte(self, byte: int) -> str:
+        return self._ensure_index(f"cipher_byte_{byte}", {"kind": "cipher_byte", "byte": byte})
+
+    def index_fixed(self, fixed: Payload, name: str = "fixed") -> str:
+        """
+        Builds (or loads) the fixed/random class index of a TVLA dataset: group 1 holds the rows whose plaintext
+        is `fixed`, group 0 the others.
+        """
+        return self._ensure_index(name, {"kind": "fixed", "fixed": to_bytes(fixed).hex()})
+
+    def _ensure_index(self, name: str, spec: Dict) -> str:
+        index = self._load_index(name)
+        if index is None or json.loads(str(index["spec"])) != spec or int(index["n_rows"]) != len(self):
+            labels, n_groups = self._labels(spec)
+            self.build_index(name, labels, n_groups, spec)
+        return name
+
+    def _load_index(self, name: str) -> Optional[Dict[str, np.ndarray]]:
+        if name not in self._indexes:
+            path = os.path.join(self._index_dir, name + ".npz")
+            if not os.path.exists(path):
+                return None
+            with np.load(path) as f:
+                self._indexes[name] = {key: f[key] for key in f.files}
+        return self._indexes[name]
+
+    def index_names(self) -> List[str]:
+        if not os.path.isdir(self._index_dir):
+            return []
+        return sorted(x[:-4] for x in os.listdir(self._index_dir) if x.endswith(".npz"))
+
+    def rows(self, name: str, group: int) -> np.ndarray:
+        """
+        :return: Sorted row ids of group `group` of index `name`
+        """
+        index = self._load_index(name)
+        assert index is not None, f"There is no index '{name}'."
+        if int(index["n_rows"]) != len(self):
+            spec = json.loads(str(index["spec"]))
+            assert spec["kind"] != "custom", f"The store has grown since index '{name}' was built."
+            self._ensure_index(name, spec)
+            index = self._indexes[name]
+        offsets = index["offsets"]
+        if group >= offsets.shape[0] - 1:
+            return np.empty(0, dtype=np.int64)
+        return index["order"][offsets[group]:offsets[group + 1]].astype(np.int64)
+
+    def group_sizes(self, name: str) -> np.ndarray:
+        self.rows(name, 0)  # refreshes a stale built-in index
+        return np.diff(self._indexes[name]["offsets"])
+
+    # ---- row access ----
+
+    def chunk(self, c: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: Memory-mapped (traces, plains, ciphers) of chunk `c`
+        """
+        return self._chunks[c]
+
+    def _split_by_chunk(self, rows: np.ndarray) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        # Yields (chunk, local row ids, positions in `rows`) for sorted `rows`.
+        chunk_ids = np.searchsorted(self._offsets, rows, side='right') - 1
+        bounds = np.flatnonzero(np.diff(chunk_ids)) + 1
+        for part in np.split(np.arange(rows.shape[0]), bounds):
+            if part.shape[0] > 0:
+                c = int(chunk_ids[part[0]])
+                yield c, rows[part] - int(self._offsets[c]), part
+        pass
+
+    def read_rows(self,
+                  rows: np.ndarray,
+                  as_float: bool = False
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gathers arbitrary rows (e.g. `rows(name, group)`); only the pages holding those rows are read.
+        The rows are returned in the given order.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        assert rows.ndim == 1 and (rows.shape[0] == 0 or (rows.min() >= 0 and rows.max() < len(self)))
+        order = np.argsort(rows, kind='stable')
+        sorted_rows = rows[order]
+        meta = self._meta
+        traces = np.empty((rows.shape[0], meta["samples"]), dtype=np.dtype(meta["trace_dtype"]))
+        plains = np.empty((rows.shape[0], meta["plain_len"]), dtype=np.uint8)
+        ciphers = np.empty((rows.shape[0], meta["cipher_len"]), dtype=np.uint8)
+        for c, local, part in self._split_by_chunk(sorted_rows):
+            dst = order[part]
+            chunk_traces, chunk_plains, chunk_ciphers = self._chunks[c]
+            traces[dst] = chunk_traces[local]
+            plains[dst] = chunk_plains[local]
+            ciphers[dst] = chunk_ciphers[local]
+        return (self.to_float(traces) if as_float else traces), plains, ciphers
+
+    def iter_rows(self,
+                  rows: np.ndarray,
+                  chunk_rows: int = 4096,
+                  as_float: bool = False
+                  ) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Yields the given rows in batches of at most `chunk_rows`, for streaming statistics over a group.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        for start in range(0, rows.shape[0], chunk_rows):
+            yield self.read_rows(rows[start:start + chunk_rows], as_float)
+        pass
+
+    def map_chunks(self,
+                   fn: Callable[[np.ndarray, np.ndarray, np.ndarray], Any],
+                   rows: Optional[np.ndarray] = None,
+                   chunk_rows: int = 4096,
+                   n_jobs: int = 1,
+                   mp_context: str = "spawn",
+                   as_float: bool = False
+                   ) -> List[Any]:
+        """
+        Applies `fn(traces, plains, ciphers)` to the store (or to the given rows) chunk by chunk and returns the
+        results in row order. With n_jobs > 1 (0: all cores) the chunks are processed by a process pool.
+        The workers memory-map the store themselves and only receive (chunk, row range) descriptors, so the traces
+        are never pickled or copied: `fn` gets read-only views of the memory map (row subsets are gathered).
+
+        :param fn: Picklable (module-level) function when n_jobs > 1
+        :param rows: Sorted row ids (e.g. `rows(name, group)`). All rows if None
+        :param chunk_rows: Maximum rows per call (calls never span two store chunks)
+        """
+        assert chunk_rows >= 1
+        tasks = []
+        if rows is None:
+            for c in range(len(self._chunks)):
+                length = int(self._offsets[c + 1] - self._offsets[c])
+                for start in range(0, length, chunk_rows):
+                    tasks.append((self._path, fn, c, slice(start, min(start + chunk_rows, length)), as_float))
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            assert rows.shape[0] == 0 or (np.diff(rows) >= 0).all(), "'rows' must be sorted."
+            for c, local, _ in self._split_by_chunk(rows):
+                for start in range(0, local.shape[0], chunk_rows):
+                    tasks.append((self._path, fn, c, local[start:start + chunk_rows], as_float))
+        if n_jobs == 1:
+            return [_apply_to_chunk(self, *task[1:]) for task in tasks]
+        n_jobs = n_jobs if n_jobs > 0 else os.cpu_count()
+        with mp.get_context(mp_context).Pool(n_jobs) as pool:
+            return pool.map(_run_chunk_task, tasks, chunksize=max(1, len(tasks) // (4 * n_jobs)))
+    pass
@@ -0,0 +1,159 @@
+import numpy as np
+from typing import Optional, Union, Tuple
+from ..simpleserial_target.ss1x_codec import Payload, to_bytes
+
+# Independent Philox streams derived from one seed
+_STREAM_PLAIN = 0
+_STREAM_CLASS = 1
+_STREAM_KEY = 2
+
+
+def counter_bytes(seed: int,
+                  stream: int,
+                  start: int,
+                  count: int,
+                  row_len: int
+                  ) -> np.ndarray:
+    """
+    Counter-based random bytes: row `i` only depends on (seed, stream, i), so any range of rows
+    can be regenerated directly without generating (or storing) the rows before it.
+
+    :return: (count, row_len) uint8 matrix of rows [start, start + count)
+    """
+    assert start >= 0 and count >= 0 and row_len >= 1
+    steps_per_row = (row_len + 31) // 32  # one Philox-4x64 counter step yields 32 bytes
+    bit_generator = np.random.Philox(key=np.array([seed, stream], dtype=np.uint64), counter=start * steps_per_row)
+    words = bit_generator.random_raw(count * steps_per_row * 4).astype('<u8', copy=False)
+    return words.view(np.uint8).reshape(count, steps_per_row * 32)[:, :row_len]
+
+
+class InputGenerator:
+    """
+    Reproducible random inputs: `inputs(start, count)` returns the (count, payload_len) uint8 plaintexts
+    of traces [start, start + count). Can be passed as `inputs` to `CapturePipeline.run`.
+    """
+    def __init__(self,
+                 seed: int = 0,
+                 payload_len: int = 16
+                 ):
+        assert seed >= 0 and payload_len >= 1
+        self.seed = seed
+        self.payload_len = payload_len
+        pass
+
+    def __call__(self, start: int, count: int) -> np.ndarray:
+        return counter_bytes(self.seed, _STREAM_PLAIN, start, count, self.payload_len)
+
+    def take(self, n: int, start: int = 0) -> np.ndarray:
+        """
+        :return: Inputs of traces [start, start + n) as one contiguous matrix (e.g. for `capture_stream`)
+        """
+        return np.ascontiguousarray(self(start, n))
+
+    def keys(self, start: int, count: int) -> Optional[np.ndarray]:
+        """
+        Per-trace keys of the schedule (None: the key does not change).
+        """
+        return None
+    pass
+
+
+class FixedVsRandom(InputGenerator):
+    """
+    TVLA fixed-vs-random schedule: each trace is independently (counter-based) assigned to the fixed class
+    with probability `fixed_ratio`, which randomly interleaves the classes as TVLA requires.
+    """
+    def __init__(self,
+                 fixed: Payload,
+                 seed: int = 0,
+                 fixed_ratio: float = 0.5
+                 ):
+        fixed = np.frombuffer(to_bytes(fixed), dtype=np.uint8)
+        assert 0 <= fixed_ratio <= 1
+        super().__init__(seed, fixed.shape[0])
+        self.fixed = fixed
+        self._threshold = int(round(fixed_ratio * 0x10000))
+        pass
+
+    def is_fixed(self, start: int, count: int) -> np.ndarray:
+        """
+        :return: (count,) mask of the traces in the fixed class
+        """
+        draw = counter_bytes(self.seed, _STREAM_CLASS, start, count, 2)
+        return (draw[:, 0].astype(np.uint32) | (draw[:, 1].astype(np.uint32) << 8)) < self._threshold
+
+    def __call__(self, start: int, count: int) -> np.ndarray:
+        plains = np.array(super().__call__(start, count))
+        plains[self.is_fixed(start, count)] = self.fixed
+        return plains
+    pass
+
+
+class FixedVsRandomKey(InputGenerator):
+    """
+    Fixed-key vs random-key schedule: random plaintexts, and per trace either the fixed key or a random key
+    (interleaved like `FixedVsRandom`). The keys are sent before each trace by `capture_batch(keys=...)`.
+    """
+    def __init__(self,
+                 fixed_key: Payload,
+                 seed: int = 0,
+                 payload_len: int = 16,
+                 fixed_ratio: float = 0.5
+                 ):
+        super().__init__(seed, payload_len)
+        self.fixed_key = np.frombuffer(to_bytes(fixed_key), dtype=np.uint8)
+        self._classes = FixedVsRandom(self.fixed_key, seed, fixed_ratio)
+        pass
+
+    def is_fixed(self, start: int, count: int) -> np.ndarray:
+        return self._classes.is_fixed(start, count)
+
+    def keys(self, start: int, count: int) -> np.ndarray:
+        keys = np.array(counter_bytes(self.seed, _STREAM_KEY, start, count, self.fixed_key.shape[0]))
+        keys[self.is_fixed(start, count)] = self.fixed_key
+        return keys
+    pass
+
+
+class ChosenPlaintext(InputGenerator):
+    """
+    Chosen-plaintext schedule: cycles through the rows of `plains` (trace i uses row i % len(plains)).
+    """
+    def __init__(self, plains: np.ndarray):
+        plains = np.ascontiguousarray(plains, dtype=np.uint8)
+        assert plains.ndim == 2 and plains.shape[0] >= 1
+        super().__init__(0, plains.shape[1])
+        self.plains = plains
+        pass
+
+    def __call__(self, start: int, count: int) -> np.ndarray:
+        return self.plains[np.arange(start, start + count) % self.plains.shape[0]]
+
+    @classmethod
+    def byte_sweep(cls,
+                   byte: int,
+                   base: Optional[Payload] = None,
+                   payload_len: int = 16,
+                   values: Union[range, np.ndarray] = range(256)
+                   ) -> "ChosenPlaintext":
+        """
+        Sweeps `values` through plaintext byte `byte` while the other bytes keep `base` (zeros if None).
+        """
+        base = np.zeros(payload_len, dtype=np.uint8) if base is None else np.frombuffer(to_bytes(base), dtype=np.uint8)
+        assert 0 <= byte < base.shape[0]
+        values = np.asarray(values, dtype=np.uint8)
+        plains = np.repeat(base[None, :], values.shape[0], axis=0)
+        plains[:, byte] = values
+        return cls(plains)
+    pass
+
+
+def split_classes(schedule: Union[FixedVsRandom, FixedVsRandomKey],
+                  start: int,
+                  count: int
+                  ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :return: Indices of the fixed and of the random traces among [start, start + count)
+    """
+    mask = schedule.is_fixed(start, count)
+    return start + np.flatnonzero(mask), start + np.flatnonzero(~mask)
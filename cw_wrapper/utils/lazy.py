@@ -0,0 +1,31 @@
+import sys
+import importlib
+from typing import Dict, Callable, Tuple, List, Any
+
+
+def lazy_exports(package: str,
+                 exports: Dict[str, str]
+                 ) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """
+    Builds the PEP 562 module-level `__getattr__` and `__dir__` of a package whose public names are imported
+    on first access instead of at `import` time, so that importing the package does not load its submodules
+    (and their dependencies) until they are used.
+
+    Usage in an `__init__.py`:
+        __getattr__, __dir__ = lazy_exports(__name__, {"CWScope": ".cw_scope", ...})
+
+    :param package: `__name__` of the package
+    :param exports: Public name -> module (relative to `package`) which defines it
+    :return: (__getattr__, __dir__)
+    """
+    def __getattr__(name: str) -> Any:
+        if name not in exports:
+            raise AttributeError(f"module '{package}' has no attribute '{name}'")
+        value = getattr(importlib.import_module(exports[name], package), name)
+        setattr(sys.modules[package], name, value)  # later accesses no longer go through __getattr__
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(sys.modules[package])) | set(exports))
+
+    return __getattr__, __dir__
@@ -0,0 +1,456 @@
+import time
+import queue
+import threading
+import multiprocessing as mp
+import numpy as np
+from typing import Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
+# matplotlib is imported inside the functions, so that importing this module stays cheap for headless workers.
+
+
+def minmax_envelope(traces: np.ndarray,
+                    n_bins: int
+                    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Reduces the last axis to `n_bins` (min, max) pairs, e.g. one per horizontal pixel. Drawing the envelope
+    looks the same as drawing every sample, but costs O(n_bins) instead of O(samples).
+    Traces with at most 2 * n_bins samples are returned as they are (lo == hi).
+
+    :param traces: (samples,) trace or (N, samples) traces (np.memmap is fine)
+    :return: (x, lo, hi): first sample index of every bin and the per-bin minimum/maximum, shaped (..., n_bins)
+    """
+    traces = np.asarray(traces)
+    samples = traces.shape[-1]
+    assert n_bins >= 1
+    if samples <= 2 * n_bins:
+        return np.arange(samples), traces, traces
+    starts = (np.arange(n_bins, dtype=np.int64) * samples) // n_bins
+    return starts, np.minimum.reduceat(traces, starts, axis=-1), np.maximum.reduceat(traces, starts, axis=-1)
+
+
+def _envelope_lines(x: np.ndarray,
+                    lo: np.ndarray,
+                    hi: np.ndarray
+                    ) -> np.ndarray:
+    # Polyline visiting lo and hi of every bin: (..., 2 * n_bins, 2) vertices (or (..., n, 2) if not decimated).
+    if lo is hi:
+        xs, ys = x, lo
+    else:
+        xs = np.repeat(x, 2)
+        ys = np.stack((lo, hi), axis=-1).reshape(lo.shape[:-1] + (-1,))
+    return np.stack(np.broadcast_arrays(xs, ys), axis=-1)
+
+
+def _pixel_width(ax, n_bins: Optional[int]) -> int:
+    if n_bins is not None:
+        return n_bins
+    return max(int(ax.get_window_extent().width), 100)
+
+
+def _next_color(ax) -> str:
+    return f"C{len(ax.collections) % 10}"
+
+
+def _new_axes(ax, figsize: Tuple[float, float] = (8.0, 4.5)):
+    if ax is not None:
+        return ax
+    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=figsize)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_xlabel("Sample points")
+    ax.set_ylabel("Power Consumption")
+    return ax
+
+
+def _connected_envelope(traces: np.ndarray,
+                        n_bins: int
+                        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Like `minmax_envelope`, but each bin also covers the first sample of the next bin,
+    # so the ranges include the line segments connecting neighbouring bins.
+    samples = traces.shape[-1]
+    starts = np.arange(samples) if samples <= n_bins else (np.arange(n_bins, dtype=np.int64) * samples) // n_bins
+    lo = np.minimum.reduceat(traces, starts, axis=-1)
+    hi = np.maximum.reduceat(traces, starts, axis=-1)
+    following = traces[..., starts[1:]]
+    lo[..., :-1] = np.minimum(lo[..., :-1], following)
+    hi[..., :-1] = np.maximum(hi[..., :-1], following)
+    return starts, lo, hi
+
+
+def trace_density(traces: np.ndarray,
+                  n_bins: int,
+                  height: int,
+                  y_range: Optional[Tuple[float, float]] = None,
+                  chunk_rows: int = 4096
+                  ) -> Tuple[np.ndarray, Tuple[float, float]]:
+    """
+    Rasterizes an overlay of traces: pixel (row, column) counts the traces whose line passes through it.
+    Costs O(N * samples) once, independently of how many traces are drawn on top of each other.
+
+    :param traces: (N, samples) traces (np.memmap is fine; read in chunks of `chunk_rows`)
+    :param y_range: Vertical range of the image (min/max of the traces if None)
+    :return: ((height, n_bins) counts, y_range)
+    """
+    n, samples = traces.shape
+    n_bins = min(n_bins, samples)
+    if y_range is None:
+        y_range = (min(float(np.min(traces[i:i + chunk_rows])) for i in range(0, n, chunk_rows)),
+                   max(float(np.max(traces[i:i + chunk_rows])) for i in range(0, n, chunk_rows)))
+    y0, y1 = y_range
+    scale = (height - 1) / (y1 - y0) if y1 > y0 else 0.0
+    counts = np.zeros(n_bins * (height + 1), dtype=np.int64)
+    columns = np.arange(n_bins, dtype=np.int64) * (height + 1)
+    for start in range(0, n, chunk_rows):
+        _, lo, hi = _connected_envelope(np.asarray(traces[start:start + chunk_rows], dtype=np.float64), n_bins)
+        a = np.clip(((lo - y0) * scale).astype(np.int64), 0, height - 1)
+        b = np.clip(((hi - y0) * scale).astype(np.int64), 0, height - 1)
+        # +1 where a trace enters a column's pixel range and -1 after it leaves; a cumsum fills the ranges.
+        counts += np.bincount((columns + a).ravel(), minlength=counts.shape[0])
+        counts -= np.bincount((columns + b + 1).ravel(), minlength=counts.shape[0])
+    density = np.cumsum(counts.reshape(n_bins, height + 1), axis=1)[:, :height]
+    return density.T, y_range
+
+
+def plot_traces(traces: np.ndarray,
+                ax: Optional["plt.Axes"] = None,
+                n_bins: Optional[int] = None,
+                max_lines: int = 50,
+                linewidth: float = 0.8,
+                alpha: Optional[float] = None,
+                color=None,
+                cmap: str = "viridis",
+                label: Optional[str] = None
+                ) -> "plt.Axes":
+    """
+    Draws one trace or an overlay of traces, reduced to the resolution of the axes:
+    up to `max_lines` traces as per-pixel min/max envelopes in a single LineCollection,
+    more traces as a density image (see `trace_density`), which stays fast for thousands of traces.
+
+    :param traces: (samples,) or (N, samples)
+    :param n_bins: Horizontal resolution (the axes width in pixels if None)
+    :param alpha: Line transparency (decreases with the number of overlaid traces if None)
+    :return: The axes drawn on
+    """
+    ax = _new_axes(ax)
+    traces = np.asarray(traces) if not isinstance(traces, np.memmap) else traces
+    traces = traces[None, :] if traces.ndim == 1 else traces
+    width = _pixel_width(ax, n_bins)
+    samples = traces.shape[1]
+    if traces.shape[0] > max_lines:
+        height = max(int(ax.get_window_extent().height), 100)
+        density, (y0, y1) = trace_density(traces, width, height)
+        image = np.ma.masked_equal(density, 0)
+        ax.imshow(image, origin="lower", aspect="auto", cmap=cmap, interpolation="nearest",
+                  extent=(0, samples - 1, y0, y1))
+        ax.set_ylim(*_padded_limits(y0, y1))
+    else:
+        from matplotlib.collections import LineCollection
+        x, lo, hi = minmax_envelope(traces, width)
+        if alpha is None:
+            alpha = 1.0 if traces.shape[0] == 1 else max(0.1, min(1.0, 5.0 / traces.shape[0]))
+        colors = color if color is not None else \
+            [f"C{(len(ax.collections) + i) % 10}" for i in range(traces.shape[0])]
+        ax.add_collection(LineCollection(_envelope_lines(x, lo, hi), linewidths=linewidth, alpha=alpha,
+                                         colors=colors, label=label))
+        ax.autoscale_view(scalex=False)
+    ax.set_xlim(0, samples - 1)
+    return ax
+
+
+def mean_std(traces: np.ndarray,
+             chunk_rows: int = 4096
+             ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-sample mean and standard deviation, accumulated chunk by chunk (for np.memmap / store reads).
+    """
+    n, samples = traces.shape
+    assert n > 0
+    s1 = np.zeros(samples)
+    s2 = np.zeros(samples)
+    for start in range(0, n, chunk_rows):
+        chunk = np.asarray(traces[start:start + chunk_rows], dtype=np.float64)
+        s1 += chunk.sum(axis=0)
+        s2 += np.einsum('ij,ij->j', chunk, chunk)
+    mean = s1 / n
+    return mean, np.sqrt(np.maximum(s2 / n - mean * mean, 0.0))
+
+
+def _band(mean: np.ndarray,
+          std: np.ndarray,
+          k: float,
+          n_bins: int
+          ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    x, lo, _ = minmax_envelope(mean - k * std, n_bins)
+    _, _, hi = minmax_envelope(mean + k * std, n_bins)
+    return x, lo, hi
+
+
+def plot_mean_std(traces: Optional[np.ndarray],
+                  ax: Optional["plt.Axes"] = None,
+                  k: float = 1.0,
+                  n_bins: Optional[int] = None,
+                  color=None,
+                  label: Optional[str] = None,
+                  stats: Optional[Tuple[np.ndarray, np.ndarray]] = None
+                  ) -> "plt.Axes":
+    """
+    Draws the mean trace with a mean +/- k*std band (both reduced to per-pixel envelopes).
+    Suited for thousands of traces, and for comparing groups (e.g. fixed vs random) on one axes.
+
+    :param traces: (N, samples) traces (np.memmap is fine), or None if `stats` is given
+    :param stats: Precomputed (mean, std), e.g. from `mean_std`
+    """
+    ax = _new_axes(ax)
+    mean, std = mean_std(traces) if stats is None else stats
+    width = _pixel_width(ax, n_bins)
+    color = color if color is not None else f"C{len(ax.collections) % 10}"
+    x, lo, hi = _band(mean, std, k, width)
+    ax.fill_between(x, lo, hi, step="post", color=color, alpha=0.3, linewidth=0,
+                    label=None if label is None else f"{label} (±{k:g}σ)")
+    plot_traces(mean, ax, n_bins=width, color=color, label=label)
+    return ax
+
+
+class _LiveFigure:
+    # Figure of `LiveTraceView`, drawn from snapshots (in the viewer process, or inline).
+    def __init__(self, samples: int, title: str):
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+        plt.ion()
+        self.fig = plt.figure(figsize=(8.0, 6.0))
+        self._ax_overlay = self.fig.add_subplot(2, 1, 1)
+        self._ax_stats = self.fig.add_subplot(2, 1, 2, sharex=self._ax_overlay)
+        self._overlay = LineCollection([], linewidths=0.8, alpha=0.7)
+        self._mean = LineCollection([], linewidths=0.8, colors="C0")
+        self._ax_overlay.add_collection(self._overlay)
+        self._ax_stats.add_collection(self._mean)
+        self._ax_stats.set_xlabel("Sample points")
+        self._ax_overlay.set_xlim(0, samples - 1)
+        self._band = None
+        self._title = title
+        pass
+
+    def draw(self, snapshot: dict) -> None:
+        if "overlay" in snapshot:
+            lines = _envelope_lines(*snapshot["overlay"])
+            self._overlay.set_segments(list(lines))
+            self._overlay.set_color([f"C{i % 10}" for i in range(lines.shape[0])])
+            self._ax_overlay.set_ylim(*_padded_limits(lines[..., 1].min(), lines[..., 1].max()))
+        if "band" in snapshot:
+            x, lo, hi = snapshot["band"]
+            if self._band is not None:
+                self._band.remove()
+            self._band = self._ax_stats.fill_between(x, lo, hi, step="post", color="C1", alpha=0.3, linewidth=0)
+            self._mean.set_segments([_envelope_lines(*snapshot["mean"])])
+            self._ax_stats.set_ylim(*_padded_limits(lo.min(), hi.max()))
+        self._ax_overlay.set_title(f"{self._title}: {snapshot['n_seen']} traces "
+                                   f"({snapshot['n_sampled']} in mean ± {snapshot['k']:g}σ)")
+        self.fig.canvas.draw_idle()
+        self.fig.canvas.flush_events()
+        pass
+    pass
+
+
+def _viewer_main(snapshots, samples: int, title: str, keep_open: bool) -> None:
+    # Viewer process: owns the GUI, so drawing never blocks the capture.
+    import matplotlib.pyplot as plt
+    figure = _LiveFigure(samples, title)
+    while True:
+        try:
+            snapshot = snapshots.get(timeout=0.05)
+        except queue.Empty:
+            plt.pause(0.05)  # keeps the window responsive
+            continue
+        if snapshot is None:
+            break
+        figure.draw(snapshot)
+    if keep_open:
+        plt.ioff()
+        plt.show()
+    pass
+
+
+class LiveTraceView:
+    """
+    Live view of a running capture: an overlay of the latest traces and the mean +/- std of a running sample.
+
+    It is a sink (`append_batch`), so it can be passed to `capture_stream` / `CapturePipeline` next to the store.
+    Per batch the capture thread only adds every `sample_every`-th trace to running sums; at most `max_fps` times
+    per second it reduces the overlay and statistics to per-pixel envelopes (a few KB) and hands them to the viewer.
+    By default the viewer is a separate process which owns the window: drawing never blocks the capture, and
+    snapshots arriving while it is still drawing are dropped.
+    With `in_process=True` (e.g. notebooks) the figure is drawn on the main thread; when the sink runs on pipeline
+    worker threads, pass `stop_when=view.poll` to `CapturePipeline.run` so that it is drawn after every block.
+    """
+    def __init__(self,
+                 samples: int,
+                 n_overlay: int = 8,
+                 sample_every: int = 16,
+                 max_fps: float = 2.0,
+                 n_bins: int = 1000,
+                 k: float = 1.0,
+                 title: str = "Live capture",
+                 in_process: bool = False,
+                 keep_open: bool = True,
+                 mp_context: str = "spawn"
+                 ):
+        """
+        :param samples: Samples per trace
+        :param n_overlay: Number of latest traces overlaid
+        :param sample_every: Stride of the traces added to the running mean/std
+        :param max_fps: Maximum snapshot (redraw) rate
+        :param n_bins: Horizontal resolution of the envelopes
+        :param k: Width of the band in standard deviations
+        :param in_process: Draw in this process instead of a viewer process
+        :param keep_open: Keep the viewer window open after `close()` until it is closed by the user
+        :param mp_context: Start method of the viewer process (inside a script, create the view under
+                           `if __name__ == "__main__":`)
+        """
+        assert samples > 0 and n_overlay >= 0 and sample_every >= 1 and max_fps > 0
+        self._samples = samples
+        self._n_overlay = n_overlay
+        self._sample_every = sample_every
+        self._min_interval = 1.0 / max_fps
+        self._n_bins = n_bins
+        self._k = k
+        self._title = title
+        self._in_process = in_process
+        self._keep_open = keep_open
+        self._mp_context = mp_context
+        self._lock = threading.Lock()
+        self._s1 = np.zeros(samples)
+        self._s2 = np.zeros(samples)
+        self._n_sampled = 0
+        self._n_seen = 0
+        self._latest: Optional[np.ndarray] = None
+        self._last_snapshot = 0.0
+        self._pending: Optional[dict] = None
+        self._figure: Optional[_LiveFigure] = None
+        self._viewer = None
+        self._snapshots = None
+        if not in_process:
+            self._start_viewer()  # started before the capture, so its imports do not compete with it
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        pass
+
+    def append_batch(self,
+                     traces: np.ndarray,
+                     plains: Optional[np.ndarray] = None,
+                     ciphers: Optional[np.ndarray] = None
+                     ) -> None:
+        with self._lock:
+            first = (-self._n_seen) % self._sample_every  # keeps the stride across batches
+            sampled = np.asarray(traces[first::self._sample_every], dtype=np.float64)
+            self._n_seen += traces.shape[0]
+            if sampled.shape[0] > 0:
+                self._s1 += sampled.sum(axis=0)
+                self._s2 += np.einsum('ij,ij->j', sampled, sampled)
+                self._n_sampled += sampled.shape[0]
+            if self._n_overlay > 0 and traces.shape[0] > 0:
+                # Copied: the capture reuses its buffers once `append_batch` returns. Reduced when a snapshot is taken.
+                self._latest = np.array(traces[-self._n_overlay:])
+            due = time.perf_counter() - self._last_snapshot >= self._min_interval
+            snapshot = self._snapshot() if due else None
+        if snapshot is not None:
+            self._publish(snapshot)
+        pass
+
+    def _snapshot(self) -> dict:
+        # Called with the lock held.
+        self._last_snapshot = time.perf_counter()
+        snapshot = {"n_seen": self._n_seen, "n_sampled": self._n_sampled, "k": self._k}
+        if self._latest is not None:
+            snapshot["overlay"] = minmax_envelope(np.asarray(self._latest, dtype=np.float64), self._n_bins)
+            self._latest = None
+        if self._n_sampled > 0:
+            mean = self._s1 / self._n_sampled
+            std = np.sqrt(np.maximum(self._s2 / self._n_sampled - mean * mean, 0.0))
+            snapshot["band"] = _band(mean, std, self._k, self._n_bins)
+            snapshot["mean"] = minmax_envelope(mean, self._n_bins)
+        return snapshot
+
+    def _publish(self, snapshot: dict) -> None:
+        if not self._in_process:
+            if self._viewer is None:
+                self._start_viewer()
+            try:
+                self._snapshots.put_nowait(snapshot)
+            except queue.Full:  # the viewer is still drawing: skip this frame
+                pass
+        elif threading.current_thread() is threading.main_thread():
+            self._draw(snapshot)
+        else:
+            self._pending = snapshot
+        pass
+
+    def _start_viewer(self) -> None:
+        ctx = mp.get_context(self._mp_context)
+        self._snapshots = ctx.Queue(maxsize=2)
+        self._viewer = ctx.Process(target=_viewer_main, name="live-trace-view", daemon=not self._keep_open,
+                                   args=(self._snapshots, self._samples, self._title, self._keep_open))
+        self._viewer.start()
+        pass
+
+    def _draw(self, snapshot: dict) -> None:
+        if self._figure is None:
+            self._figure = _LiveFigure(self._samples, self._title)
+        self._figure.draw(snapshot)
+        self._last_snapshot = time.perf_counter()  # the interval counts from the end of a (slow) inline draw
+        pass
+
+    def poll(self) -> bool:
+        """
+        Draws the snapshot taken on a worker thread (with `in_process=True`).
+
+        :return: False (so it can be used as a `stop_when` hook)
+        """
+        pending, self._pending = self._pending, None
+        if pending is not None and threading.current_thread() is threading.main_thread():
+            self._draw(pending)
+        return False
+
+    @property
+    def figure(self) -> Optional["plt.Figure"]:
+        return None if self._figure is None else self._figure.fig
+
+    def close(self) -> None:
+        """
+        Sends the final state to the viewer and stops it (its window stays open with `keep_open`).
+        """
+        with self._lock:
+            snapshot = self._snapshot() if self._n_seen > 0 else None
+        if snapshot is not None:
+            if self._viewer is not None:
+                self._snapshots.put(snapshot)
+            elif self._in_process and threading.current_thread() is threading.main_thread():
+                self._draw(snapshot)
+        if self._viewer is not None:
+            self._snapshots.put(None)
+            if not self._keep_open:
+                self._viewer.join(timeout=5)
+            self._viewer = None
+        pass
+
+    def reset(self) -> None:
+        with self._lock:
+            self._s1[:] = 0
+            self._s2[:] = 0
+            self._n_sampled = 0
+            self._n_seen = 0
+            self._latest = None
+        pass
+    pass
+
+
+def _padded_limits(lo: float, hi: float) -> Tuple[float, float]:
+    pad = (hi - lo) * 0.05 if hi > lo else 1.0
+    return float(lo - pad), float(hi + pad)
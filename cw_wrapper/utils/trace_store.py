@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import shutil
+import numpy as np
+from typing import Optional, Iterator, Tuple, Union
+
+_META_FILE = "meta.json"
+_CHUNK_PREFIX = "chunk_"
+_TMP_SUFFIX = ".tmp"
+_FIELDS = ("traces", "plains", "ciphers")
+
+
+def _chunk_name(index: int) -> str:
+    return f"{_CHUNK_PREFIX}{index:06d}"
+
+
+def _list_complete_chunks(path: str) -> list:
+    names = [x for x in os.listdir(path)
+             if x.startswith(_CHUNK_PREFIX) and not x.endswith(_TMP_SUFFIX)
+             and os.path.isdir(os.path.join(path, x))]
+    return sorted(names)
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:  # e.g. Windows does not allow opening directories
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+    pass
+
+
+class TraceStoreWriter:
+    """
+    Append-only, chunked on-disk trace store.
+
+    Rows (trace, plaintext, ciphertext) are buffered in a preallocated chunk and written
+    as one directory of `.npy` files per chunk. A chunk is first written to `chunk_XXXXXX.tmp`
+    and renamed only after its files are synced, so after a crash every chunk directory
+    without the `.tmp` suffix is complete and valid. Reopening an existing store resumes appending.
+
+    Raw (integer) ADC traces are stored as they are; the `scale`/`offset` which convert them
+    to float (`float = raw * scale + offset`) are kept once in the metadata.
+    Rows appended without a plaintext or ciphertext store zeros in its place.
+    """
+    def __init__(self,
+                 path: str,
+                 samples: int,
+                 plain_len: int = 16,
+                 cipher_len: int = 16,
+                 chunk_size: int = 10000,
+                 trace_dtype: Union[str, np.dtype] = np.float64,
+                 flush_interval: Optional[float] = 60.0,
+                 scale: Optional[float] = None,
+                 offset: Optional[float] = None
+                 ):
+        assert samples > 0 and plain_len >= 0 and cipher_len >= 0
+        assert chunk_size > 0
+        assert flush_interval is None or flush_interval > 0
+        assert np.dtype(trace_dtype).kind in ('f', 'i', 'u')
+        self._path = path
+        self._meta = {
+            "version": 1,
+            "samples": int(samples),
+            "plain_len": int(plain_len),
+            "cipher_len": int(cipher_len),
+            "trace_dtype": np.dtype(trace_dtype).str,
+            "scale": 1.0 if scale is None else float(scale),
+            "offset": 0.0 if offset is None else float(offset),
+        }
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, _META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                prev_meta = json.load(f)
+            prev_meta.setdefault("scale", 1.0)
+            prev_meta.setdefault("offset", 0.0)
+            for key in ("samples", "plain_len", "cipher_len", "trace_dtype", "scale", "offset"):
+                assert prev_meta.get(key) == self._meta[key], \
+                    f"The existing store has a different '{key}'. ({prev_meta.get(key)} != {self._meta[key]})"
+            self._meta = prev_meta
+        else:
+            self._write_meta()
+        # Leftovers of a chunk that was being written when the previous run crashed.
+        for name in os.listdir(path):
+            if name.startswith(_CHUNK_PREFIX) and name.endswith(_TMP_SUFFIX):
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        chunks = _list_complete_chunks(path)
+        self._next_chunk = int(chunks[-1][len(_CHUNK_PREFIX):]) + 1 if chunks else 0
+        self._n_stored = sum(TraceStoreReader.chunk_length(os.path.join(path, x)) for x in chunks)
+
+        self._chunk_size = chunk_size
+        self._flush_interval = flush_interval
+        self._traces = np.empty(shape=(chunk_size, samples), dtype=np.dtype(self._meta["trace_dtype"]))
+        self._plains = np.empty(shape=(chunk_size, plain_len), dtype=np.uint8)
+        self._ciphers = np.empty(shape=(chunk_size, cipher_len), dtype=np.uint8)
+        self._fill = 0
+        self._last_flush = time.monotonic()
+        self._closed = False
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        pass
+
+    def __len__(self) -> int:
+        return self._n_stored + self._fill
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def chunk_size(self) -> int:
+        return self._chunk_size
+
+    @property
+    def meta(self) -> dict:
+        return dict(self._meta)
+
+    def set_meta(self, **kwargs) -> None:
+        """
+        Stores additional JSON-serializable metadata (e.g. key, scope settings) with the store.
+        """
+        self._meta.update(kwargs)
+        self._write_meta()
+        pass
+
+    def _write_meta(self) -> None:
+        meta_path = os.path.join(self._path, _META_FILE)
+        tmp_path = meta_path + _TMP_SUFFIX
+        with open(tmp_path, 'w') as f:
+            json.dump(self._meta, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, meta_path)
+        pass
+
+    def append(self,
+               trace: np.ndarray,
+               plain: Optional[np.ndarray] = None,
+               cipher: Optional[np.ndarray] = None
+               ) -> None:
+        assert not self._closed
+        self._traces[self._fill] = trace
+        # The buffers are reused across chunks, so a missing input is cleared instead of keeping an old row.
+        self._plains[self._fill] = 0 if plain is None else plain
+        self._ciphers[self._fill] = 0 if cipher is None else cipher
+        self._fill += 1
+        if self._fill == self._chunk_size:
+            self.flush()
+        else:
+            self._flush_if_due()
+        pass
+
+    def append_batch(self,
+                     traces: np.ndarray,
+                     plains: Optional[np.ndarray] = None,
+                     ciphers: Optional[np.ndarray] = None
+                     ) -> None:
+        assert not self._closed
+        n = traces.shape[0]
+        pos = 0
+        while pos < n:
+            k = min(n - pos, self._chunk_size - self._fill)
+            self._traces[self._fill:self._fill + k] = traces[pos:pos + k]
+            self._plains[self._fill:self._fill + k] = 0 if plains is None else plains[pos:pos + k]
+            self._ciphers[self._fill:self._fill + k] = 0 if ciphers is None else ciphers[pos:pos + k]
+            self._fill += k
+            pos += k
+            if self._fill == self._chunk_size:
+                self.flush()
+        self._flush_if_due()
+        pass
+
+    def _flush_if_due(self) -> None:
+        if self._flush_interval is not None and self._fill > 0 \
+                and time.monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+        pass
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows as a new complete chunk.
+        """
+        self._last_flush = time.monotonic()
+        if self._fill == 0:
+            return
+        name = _chunk_name(self._next_chunk)
+        tmp_dir = os.path.join(self._path, name + _TMP_SUFFIX)
+        os.makedirs(tmp_dir, exist_ok=True)
+        for field, buf in zip(_FIELDS, (self._traces, self._plains, self._ciphers)):
+            with open(os.path.join(tmp_dir, field + ".npy"), 'wb') as f:
+                np.save(f, buf[:self._fill])
+                f.flush()
+                os.fsync(f.fileno())
+        _fsync_dir(tmp_dir)
+        os.replace(tmp_dir, os.path.join(self._path, name))
+        _fsync_dir(self._path)
+        self._next_chunk += 1
+        self._n_stored += self._fill
+        self._fill = 0
+        pass
+
+    def close(self) -> None:
+        if not self._closed:
+            self.flush()
+            self._closed = True
+        pass
+    pass
+
+
+class TraceStoreReader:
+    """
+    Read-only view on a store written by `TraceStoreWriter`.
+    Chunks are memory-mapped, so opening a store costs no more than listing its chunks.
+    """
+    def __init__(self,
+                 path: str,
+                 mmap_mode: Optional[str] = 'r'
+                 ):
+        meta_path = os.path.join(path, _META_FILE)
+        assert os.path.exists(meta_path), f"'{path}' is not a trace store."
+        with open(meta_path, 'r') as f:
+            self._meta = json.load(f)
+        self._path = path
+        self._chunks = []
+        for name in _list_complete_chunks(path):
+            chunk_dir = os.path.join(path, name)
+            self._chunks.append(tuple(np.load(os.path.join(chunk_dir, field + ".npy"), mmap_mode=mmap_mode)
+                                      for field in _FIELDS))
+        self._offsets = np.cumsum([0] + [x[0].shape[0] for x in self._chunks])
+        pass
+
+    @staticmethod
+    def chunk_length(chunk_dir: str) -> int:
+        return np.load(os.path.join(chunk_dir, "traces.npy"), mmap_mode='r').shape[0]
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    @property
+    def meta(self) -> dict:
+        return dict(self._meta)
+
+    @property
+    def n_chunks(self) -> int:
+        return len(self._chunks)
+
+    @property
+    def is_raw(self) -> bool:
+        return np.dtype(self._meta["trace_dtype"]).kind != 'f'
+
+    @property
+    def trace_scale(self) -> Tuple[float, float]:
+        return self._meta.get("scale", 1.0), self._meta.get("offset", 0.0)
+
+    def to_float(self,
+                 traces: np.ndarray,
+                 dtype: Union[str, np.dtype] = np.float64
+                 ) -> np.ndarray:
+        """
+        Converts stored (possibly raw) traces to float using the scale/offset of the store.
+        """
+        scale, offset = self.trace_scale
+        if not self.is_raw and traces.dtype == dtype and scale == 1.0 and offset == 0.0:
+            return traces
+        result = traces.astype(dtype)
+        if scale != 1.0:
+            result *= scale
+        if offset != 0.0:
+            result += offset
+        return result
+
+    def iter_chunks(self, as_float: bool = False) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Yields (traces, plains, ciphers) of every complete chunk.
+        Without `as_float`, the memory-mapped arrays are yielded as they are stored.
+        """
+        for traces, plains, ciphers in self._chunks:
+            yield (self.to_float(traces) if as_float else traces), plains, ciphers
+        pass
+
+    def get(self,
+            index: int,
+            as_float: bool = False
+            ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if index < 0:
+            index += len(self)
+        assert 0 <= index < len(self)
+        c = int(np.searchsorted(self._offsets, index, side='right')) - 1
+        i = index - int(self._offsets[c])
+        traces, plains, ciphers = self._chunks[c]
+        return (self.to_float(traces[i]) if as_float else traces[i]), plains[i], ciphers[i]
+
+    def read(self,
+             start: int = 0,
+             stop: Optional[int] = None,
+             as_float: bool = False
+             ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Copies the rows [start, stop) into contiguous (traces, plains, ciphers) arrays.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        assert 0 <= start <= stop
+        parts = ([], [], [])
+        for c, chunk in enumerate(self._chunks):
+            lo, hi = int(self._offsets[c]), int(self._offsets[c + 1])
+            if hi <= start or lo >= stop:
+                continue
+            for part, x in zip(parts, chunk):
+                part.append(x[max(start, lo) - lo:min(stop, hi) - lo])
+        if not parts[0]:
+            samples, plain_len, cipher_len = self._meta["samples"], self._meta["plain_len"], self._meta["cipher_len"]
+            trace_dtype = np.float64 if as_float else np.dtype(self._meta["trace_dtype"])
+            return (np.empty((0, samples), dtype=trace_dtype),
+                    np.empty((0, plain_len), dtype=np.uint8), np.empty((0, cipher_len), dtype=np.uint8))
+        traces, plains, ciphers = tuple(np.concatenate(part, axis=0) for part in parts)
+        return (self.to_float(traces) if as_float else traces), plains, ciphers
+    pass
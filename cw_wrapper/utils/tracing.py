@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+from typing import Optional, Dict, List, Sequence, Tuple
+
+# Hook of the hot path. `CWScope` and the SimpleSerial targets read this module attribute once per call and do
+# nothing else while it is None, so instrumentation costs one global lookup when tracing is disabled.
+active: Optional["Tracer"] = None
+
+# Upper bounds (ns) of the latency histogram buckets: 1-2-5 steps from 10us to 10s.
+DEFAULT_BUCKETS = tuple(int(m * 10 ** e) for e in range(4, 10) for m in (1, 2, 5)) + (10 ** 10,)
+
+now = time.perf_counter_ns
+
+
+class Tracer:
+    """
+    Collects what the capture hot path reports while it is installed (`enable` or `with Tracer():`):
+
+        - counters of events (timeouts, short reads, missing acks, flushed buffers, retries, ...)
+        - a latency histogram per span (arm, serial_write, serial_read, wait_ack, capture, readout, flush,
+          reset, trace, capture_batch, capture_multi, recovery)
+        - the last `capacity` spans and events with their thread, for a timeline
+
+    Spans nest: "trace" is one capture iteration and contains its arm, serial I/O, capture and readout;
+    "wait_ack" contains the "serial_read" it performs.
+    `write_chrome_trace` exports the timeline for chrome://tracing / Perfetto, `openmetrics` the counters and
+    histograms in the OpenMetrics text format (e.g. for a Prometheus textfile collector).
+    """
+    def __init__(self,
+                 capacity: int = 65536,
+                 echo_warnings: bool = True,
+                 buckets: Sequence[int] = DEFAULT_BUCKETS
+                 ):
+        """
+        :param capacity: Number of spans/events kept for the timeline (the oldest are overwritten)
+        :param echo_warnings: Still print the warnings of the hot path to stderr (they are counted either way)
+        :param buckets: Increasing upper bounds (ns) of the latency histogram buckets
+        """
+        assert capacity >= 1
+        assert len(buckets) >= 1 and all(a < b for a, b in zip(buckets, buckets[1:]))
+        self.echo_warnings = echo_warnings
+        self._capacity = capacity
+        self._buckets = tuple(int(x) for x in buckets)
+        self._lock = threading.Lock()
+        self._previous: List[Optional[Tracer]] = []
+        self.reset()
+        pass
+
+    def __enter__(self):
+        self._previous.append(enable(self))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global active
+        active = self._previous.pop()
+        pass
+
+    def reset(self) -> None:
+        with self._lock:
+            self._origin = now()
+            self._counters: Dict[str, int] = {}
+            self._histograms: Dict[str, list] = {}  # name -> [bucket counts (+Inf last), sum ns, max ns]
+            self._records: List[Optional[tuple]] = [None] * self._capacity
+            self._next = 0
+        pass
+
+    def span(self,
+             name: str,
+             started: int,
+             args: Optional[Dict] = None
+             ) -> None:
+        """
+        Records a span which started at `started` (`tracing.now()`) and ends now.
+        """
+        ended = now()
+        duration = ended - started
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [[0] * (len(self._buckets) + 1), 0, 0]
+            histogram[0][bisect.bisect_left(self._buckets, duration)] += 1
+            histogram[1] += duration
+            if duration > histogram[2]:
+                histogram[2] = duration
+            self._records[self._next % self._capacity] = (name, started, duration, threading.get_ident(), args)
+            self._next += 1
+        pass
+
+    def event(self,
+              name: str,
+              args: Optional[Dict] = None
+              ) -> None:
+        """
+        Counts an event and puts it on the timeline.
+        """
+        timestamp = now()
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            self._records[self._next % self._capacity] = (name, timestamp, None, threading.get_ident(), args)
+            self._next += 1
+        pass
+
+    def count(self, name: str, n: int = 1) -> None:
+        """
+        Adds `n` to a counter without a timeline entry (e.g. bytes or traces).
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+        pass
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def _snapshot(self) -> Tuple[Dict[str, int], Dict[str, tuple], List[tuple]]:
+        with self._lock:
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self._histograms.items()}
+            if self._next <= self._capacity:
+                records = self._records[:self._next]
+            else:
+                i = self._next % self._capacity
+                records = self._records[i:] + self._records[:i]
+            return dict(self._counters), histograms, records
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return: Count, total, mean, max and estimated p50/p99 (upper bound of the bucket) per span, in ms
+        """
+        _, histograms, _ = self._snapshot()
+        result = {}
+        for name, (counts, total, largest) in histograms.items():
+            n = sum(counts)
+            result[name] = {
+                "count": n,
+                "total_ms": total * 1e-6,
+                "mean_ms": total * 1e-6 / n,
+                "max_ms": largest * 1e-6,
+                "p50_ms": self._quantile(counts, n, 0.5, largest) * 1e-6,
+                "p99_ms": self._quantile(counts, n, 0.99, largest) * 1e-6,
+            }
+        return result
+
+    def _quantile(self, counts: List[int], n: int, q: float, largest: int) -> int:
+        cumulative = 0
+        for i, c in enumerate(counts):
+            cumulative += c
+            if cumulative >= q * n:
+                return min(self._buckets[i], largest) if i < len(self._buckets) else largest
+        return largest
+
+    def chrome_trace(self) -> Dict:
+        """
+        :return: Timeline in the Chrome trace event format (complete "X" events for spans, instant "i" events
+                 for events, timestamps in us since the tracer was created or reset)
+        """
+        _, _, records = self._snapshot()
+        pid = os.getpid()
+        events = []
+        for name, started, duration, tid, args in records:
+            event = {"name": name, "cat": name.split(".")[0], "pid": pid, "tid": tid,
+                     "ts": (started - self._origin) * 1e-3}
+            if duration is None:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=duration * 1e-3)
+            if args:
+                event["args"] = args
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        pass
+
+    def openmetrics(self, prefix: str = "cw_wrapper") -> str:
+        """
+        :return: Event counters (`<prefix>_events_total{event=...}`) and span latency histograms
+                 (`<prefix>_span_seconds{span=...}`) in the OpenMetrics text format
+        """
+        counters, histograms, _ = self._snapshot()
+        lines = [f"# TYPE {prefix}_events counter", f"# HELP {prefix}_events Events reported by the capture path."]
+        for name in sorted(counters):
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {counters[name]}')
+        lines += [f"# TYPE {prefix}_span_seconds histogram", f"# UNIT {prefix}_span_seconds seconds",
+                  f"# HELP {prefix}_span_seconds Latency of the capture path stages."]
+        bounds = [repr(x * 1e-9) for x in self._buckets] + ["+Inf"]
+        for name in sorted(histograms):
+            counts, total, _ = histograms[name]
+            cumulative = 0
+            for bound, c in zip(bounds, counts):
+                cumulative += c
+                lines.append(f'{prefix}_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_span_seconds_sum{{span="{name}"}} {total * 1e-9!r}')
+            lines.append(f'{prefix}_span_seconds_count{{span="{name}"}} {cumulative}')
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_openmetrics(self, path: str, prefix: str = "cw_wrapper") -> None:
+        # Written to a temporary file first, so a collector never reads a half-written file.
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.openmetrics(prefix))
+        os.replace(tmp_path, path)
+        pass
+    pass
+
+
+def enable(tracer: Optional[Tracer] = None, **kwargs) -> Optional[Tracer]:
+    """
+    Installs `tracer` (a new `Tracer(**kwargs)` if None) on the hot path.
+
+    :return: The tracer which was installed before
+    """
+    global active
+    previous = active
+    active = Tracer(**kwargs) if tracer is None else tracer
+    return previous
+
+
+def disable() -> Optional[Tracer]:
+    """
+    :return: The tracer which was installed
+    """
+    global active
+    previous = active
+    active = None
+    return previous
+
+
+def warn(event: str,
+         message: str,
+         args: Optional[Dict] = None,
+         echo: bool = True
+         ) -> None:
+    """
+    Reports a warning of the hot path: counted as `event` when a tracer is installed, printed to stderr
+    if `echo` unless the tracer was created with `echo_warnings=False`.
+    """
+    tracer = active
+    if tracer is not None:
+        tracer.event(event, args)
+        echo = echo and tracer.echo_warnings
+    if echo:
+        print(message, file=sys.stderr)
+    pass
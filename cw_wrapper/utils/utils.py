@@ -1,30 +1,32 @@
 import random
 import pickle as pk
 import numpy as np
-import matplotlib.pyplot as plt
-from typing import Any
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
 
 
 def visualization_single_trace(wave: np.ndarray,
                                show: bool = True,
                                linewidth: float = 0.8
-                               ) -> plt.Figure:
+                               ) -> "plt.Figure":
+    import matplotlib.pyplot as plt  # only loaded when plotting (headless workers never pay for it)
+    from .plotting import plot_traces
     trace_img: plt.Figure = plt.figure(figsize=(8.0, 4.5))
     trace_ax: plt.Axes = trace_img.add_subplot(1, 1, 1)
     trace_ax.set_title(f"Power Consumption Trace")
     trace_ax.set_xlabel("Sample points")
     trace_ax.set_ylabel(f"Power Consumption")
-    trace_ax.plot(wave, linewidth=linewidth)
+    plot_traces(wave, trace_ax, linewidth=linewidth)  # per-pixel min/max envelope instead of every sample
     if show:
         trace_img.show()
     return trace_img
 
 
 def make_random_hex(n_byte: int) -> str:
-    result = []
-    for _ in range(n_byte):
-        result.append(format(random.randint(0, 0xff), "02X"))
-    return ''.join(result)
+    # One draw for all bytes instead of one randint/format per byte. (see `InputGenerator` for batches)
+    return random.getrandbits(8 * n_byte).to_bytes(n_byte, "big").hex().upper() if n_byte > 0 else ""
 
 
 def load_pickle_object(locate_and_name: str) -> Any:
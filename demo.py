@@ -1,7 +1,6 @@
 import time
-import numpy as np
 from tqdm.autonotebook import tqdm
-from cw_wrapper import CWScope, SS1xTarget, make_random_hex
+from cw_wrapper import CWScope, SS1xTarget, TraceStoreWriter, TraceStoreReader, FaultRecovery
 
 # Connecting ChipWhisperer scope and target
 scope = CWScope()
@@ -22,34 +21,25 @@ dut.ss_write("k", 16, fixed_key, following_ack=True)
 
 # Initializing measurement parameters
 total_trace = 500
-samples = scope.get_status(verbose=False)["samples"]
-
-# Allocating placeholders
-traces = np.empty(shape=(total_trace, samples), dtype=np.float64)
-plains, ciphers = [], []
+samples = scope.get_samples()
 
 # Measuring power traces
-cnt = 0
-tqdm_progress = tqdm(range(total_trace))
-while cnt < total_trace:
-    p = make_random_hex(16)
-    scope.arm()
-    dut.ss_write('p', 16, p, following_ack=False)
-    c = dut.ss_read('r', 16, following_ack=True)
-    t = scope.get_waveform()
-    if t is None or c is None:
-        continue
-    plains.append(p)
-    ciphers.append(c)
-    traces[cnt] = t
-    tqdm_progress.update(1)
-    cnt += 1
-    pass
-
-plains = np.array(plains)
-ciphers = np.array(ciphers)
-
-# Saving power traces and metadata
-np.save("./traces.npy", traces)
-np.save("./plains.npy", plains)
-np.save("./ciphers.npy", ciphers)
+# Traces are streamed to disk chunk by chunk, so a crash only loses the chunk being captured.
+# Failed captures escalate from a buffer flush to a target reset and a scope reconnect (the key is re-sent).
+batch_size = 100
+recovery = FaultRecovery(key=fixed_key)
+tqdm_progress = tqdm(total=total_trace)
+
+
+def show_progress() -> bool:  # called by capture_stream after every batch
+    tqdm_progress.update(min(batch_size, total_trace - tqdm_progress.n))
+    return False
+
+
+with TraceStoreWriter("./traces", samples=samples, chunk_size=batch_size) as store:
+    store.set_meta(key=fixed_key)
+    scope.capture_stream(total_trace, store, batch_size=batch_size, stop_when=show_progress,
+                         cmd='p', resp='r', recovery=recovery)
+
+# Loading power traces and metadata
+traces, plains, ciphers = TraceStoreReader("./traces").read()